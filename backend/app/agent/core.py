@@ -6,81 +6,186 @@ Agent 核心模块
 import json
 import time
 from typing import Optional, Generator
-from openai import OpenAI
 
 from app.config import (
     SILICONFLOW_API_KEY,
     SILICONFLOW_BASE_URL,
     CHAT_MODEL,
+    SPECULATIVE_PREFETCH,
 )
 from app.tools import ToolRegistry
+from app.db.database import SessionScope, bind_session_scope
 from app.agent.state import AgentStateManager, StateType
-from app.agent.prompts import build_system_prompt
+from app.agent.prompts import prompt_assembler
+from app.agent.intent import intent_router
+from app.agent.speculation import SpeculativeExecutor
+from app.telemetry import Span, tracer, annotate_llm_usage
+from app.telemetry.metrics import (
+    AGENT_ANSWERS,
+    AGENT_STEPS,
+    LLM_ERRORS,
+    LLM_LATENCY,
+    record_llm_usage,
+    track_call,
+)
+from app.agent.session import (
+    ConversationSession,
+    is_followup,
+    parse_followup_filters,
+    filter_rows,
+)
 
 
 class Agent:
     """ReAct Agent 实现"""
     
-    def __init__(self, tool_registry: ToolRegistry, max_steps: int = 5):
+    def __init__(
+        self,
+        tool_registry: ToolRegistry,
+        max_steps: int = 5,
+        session: Optional[ConversationSession] = None,
+    ):
+        # openai 导入较慢，首次创建 Agent 时才加载，不拖慢应用启动
+        from openai import OpenAI
+
         self.tool_registry = tool_registry
         self.max_steps = max_steps
         self.client = OpenAI(
             api_key=SILICONFLOW_API_KEY,
             base_url=SILICONFLOW_BASE_URL,
         )
-        self.system_prompt = build_system_prompt(task="", steps=[])
+        # 系统前缀编译一次后复用，保持字节稳定以命中服务端提示词缓存
+        self.prompt_prefix = prompt_assembler.get_system_prefix()
+        self.system_prompt = self.prompt_prefix.text
         self.state = AgentStateManager()
         self.conversation_history = []
+        self.session = session
+        self.tool_calls = []
+        self._turn_refs = []
+        self.speculator: Optional[SpeculativeExecutor] = None
+        self.llm_steps = 0
+        # 本轮所有工具调用共享一个数据库会话
+        self.db_scope = SessionScope()
     
     # ============================================
-    # 快速路径 - 简单查询直接执行，不调用 LLM
+    # 会话 - 历史与结果复用
     # ============================================
-    def _try_quick_path(self, message: str) -> Optional[str]:
-        """快速路径：简单查询直接执行"""
-        msg = message.lower().strip()
-        print(f"[快速路径] 检查消息: {msg}")
+    def _initial_history(self, user_message: str) -> list:
+        """本轮初始对话历史（带上会话中的摘要和近期消息）"""
+        history = self.session.context_messages() if self.session else []
+        history.append({"role": "user", "content": user_message})
+        return history
+    
+    def _start_speculation(self, user_message: str) -> None:
+        """在第一次调用 LLM 前启动工具预取"""
+        if SPECULATIVE_PREFETCH:
+            self.speculator = SpeculativeExecutor(self.tool_registry)
+            self.speculator.start(user_message)
+    
+    def _stop_speculation(self) -> None:
+        """丢弃未使用的预取结果（只对第一步工具调用做预取）"""
+        if self.speculator:
+            self.speculator.discard()
+            self.speculator = None
+    
+    def _execute_tool(self, tool_name: str, params: dict) -> dict:
+        """执行工具并记录调用和结果引用（优先复用预取结果）"""
+        result = self.speculator.take(tool_name, params) if self.speculator else None
+        self._stop_speculation()
+        if result is None:
+            with bind_session_scope(self.db_scope):
+                result = self.tool_registry.execute(tool_name, params)
+        self.tool_calls.append({
+            "tool": tool_name,
+            "params": params,
+            "success": result.get("success", False),
+        })
+        if self.session:
+            ref = self.session.remember_result(tool_name, params, result)
+            if ref:
+                self._turn_refs.append(ref)
+        return result
+    
+    def _finish_turn(self, user_message: str, answer: str, path: str = "loop") -> None:
+        """
+        将本轮问答写入会话（工具结果只保留引用），并记录回答路径指标
         
-        # 业绩查询
-        if any(kw in msg for kw in ["所有业绩", "查询业绩", "业绩列表", "查看业绩", "有哪些业绩"]):
-            print("[快速路径] 匹配: 业绩查询")
-            return self._quick_search_performances({})
+        参数:
+            path: followup / quick / loop
+        """
+        AGENT_ANSWERS.inc(path=path)
+        AGENT_STEPS.observe(self.llm_steps, path=path)
+        self.db_scope.close()
+        if self.session:
+            self.session.add_turn(user_message, answer, self._turn_refs)
+    
+    def _try_followup(self, message: str) -> Optional[str]:
+        """
+        追问复用：如"只看近三年的"，直接在上一轮结果集上过滤，
+        不重新查询数据库也不调用 LLM
+        """
+        if not self.session or not self.session.last_result:
+            return None
+        if not is_followup(message):
+            return None
         
-        if "常年" in msg and ("顾问" in msg or "合同" in msg):
-            print("[快速路径] 匹配: 常年法律顾问")
-            return self._quick_search_performances({"contract_type": "常年法律顾问合同"})
+        last = self.session.last_result
+        if last.get("kind") != "performances":
+            return None
+        
+        filters = parse_followup_filters(message)
+        if not filters:
+            return None
         
-        # 律师查询
-        if any(kw in msg for kw in ["所有律师", "查询律师", "律师列表", "查看律师", "有哪些律师", "参与的律师", "律师有哪些"]):
-            print("[快速路径] 匹配: 律师查询")
-            return self._quick_search_lawyers({})
+        rows = filter_rows(last.get("rows", []), filters)
+        print(f"[会话] 复用结果 {last['ref']}，过滤条件: {filters}，{len(last.get('rows', []))} → {len(rows)}")
         
-        # 企业查询
-        if any(kw in msg for kw in ["所有企业", "查询企业", "企业列表", "查看企业", "有哪些企业", "有哪些客户"]):
-            print("[快速路径] 匹配: 企业查询")
-            return self._quick_search_enterprises({})
+        params = {**last.get("params", {}), **filters}
+        ref = self.session.remember_result(
+            last["tool"], params, {"success": True, "data": {"performances": rows}}
+        )
+        self._turn_refs.append(ref)
         
-        if "国企" in msg or "国有" in msg:
-            print("[快速路径] 匹配: 国企查询")
-            return self._quick_search_enterprises({"is_state_owned": True})
+        if not rows:
+            return "在上一次的结果中没有符合条件的业绩。"
+        return self._format_performances(rows)
+    
+    # ============================================
+    # 快速路径 - 简单查询直接执行，不调用 LLM
+    # ============================================
+    def _try_quick_path(self, message: str) -> Optional[str]:
+        """快速路径：意图路由命中时直接执行参数化工具调用"""
+        with tracer.span("agent.intent_route") as span:
+            match = intent_router.route(message)
+            if span and match:
+                span.set(intent=match.intent, confidence=match.confidence)
+        if match is None:
+            return None
         
-        # 统计查询
-        if any(kw in msg for kw in ["业绩统计", "统计", "汇总"]):
-            print("[快速路径] 匹配: 统计查询")
+        if match.tool == "search_performances":
+            return self._quick_search_performances(match.params)
+        if match.tool == "search_lawyers":
+            return self._quick_search_lawyers(match.params)
+        if match.tool == "search_enterprises":
+            return self._quick_search_enterprises(match.params)
+        if match.tool == "get_performance_stats":
             return self._quick_get_stats()
-        
-        print("[快速路径] 未匹配，走 Agent 循环")
         return None
     
     def _quick_search_performances(self, params: dict) -> str:
         """快速查询业绩"""
-        result = self.tool_registry.execute("search_performances", params)
+        result = self._execute_tool("search_performances", params)
         if not result.get("success"):
             return "查询业绩失败。"
         
-        data = result.get("data", [])
+        data = (result.get("data") or {}).get("performances", [])
         if not data:
             return "当前没有业绩记录。"
         
+        return self._format_performances(data)
+    
+    def _format_performances(self, data: list) -> str:
+        """格式化业绩列表"""
         response = f"查询到 **{len(data)}** 条业绩记录：\n\n"
         for i, p in enumerate(data[:10], 1):
             response += f"{i}. **{p.get('party_a', '未知')}** - {p.get('contract_type', '未知')}"
@@ -95,11 +200,11 @@ class Agent:
     
     def _quick_search_lawyers(self, params: dict) -> str:
         """快速查询律师"""
-        result = self.tool_registry.execute("search_lawyers", params)
+        result = self._execute_tool("search_lawyers", params)
         if not result.get("success"):
             return "查询律师失败。"
         
-        data = result.get("data", [])
+        data = (result.get("data") or {}).get("lawyers", [])
         if not data:
             return "当前没有律师记录。"
         
@@ -113,11 +218,11 @@ class Agent:
     
     def _quick_search_enterprises(self, params: dict) -> str:
         """快速查询企业"""
-        result = self.tool_registry.execute("search_enterprises", params)
+        result = self._execute_tool("search_enterprises", params)
         if not result.get("success"):
             return "查询企业失败。"
         
-        data = result.get("data", [])
+        data = (result.get("data") or {}).get("enterprises", [])
         if not data:
             filter_text = "国企" if params.get("is_state_owned") else "企业"
             return f"当前没有{filter_text}记录。"
@@ -132,7 +237,7 @@ class Agent:
     
     def _quick_get_stats(self) -> str:
         """快速获取统计"""
-        result = self.tool_registry.execute("get_performance_stats", {})
+        result = self._execute_tool("get_performance_stats", {})
         if not result.get("success"):
             return "获取统计失败。"
         
@@ -144,78 +249,111 @@ class Agent:
     # ============================================
     def run(self, user_message: str) -> str:
         """运行 Agent"""
-        start_time = time.time()
+        with tracer.span("agent.run", max_steps=self.max_steps) as span:
+            try:
+                answer = self._run(user_message, span)
+            finally:
+                self._stop_speculation()
+                self.db_scope.close()
+            if span:
+                span.set(tool_calls=len(self.tool_calls))
+            return answer
+    
+    def _run(self, user_message: str, run_span: Optional[Span]) -> str:
+        """Agent 主流程（在 agent.run span 内执行）"""
+        # 追问优先复用上一轮结果
+        followup_result = self._try_followup(user_message)
+        if followup_result:
+            if run_span:
+                run_span.set(path="followup")
+            self._finish_turn(user_message, followup_result, path="followup")
+            return followup_result
         
         # 优先尝试快速路径
         quick_result = self._try_quick_path(user_message)
         if quick_result:
-            elapsed = time.time() - start_time
-            print(f"[Agent] 快速路径完成，耗时: {elapsed:.2f}s")
+            if run_span:
+                run_span.set(path="quick")
+            self._finish_turn(user_message, quick_result, path="quick")
             return quick_result
         
         # 正常 Agent 循环
-        print(f"[Agent] 进入 Agent 循环")
+        if run_span:
+            run_span.set(path="loop", prefix_hash=self.prompt_prefix.hash, prefix_size=self.prompt_prefix.size)
         self.state.reset()
-        self.conversation_history = [{"role": "user", "content": user_message}]
+        self.llm_steps = 0
+        self.conversation_history = self._initial_history(user_message)
+        self._start_speculation(user_message)
         
         for step in range(1, self.max_steps + 1):
-            step_start = time.time()
-            print(f"[Agent] Step {step}/{self.max_steps}")
-            
-            # Think
-            self.state.transition(StateType.THINKING)
-            response = self._call_llm()
-            if not response:
-                break
-            
-            thought, action = self._parse_response(response)
-            
-            # 完成
-            if action is None:
-                self.state.transition(StateType.FINISHED)
-                elapsed = time.time() - start_time
-                print(f"[Agent] 完成，总耗时: {elapsed:.2f}s")
-                # 返回思考内容或生成最终回答
-                if thought and len(thought) > 50:
-                    return thought
-                return self._generate_final_answer()
-            
-            # Act
-            self.state.transition(StateType.ACTING)
-            tool_name = action.get("tool")
-            tool_params = action.get("params", {})
-            print(f"[Agent] 调用工具: {tool_name}")
-            
-            result = self.tool_registry.execute(tool_name, tool_params)
-            
-            # 更新对话历史
-            self.conversation_history.append({"role": "assistant", "content": response})
-            self.conversation_history.append({
-                "role": "user",
-                "content": f"工具结果:\n{json.dumps(result, ensure_ascii=False)}"
-            })
-            
-            step_elapsed = time.time() - step_start
-            print(f"[Agent] Step {step} 耗时: {step_elapsed:.2f}s")
+            with tracer.span("agent.step", step=step) as step_span:
+                # Think
+                self.state.transition(StateType.THINKING)
+                response = self._call_llm()
+                if not response:
+                    break
+                
+                thought, action = self._parse_response(response)
+                
+                # 完成
+                if action is None:
+                    self._stop_speculation()
+                    self.state.transition(StateType.FINISHED)
+                    # 返回思考内容或生成最终回答
+                    answer = thought if thought and len(thought) > 50 else self._generate_final_answer()
+                    self._finish_turn(user_message, answer)
+                    return answer
+                
+                # Act
+                self.state.transition(StateType.ACTING)
+                tool_name = action.get("tool")
+                tool_params = action.get("params", {})
+                if step_span:
+                    step_span.set(tool=str(tool_name))
+                
+                result = self._execute_tool(tool_name, tool_params)
+                
+                # 更新对话历史
+                self.conversation_history.append({"role": "assistant", "content": response})
+                self.conversation_history.append({
+                    "role": "user",
+                    "content": f"工具结果:\n{json.dumps(result, ensure_ascii=False)}"
+                })
         
-        elapsed = time.time() - start_time
-        print(f"[Agent] 循环结束，总耗时: {elapsed:.2f}s")
-        return self._generate_final_answer()
+        self._stop_speculation()
+        answer = self._generate_final_answer()
+        self._finish_turn(user_message, answer)
+        return answer
     
     def run_stream(self, user_message: str) -> Generator[dict, None, None]:
-        """流式运行"""
+        """流式运行（客户端断开、工具或 LLM 出错时同样丢弃预取并释放请求级数据库会话）"""
+        try:
+            yield from self._run_stream(user_message)
+        finally:
+            self._stop_speculation()
+            self.db_scope.close()
+    
+    def _run_stream(self, user_message: str) -> Generator[dict, None, None]:
+        """流式运行主流程"""
         start_time = time.time()
         
-        # 快速路径
-        quick_result = self._try_quick_path(user_message)
+        # 追问复用 / 快速路径
+        path = "followup"
+        quick_result = self._try_followup(user_message)
+        if not quick_result:
+            path = "quick"
+            quick_result = self._try_quick_path(user_message)
         if quick_result:
             elapsed = time.time() - start_time
+            self._finish_turn(user_message, quick_result, path=path)
             yield {"type": "answer", "answer": quick_result, "elapsed": f"{elapsed:.2f}s"}
             return
         
         # Agent 循环
         self.state.reset()
-        self.conversation_history = [{"role": "user", "content": user_message}]
+        self.llm_steps = 0
+        self.conversation_history = self._initial_history(user_message)
+        self._start_speculation(user_message)
         
         for step in range(1, self.max_steps + 1):
             step_start = time.time()
@@ -241,7 +379,7 @@ class Agent:
             
             yield {"type": "tool_call", "step": step, "tool": tool_name, "params": tool_params}
             
-            result = self.tool_registry.execute(tool_name, tool_params)
+            result = self._execute_tool(tool_name, tool_params)
             step_elapsed = time.time() - step_start
             
             yield {
@@ -259,26 +397,40 @@ class Agent:
             })
         
         # 最终回答
+        self._stop_speculation()
         answer = self._generate_final_answer()
         total_elapsed = time.time() - start_time
-        yield {"type": "answer", "answer": answer, "elapsed": f"{total_elapsed:.2f}s"}
+        self._finish_turn(user_message, answer)
+        yield {
+            "type": "answer",
+            "answer": answer,
+            "elapsed": f"{total_elapsed:.2f}s",
+            "prompt_prefix": self.prompt_prefix.to_report(),
+        }
     
     def _call_llm(self) -> Optional[str]:
         """调用 LLM"""
-        try:
-            response = self.client.chat.completions.create(
-                model=CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    *self.conversation_history
-                ],
-                temperature=0.7,
-                max_tokens=1500,
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"[Agent] LLM 错误: {e}")
-            return None
+        self.llm_steps += 1
+        with tracer.span("llm.chat", model=CHAT_MODEL, prefix_hash=self.prompt_prefix.hash) as span:
+            try:
+                with track_call(LLM_LATENCY, LLM_ERRORS, model=CHAT_MODEL, op="chat"):
+                    response = self.client.chat.completions.create(
+                        model=CHAT_MODEL,
+                        messages=[
+                            {"role": "system", "content": self.system_prompt},
+                            *self.conversation_history
+                        ],
+                        temperature=0.7,
+                        max_tokens=1500,
+                    )
+                annotate_llm_usage(span, response)
+                record_llm_usage(CHAT_MODEL, response)
+                return response.choices[0].message.content
+            except Exception as e:
+                if span:
+                    span.fail(e)
+                print(f"[Agent] LLM 错误: {e}")
+                return None
     
     def _parse_response(self, response: str) -> tuple:
         """解析响应"""
@@ -304,15 +456,19 @@ class Agent:
                 "role": "user",
                 "content": "请简洁回答用户问题，不要使用标签。"
             })
-            response = self.client.chat.completions.create(
-                model=CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": "你是招投标助手，请简洁回答。"},
-                    *self.conversation_history
-                ],
-                temperature=0.7,
-                max_tokens=1000,
-            )
+            with tracer.span("llm.final_answer", model=CHAT_MODEL) as span, \
+                    track_call(LLM_LATENCY, LLM_ERRORS, model=CHAT_MODEL, op="final_answer"):
+                response = self.client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=[
+                        {"role": "system", "content": "你是招投标助手，请简洁回答。"},
+                        *self.conversation_history
+                    ],
+                    temperature=0.7,
+                    max_tokens=1000,
+                )
+                annotate_llm_usage(span, response)
+            record_llm_usage(CHAT_MODEL, response)
             return response.choices[0].message.content
         except Exception as e:
             return f"生成回答出错: {e}"
\ No newline at end of file
@@ -0,0 +1,461 @@
+"""
+意图路由
+用 Aho–Corasick 关键词自动机 + 槽位抽取，把简单查询直接路由到参数化的工具调用，
+不经过 LLM
+
+类比：前台分诊
+- 关键词自动机：一眼扫过问题，认出"业绩""律师""统计"等关键字
+- 槽位抽取：记下"近三年""500万以上""常年顾问"这些条件
+- 置信度：拿不准的（复杂问题、条件冲突）一律转给 Agent 处理
+"""
+
+import re
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 直接执行工具所需的最低置信度
+QUICK_PATH_THRESHOLD = 0.75
+
+# 最佳意图与次佳意图的最小分差，低于此值视为歧义
+AMBIGUITY_MARGIN = 0.2
+
+# 去掉槽位后仍然很短的问题视为简单查询
+SHORT_QUERY_LEN = 10
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region Aho–Corasick 自动机
+# ============================================
+
+class KeywordAutomaton:
+    """
+    Aho–Corasick 多模式匹配自动机
+    一次扫描找出文本中所有关键词，复杂度 O(文本长度 + 命中数)
+    """
+
+    def __init__(self, keywords: Dict[str, Any]):
+        """
+        参数:
+            keywords: 关键词 -> 附带数据
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, Any]]] = [[]]
+
+        for word, payload in keywords.items():
+            self._add(word, payload)
+        self._build()
+
+    def _add(self, word: str, payload: Any) -> None:
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append((word, payload))
+
+    def _build(self) -> None:
+        """BFS 构建失败指针"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Tuple[int, str, Any]]:
+        """
+        查找所有命中
+
+        返回:
+            (结束位置, 关键词, 附带数据) 列表
+        """
+        hits = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for word, payload in self._output[state]:
+                hits.append((i, word, payload))
+        return hits
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 关键词表
+# ============================================
+
+# 实体关键词：意图 -> {关键词: 权重}
+ENTITY_KEYWORDS = {
+    "performances": {"业绩": 1.0, "案例": 0.8, "合同": 0.7, "项目": 0.5},
+    "lawyers": {"律师": 1.0, "承办人": 0.8, "团队成员": 0.8},
+    "enterprises": {"企业": 1.0, "客户": 0.9, "公司": 0.6, "单位": 0.5},
+}
+
+# 统计关键词
+STATS_KEYWORDS = {"统计": 1.0, "汇总": 1.0, "总金额": 1.0, "总数": 0.9, "一共多少": 0.9, "多少条": 0.8}
+
+# 列表类动作词：出现时说明是简单列举
+ACTION_KEYWORDS = ("查询", "查看", "列表", "列出", "所有", "全部", "有哪些", "哪些", "看看", "给我")
+
+# 复杂意图标志：出现时交给 Agent 推理
+COMPLEX_KEYWORDS = (
+    "匹配", "推荐", "分析", "比较", "对比", "评估", "为什么", "如何", "怎么",
+    "是否", "能否", "满足", "符合", "要求", "资格", "写", "生成", "起草", "建议",
+)
+
+# 国企标志
+STATE_OWNED_KEYWORDS = ("国企", "国有", "央企")
+
+# 合同类型
+CONTRACT_TYPE_KEYWORDS = {
+    "常年法律顾问": "常年法律顾问合同",
+    "常年顾问": "常年法律顾问合同",
+    "法律顾问": "常年法律顾问合同",
+    "常年": "常年法律顾问合同",
+    "委托代理": "委托代理合同",
+    "诉讼": "委托代理合同",
+    "仲裁": "委托代理合同",
+    "专项": "专项法律服务",
+}
+
+# 中文数字
+CN_NUMBERS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5,
+              "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+
+# 意图 -> 工具
+INTENT_TOOLS = {
+    "performances": "search_performances",
+    "lawyers": "search_lawyers",
+    "enterprises": "search_enterprises",
+    "stats": "get_performance_stats",
+}
+
+# 各工具支持的槽位
+TOOL_SLOTS = {
+    "search_performances": {"years", "min_amount", "max_amount", "contract_type", "keyword"},
+    "search_lawyers": set(),
+    "search_enterprises": {"is_state_owned"},
+    "get_performance_stats": set(),
+}
+
+# 数值槽位正则
+YEARS_PATTERN = re.compile(r"(?:近|最近|过去)([0-9一二两三四五六七八九十]+)年")
+AMOUNT_PATTERN = re.compile(
+    r"(超过|大于|高于|不低于|不少于|低于|小于|不超过|不高于)?\s*([0-9]+(?:\.[0-9]+)?)\s*(万|亿)(?:元)?\s*(以上|及以上|以下|及以下)?"
+)
+TOPIC_PATTERN = re.compile(r"([\u4e00-\u9fff]{2,6}?)(?:行业|领域|类|方面|相关)的?(?:业绩|案例|合同)")
+
+# 槽位抽取没有消化掉的数字、日期（"2023年""今年""三月"），说明还有工具参数表达不了的条件
+UNPARSED_PATTERN = re.compile(
+    r"[0-9]+(?:\.[0-9]+)?[年月日号个份条笔家万亿元]?|[零〇一二两三四五六七八九十百千]+[年月日号个份条笔家万亿元]|今年|去年|前年|本年|上半年|下半年|年度|季度|月份"
+)
+
+# 指代词：问的是上下文里的某一条记录，列表工具答不了
+DEICTIC_WORDS = ("这个", "那个", "这份", "那份", "这些", "那些", "这家", "那家", "该", "此")
+
+# 疑问词：问的是某个字段的值（"金额是多少""哪家公司"），不是要列表
+INTERROGATIVE_WORDS = ("多少", "哪", "几", "什么", "谁")
+
+# 不影响查询条件的虚词、客套话；去掉这些之后还剩下中文/英文内容（"张三律师""华为的业绩"），
+# 说明有工具参数表达不了的条件（人名、甲方、地区、排序等）
+FILLER_WORDS = ("我们", "我的", "我", "请", "麻烦", "一下", "参与", "目前", "现在", "是", "有", "都",
+                "吗", "呢", "吧", "啊", "了")
+CONTENT_PATTERN = re.compile(r"[\u4e00-\u9fffa-z]+")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 槽位抽取
+# ============================================
+
+def parse_number(token: str) -> Optional[float]:
+    """解析阿拉伯数字或简单中文数字（一 ~ 十九）"""
+    try:
+        return float(token)
+    except ValueError:
+        pass
+    if token in CN_NUMBERS:
+        return float(CN_NUMBERS[token])
+    if len(token) == 2 and token[0] == "十" and token[1] in CN_NUMBERS:
+        return float(10 + CN_NUMBERS[token[1]])
+    if len(token) == 2 and token[1] == "十" and token[0] in CN_NUMBERS:
+        return float(CN_NUMBERS[token[0]] * 10)
+    return None
+
+
+# 主题前的常见引导词
+TOPIC_PREFIXES = ("查询", "查看", "看看", "给我", "我们", "所有", "全部", "有哪些", "哪些", "近期", "最近", "的")
+
+
+def _clean_topic(topic: str) -> str:
+    """去掉主题前的引导词，如 查询能源 → 能源"""
+    changed = True
+    while changed:
+        changed = False
+        for prefix in TOPIC_PREFIXES:
+            if topic.startswith(prefix):
+                topic = topic[len(prefix):]
+                changed = True
+    return topic
+
+
+def extract_slots(message: str) -> Dict[str, Any]:
+    """
+    抽取查询条件槽位
+
+    支持:
+        years: 近N年 / 最近N年
+        min_amount / max_amount: N万以上 / 超过N万 / N亿以下（单位：万元）
+        contract_type: 常年顾问 / 委托代理 / 专项
+        is_state_owned: 国企 / 国有 / 央企
+        keyword: "能源行业的业绩"中的"能源"
+    """
+    slots: Dict[str, Any] = {}
+
+    match = YEARS_PATTERN.search(message)
+    if match:
+        years = parse_number(match.group(1))
+        if years:
+            slots["years"] = int(years)
+
+    match = AMOUNT_PATTERN.search(message)
+    if match:
+        prefix, number, unit, suffix = match.groups()
+        value = float(number) * (10000 if unit == "亿" else 1)
+        if prefix in ("低于", "小于", "不超过", "不高于") or suffix in ("以下", "及以下"):
+            slots["max_amount"] = value
+        elif prefix or suffix:
+            slots["min_amount"] = value
+
+    for word in sorted(CONTRACT_TYPE_KEYWORDS, key=len, reverse=True):
+        if word in message:
+            slots["contract_type"] = CONTRACT_TYPE_KEYWORDS[word]
+            break
+
+    if any(word in message for word in STATE_OWNED_KEYWORDS):
+        slots["is_state_owned"] = True
+
+    # 先去掉数值条件，避免"近三年能源行业"被整体当作主题
+    topic_text = AMOUNT_PATTERN.sub(" ", YEARS_PATTERN.sub(" ", message))
+    match = TOPIC_PATTERN.search(topic_text)
+    if match:
+        topic = _clean_topic(match.group(1))
+        if len(topic) >= 2:
+            slots["keyword"] = topic
+
+    return slots
+
+def strip_slot_text(message: str) -> str:
+    """去掉槽位相关文本，剩余部分用于判断问题是否足够简单"""
+    text = YEARS_PATTERN.sub("", message)
+    # 没有"以上/以下"等方向的金额（"500万的合同"）抽不成槽位，保留下来作为未解析条件
+    text = AMOUNT_PATTERN.sub(lambda m: "" if m.group(1) or m.group(4) else m.group(0), text)
+    text = TOPIC_PATTERN.sub("", text)
+    for word in sorted(CONTRACT_TYPE_KEYWORDS, key=len, reverse=True):
+        text = text.replace(word, "")
+    for word in STATE_OWNED_KEYWORDS + ("#",):
+        text = text.replace(word, "")
+    return text.replace("的", "")
+
+
+def unparsed_tokens(residual: str, intent: str) -> List[str]:
+    """
+    找出槽位抽取后仍未消化的内容：数字/日期、指代词、疑问词，
+    以及去掉虚词后剩下的任何中文/英文词（人名、甲方、地区等）
+
+    参数:
+        residual: 去掉槽位文本和关键词后剩下的部分
+        intent: 识别出的意图（统计类问题本身就是在问"多少"）
+    返回:
+        未消化的词列表，为空表示可以直接执行
+    """
+    tokens = UNPARSED_PATTERN.findall(residual)
+    rest = UNPARSED_PATTERN.sub(" ", residual)
+    for word in DEICTIC_WORDS + INTERROGATIVE_WORDS:
+        if word in rest:
+            if word in DEICTIC_WORDS or intent != "stats":
+                tokens.append(word)
+            rest = rest.replace(word, " ")
+    for word in FILLER_WORDS:
+        rest = rest.replace(word, " ")
+    return tokens + CONTENT_PATTERN.findall(rest)
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 路由结果
+# ============================================
+
+class IntentMatch(BaseModel):
+    """意图识别结果"""
+    intent: Optional[str] = Field(None, description="意图（performances/lawyers/enterprises/stats）")
+    tool: Optional[str] = Field(None, description="对应工具")
+    params: Dict[str, Any] = Field(default_factory=dict, description="工具参数")
+    confidence: float = Field(0.0, description="置信度 0~1")
+    reason: str = Field("", description="未路由的原因")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 意图路由器
+# ============================================
+
+class IntentRouter:
+    """
+    本地意图路由器
+    关键词自动机在构造时编译一次，之后每次路由只需一次线性扫描
+    """
+
+    def __init__(self, threshold: float = QUICK_PATH_THRESHOLD):
+        self.threshold = threshold
+
+        keywords: Dict[str, Any] = {}
+        for intent, words in ENTITY_KEYWORDS.items():
+            for word, weight in words.items():
+                keywords[word] = ("entity", intent, weight)
+        for word, weight in STATS_KEYWORDS.items():
+            keywords[word] = ("entity", "stats", weight)
+        for word in ACTION_KEYWORDS:
+            keywords.setdefault(word, ("action", None, 0.0))
+        for word in COMPLEX_KEYWORDS:
+            keywords.setdefault(word, ("complex", None, 0.0))
+        self._automaton = KeywordAutomaton(keywords)
+
+    def classify(self, message: str) -> IntentMatch:
+        """
+        识别意图（总是返回结果，由 confidence 决定是否可直接执行）
+
+        参数:
+            message: 用户消息
+        返回:
+            IntentMatch
+        """
+        text = message.lower().strip()
+        slots = extract_slots(text)
+        
+        # 屏蔽国企类词，避免"国企业绩"中的"企业"被误认为查企业
+        scan_text = text
+        for word in STATE_OWNED_KEYWORDS:
+            scan_text = scan_text.replace(word, "#")
+        hits = self._automaton.find_all(scan_text)
+
+        scores: Dict[str, float] = {}
+        has_action = False
+        complex_hits = []
+        for _, word, (kind, intent, weight) in hits:
+            if kind == "entity":
+                scores[intent] = max(scores.get(intent, 0.0), weight)
+            elif kind == "action":
+                has_action = True
+            else:
+                complex_hits.append(word)
+
+        # 业绩专属条件本身就说明是在找业绩
+        if {"years", "min_amount", "max_amount", "contract_type", "keyword"} & slots.keys():
+            scores["performances"] = max(scores.get("performances", 0.0), 0.8)
+        # 只说"国企有哪些"时指企业
+        if slots.get("is_state_owned") and not scores:
+            scores["enterprises"] = 0.8
+
+        if not scores:
+            return IntentMatch(reason="未识别到查询对象")
+
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        intent, confidence = ranked[0]
+
+        # 统计和业绩同时出现时，统计优先（"业绩统计"）
+        if "stats" in scores and intent == "performances":
+            intent, confidence = "stats", scores["stats"]
+            ranked = [r for r in ranked if r[0] != "performances"]
+
+        tool = INTENT_TOOLS[intent]
+        match = IntentMatch(intent=intent, tool=tool)
+
+        # 复杂问题交给 Agent
+        if complex_hits:
+            match.reason = f"包含复杂意图: {'、'.join(complex_hits)}"
+            return match
+
+        # 多个实体得分接近，视为歧义
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < AMBIGUITY_MARGIN:
+            confidence *= 0.5
+            match.reason = f"意图歧义: {ranked[0][0]}/{ranked[1][0]}"
+
+        # 条件无法由该工具表达（如"国企业绩"），交给 Agent
+        unsupported = set(slots) - TOOL_SLOTS[tool]
+        if unsupported:
+            match.confidence = round(confidence * 0.4, 3)
+            match.reason = f"工具不支持条件: {sorted(unsupported)}"
+            return match
+
+        residual = strip_slot_text(scan_text)
+        for _, word, _ in hits:
+            residual = residual.replace(word, "")
+
+        # 还有没被抽成参数的条件（"2023年的业绩""这个合同的金额是多少"），
+        # 直接执行会忽略这些条件、返回错误的数据，交给 Agent
+        leftovers = unparsed_tokens(residual, intent)
+        if leftovers:
+            match.confidence = round(confidence * 0.4, 3)
+            match.reason = f"包含未解析的条件: {'、'.join(leftovers)}"
+            return match
+
+        # 明确的列举动作或足够短的问题提升置信度
+        if has_action or len(residual) <= SHORT_QUERY_LEN:
+            confidence = min(1.0, confidence + 0.2)
+        else:
+            confidence *= 0.7
+
+        match.params = {k: v for k, v in slots.items() if k in TOOL_SLOTS[tool]}
+        match.confidence = round(confidence, 3)
+        return match
+
+    def route(self, message: str) -> Optional[IntentMatch]:
+        """
+        路由消息，置信度达到阈值时返回可直接执行的结果
+
+        参数:
+            message: 用户消息
+        返回:
+            IntentMatch，不可直接执行时返回 None
+        """
+        match = self.classify(message)
+        if match.tool and match.confidence >= self.threshold:
+            return match
+        return None
+
+
+# 全局路由器实例
+intent_router = IntentRouter()
+
+# endregion
+# ============================================
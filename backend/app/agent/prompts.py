@@ -3,11 +3,16 @@ Agent 提示词管理
 加载和格式化提示词模板
 """
 
+import hashlib
+import threading
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
 
 from app.tools import tool_registry
 from app.agent.state import AgentStep
+from app.telemetry.metrics import record_cache
 
 
 # ============================================
@@ -25,22 +30,55 @@ PROMPTS_DIR = Path(__file__).parent.parent.parent.parent / "prompts"
 # region 提示词加载
 # ============================================
 
+# 模板缓存: name -> (mtime_ns, 内容)
+_template_cache: Dict[str, Tuple[int, str]] = {}
+_template_lock = threading.Lock()
+
+
+def get_prompt_mtime(name: str) -> int:
+    """
+    获取提示词文件的修改时间（纳秒）
+    
+    参数:
+        name: 提示词文件名（不含 .md 扩展名）
+    返回:
+        mtime_ns
+    """
+    prompt_path = PROMPTS_DIR / f"{name}.md"
+    
+    try:
+        return prompt_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"提示词文件不存在: {prompt_path}")
+
+
 def load_prompt(name: str) -> str:
     """
     加载提示词模板
+    文件只在首次加载或 mtime 变化时读取，其余情况直接返回缓存
     
     参数:
         name: 提示词文件名（不含 .md 扩展名）
     返回:
         提示词内容
     """
-    prompt_path = PROMPTS_DIR / f"{name}.md"
+    mtime = get_prompt_mtime(name)
     
-    if not prompt_path.exists():
-        raise FileNotFoundError(f"提示词文件不存在: {prompt_path}")
+    cached = _template_cache.get(name)
+    if cached and cached[0] == mtime:
+        return cached[1]
     
-    with open(prompt_path, "r", encoding="utf-8") as f:
-        return f.read()
+    with _template_lock:
+        cached = _template_cache.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        prompt_path = PROMPTS_DIR / f"{name}.md"
+        with open(prompt_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        
+        _template_cache[name] = (mtime, content)
+        return content
 
 # endregion
 # ============================================
@@ -105,6 +143,10 @@ def build_system_prompt(task: str, steps: List[AgentStep] = None) -> str:
     返回:
         完整的提示词
     """
+    # 无任务和历史时即为系统前缀，直接复用已编译的版本
+    if not task and not steps:
+        return prompt_assembler.get_system_prefix().text
+    
     # 加载模板
     template = load_prompt("agent_system")
     
@@ -126,6 +168,98 @@ def build_system_prompt(task: str, steps: List[AgentStep] = None) -> str:
 # endregion
 # ============================================
 
+# ============================================
+# region 系统提示词前缀缓存
+# ============================================
+
+class PromptPrefix(BaseModel):
+    """
+    已编译的系统提示词前缀
+    内容在模板和工具集合不变时字节级稳定，便于服务端提示词缓存命中
+    """
+    text: str = Field(..., description="系统提示词内容")
+    hash: str = Field(..., description="内容 SHA-256（前 16 位）")
+    size: int = Field(..., description="UTF-8 字节数")
+    template_mtime: int = Field(..., description="模板文件 mtime_ns")
+    registry_version: int = Field(..., description="工具注册表版本")
+    
+    def to_report(self) -> dict:
+        """用于日志/接口返回的摘要"""
+        return {"hash": self.hash, "size": self.size}
+
+
+class PromptAssembler:
+    """
+    系统提示词组装器
+    
+    模板和工具目录只编译一次；模板文件 mtime 或工具注册表版本变化时才重新生成，
+    其余请求直接复用同一份前缀对象。
+    """
+    
+    def __init__(self, template_name: str = "agent_system"):
+        self.template_name = template_name
+        self._prefix: Optional[PromptPrefix] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+    
+    def _is_fresh(self, prefix: Optional[PromptPrefix], mtime: int, version: int) -> bool:
+        return (
+            prefix is not None
+            and prefix.template_mtime == mtime
+            and prefix.registry_version == version
+        )
+    
+    def get_system_prefix(self) -> PromptPrefix:
+        """
+        获取系统提示词前缀（必要时重新编译）
+        
+        返回:
+            PromptPrefix
+        """
+        mtime = get_prompt_mtime(self.template_name)
+        version = tool_registry.version
+        
+        prefix = self._prefix
+        if self._is_fresh(prefix, mtime, version):
+            record_cache("prompt_prefix", hit=True)
+            return prefix
+        record_cache("prompt_prefix", hit=False)
+        
+        with self._lock:
+            if self._is_fresh(self._prefix, mtime, version):
+                return self._prefix
+            
+            template = load_prompt(self.template_name)
+            text = template.format(
+                tools=tool_registry.get_tools_prompt(),
+                task="",
+                history="",
+            )
+            data = text.encode("utf-8")
+            
+            self._prefix = PromptPrefix(
+                text=text,
+                hash=hashlib.sha256(data).hexdigest()[:16],
+                size=len(data),
+                template_mtime=mtime,
+                registry_version=version,
+            )
+            self.builds += 1
+            print(f"[提示词] 系统前缀已编译: hash={self._prefix.hash}, size={self._prefix.size}B")
+            return self._prefix
+    
+    def invalidate(self) -> None:
+        """强制下次请求时重新编译"""
+        with self._lock:
+            self._prefix = None
+
+
+# 全局组装器实例
+prompt_assembler = PromptAssembler()
+
+# endregion
+# ============================================
+
 # ============================================
 # region 简化版系统提示词
 # ============================================
@@ -0,0 +1,523 @@
+"""
+对话会话管理
+按 conversation_id 保存多轮对话，支持增量摘要、结果引用和空闲淘汰
+
+类比：律师的案卷夹
+- 摘要页：早期沟通要点（压缩后）
+- 近期记录：最近几轮原话
+- 附件索引：每次查询结果的编号，追问时直接翻出来，不用重新检索
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.config import (
+    SILICONFLOW_API_KEY,
+    SILICONFLOW_BASE_URL,
+    CHAT_MODEL,
+    SESSION_TOKEN_BUDGET,
+    SESSION_IDLE_TTL,
+    SESSION_RETENTION,
+)
+from app.db.database import SessionLocal
+from app.db.models import ChatSession
+from app.agent.intent import extract_slots
+from app.telemetry.metrics import record_cache
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 压缩时至少保留的近期消息数
+MIN_RECENT_MESSAGES = 4
+
+# 保留的结果引用数
+MAX_RESULT_REFS = 20
+
+# 追问复用时保存的最大结果行数
+MAX_RESULT_ROWS = 200
+
+# 内存中最多缓存的会话数
+MAX_CACHED_SESSIONS = 500
+
+# 空闲淘汰扫描间隔（秒）
+SWEEP_INTERVAL = 60
+
+# 工具名 -> 返回结果中记录列表的键
+RESULT_ROW_KEYS = {
+    "search_performances": "performances",
+    "search_enterprises": "enterprises",
+    "search_lawyers": "lawyers",
+    "get_all_lawyers": "lawyers",
+}
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region Token 估算
+# ============================================
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本 token 数
+    中文约 1 字 1 token，其余字符约 4 个 1 token
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 会话对象
+# ============================================
+
+class ConversationSession:
+    """
+    单个对话会话
+
+    - summary: 早期对话摘要
+    - messages: 近期消息（仅用户问题和最终回答，工具结果以引用代替）
+    - result_refs: 工具结果引用（工具名、参数、命中数）
+    - last_result: 最近一次结果集，供"只看近三年的"这类追问直接复用
+    """
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.summary: str = ""
+        self.messages: List[dict] = []
+        self.result_refs: List[dict] = []
+        self.last_result: Optional[dict] = None
+        self.turn_count = 0
+        self.last_access = time.time()
+        # 同一会话的并发轮次依次保存（压缩 + 写库），避免互相覆盖
+        self.save_lock = threading.Lock()
+
+    # ---------- 历史 ----------
+
+    def token_count(self) -> int:
+        """估算当前历史的 token 数"""
+        total = estimate_tokens(self.summary)
+        for msg in self.messages:
+            total += estimate_tokens(msg.get("content", ""))
+        return total
+
+    def context_messages(self) -> List[dict]:
+        """生成供 LLM 使用的历史消息（摘要 + 近期消息）"""
+        context = []
+        if self.summary:
+            context.append({
+                "role": "user",
+                "content": f"以下是之前对话的摘要，供参考：\n{self.summary}",
+            })
+            context.append({"role": "assistant", "content": "好的，我已了解之前的对话。"})
+        context.extend(self.messages)
+        return context
+
+    def add_turn(self, user_message: str, answer: str, refs: Optional[List[str]] = None) -> None:
+        """
+        记录一轮对话
+
+        参数:
+            user_message: 用户问题
+            answer: 最终回答
+            refs: 本轮产生的结果引用ID
+        """
+        self.messages.append({"role": "user", "content": user_message})
+
+        content = answer or ""
+        if refs:
+            content += "\n\n（参考结果：" + "、".join(refs) + "）"
+        self.messages.append({"role": "assistant", "content": content})
+        self.turn_count += 1
+
+    # ---------- 结果引用 ----------
+
+    def remember_result(self, tool_name: str, params: dict, result: dict) -> Optional[str]:
+        """
+        记录工具结果引用，并保存结果集供追问复用
+
+        参数:
+            tool_name: 工具名称
+            params: 调用参数
+            result: registry.execute 的返回
+        返回:
+            引用ID（如 r3），结果无效时返回 None
+        """
+        if not result or not result.get("success"):
+            return None
+
+        data = result.get("data") or {}
+        row_key = RESULT_ROW_KEYS.get(tool_name)
+        rows = data.get(row_key, []) if row_key and isinstance(data, dict) else []
+
+        ref_id = f"r{len(self.result_refs) + 1}"
+        self.result_refs.append({
+            "ref": ref_id,
+            "tool": tool_name,
+            "params": params,
+            "count": len(rows) if row_key else None,
+            "ids": [r.get("id") or r.get("credit_code") for r in rows[:50]],
+        })
+        self.result_refs = self.result_refs[-MAX_RESULT_REFS:]
+
+        if row_key:
+            self.last_result = {
+                "ref": ref_id,
+                "tool": tool_name,
+                "kind": row_key,
+                "params": params,
+                "rows": rows[:MAX_RESULT_ROWS],
+            }
+
+        return ref_id
+
+    def ref_summary(self, ref_id: str) -> str:
+        """引用的简短描述，替代完整 JSON 放入历史"""
+        for ref in self.result_refs:
+            if ref["ref"] == ref_id:
+                count = f"{ref['count']} 条" if ref["count"] is not None else "已返回"
+                return f"[{ref_id}] {ref['tool']}({ref['params']}) → {count}"
+        return f"[{ref_id}]"
+
+    # ---------- 序列化 ----------
+
+    def load_record(self, record: ChatSession) -> None:
+        """从数据库记录恢复"""
+        self.summary = record.summary or ""
+        self.messages = record.messages or []
+        self.result_refs = record.result_refs or []
+        self.last_result = record.last_result
+        self.turn_count = record.turn_count or 0
+
+    def dump_record(self, record: ChatSession) -> None:
+        """写入数据库记录"""
+        record.summary = self.summary
+        record.messages = list(self.messages)
+        record.result_refs = list(self.result_refs)
+        record.last_result = self.last_result
+        record.turn_count = self.turn_count
+        record.updated_at = datetime.now()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 增量摘要
+# ============================================
+
+SUMMARY_PROMPT = """请把以下招投标助手的对话压缩为简洁的要点摘要，保留用户关注的条件（甲方、金额、年限、合同类型等）和已得到的结论，不超过300字。
+
+已有摘要：
+{summary}
+
+新增对话：
+{dialog}
+"""
+
+
+def summarize_messages(summary: str, messages: List[dict]) -> str:
+    """
+    将已有摘要与一批旧消息合并为新摘要
+    LLM 不可用时退化为截断拼接
+
+    参数:
+        summary: 已有摘要
+        messages: 需要折叠的消息
+    返回:
+        新摘要
+    """
+    dialog = "\n".join(
+        f"{'用户' if m['role'] == 'user' else '助手'}: {m['content']}" for m in messages
+    )
+
+    try:
+        from openai import OpenAI
+        client = OpenAI(api_key=SILICONFLOW_API_KEY, base_url=SILICONFLOW_BASE_URL)
+        response = client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[{
+                "role": "user",
+                "content": SUMMARY_PROMPT.format(summary=summary or "（无）", dialog=dialog),
+            }],
+            temperature=0.3,
+            max_tokens=500,
+        )
+        new_summary = response.choices[0].message.content
+        if new_summary:
+            return new_summary.strip()
+    except Exception as e:
+        print(f"[会话] 摘要生成失败，使用截断: {e}")
+
+    merged = (summary + "\n" + dialog).strip() if summary else dialog
+    return merged[-800:]
+
+
+def compact_session(session: ConversationSession, budget: int = SESSION_TOKEN_BUDGET) -> bool:
+    """
+    历史超出预算时，将最早的消息增量折叠进摘要
+
+    参数:
+        session: 会话
+        budget: token 预算
+    返回:
+        是否执行了压缩
+    """
+    if session.token_count() <= budget:
+        return False
+
+    # 从最早的消息开始折叠，直到剩余部分回到预算的一半以内
+    target = budget // 2
+    fold_count = 0
+    remaining = session.token_count()
+    while (
+        remaining > target
+        and len(session.messages) - fold_count > MIN_RECENT_MESSAGES
+    ):
+        remaining -= estimate_tokens(session.messages[fold_count].get("content", ""))
+        fold_count += 1
+
+    # 成对折叠，避免留下孤立的回答
+    fold_count -= fold_count % 2
+    if fold_count == 0:
+        return False
+
+    folded = session.messages[:fold_count]
+    session.summary = summarize_messages(session.summary, folded)
+    session.messages = session.messages[fold_count:]
+    print(f"[会话] {session.conversation_id} 已压缩 {fold_count} 条消息")
+    return True
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 追问识别
+# ============================================
+
+# 追问标志词
+FOLLOWUP_MARKERS = ("只看", "只要", "其中", "筛选", "过滤", "这些", "上面", "刚才", "再看")
+
+# 可在已有业绩结果集上本地过滤的条件
+FOLLOWUP_FILTER_KEYS = ("years", "min_amount", "max_amount", "contract_type")
+
+
+def parse_followup_filters(message: str) -> Dict[str, object]:
+    """
+    从追问中解析过滤条件（复用意图路由的槽位抽取）
+
+    支持：
+        近N年 → years
+        N万以上 / N万以下 → min_amount / max_amount（万元）
+        常年顾问 / 委托代理 / 专项 → contract_type
+    """
+    slots = extract_slots(message)
+    return {k: v for k, v in slots.items() if k in FOLLOWUP_FILTER_KEYS}
+
+
+def is_followup(message: str) -> bool:
+    """是否是针对上一轮结果的追问"""
+    return any(marker in message for marker in FOLLOWUP_MARKERS)
+
+
+def filter_rows(rows: List[dict], filters: Dict[str, object]) -> List[dict]:
+    """
+    在已有业绩结果集上本地过滤，不访问数据库
+
+    参数:
+        rows: Performance.to_dict() 列表
+        filters: parse_followup_filters 的结果
+    返回:
+        过滤后的行
+    """
+    cutoff = None
+    if filters.get("years"):
+        cutoff = str((datetime.now() - timedelta(days=int(filters["years"]) * 365)).date())
+
+    result = []
+    for row in rows:
+        if cutoff and (not row.get("sign_date") or row["sign_date"] < cutoff):
+            continue
+        amount = row.get("amount")
+        if "min_amount" in filters and (amount is None or amount < filters["min_amount"]):
+            continue
+        if "max_amount" in filters and (amount is None or amount > filters["max_amount"]):
+            continue
+        if filters.get("contract_type") and row.get("contract_type") != filters["contract_type"]:
+            continue
+        result.append(row)
+    return result
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 会话存储
+# ============================================
+
+class SessionStore:
+    """
+    会话存储（内存 LRU + 数据库持久化）
+
+    - 内存中缓存活跃会话，空闲超过 SESSION_IDLE_TTL 后淘汰
+    - 数据库中保留 SESSION_RETENTION 秒，之后删除
+    """
+
+    def __init__(
+        self,
+        idle_ttl: int = SESSION_IDLE_TTL,
+        retention: int = SESSION_RETENTION,
+        max_cached: int = MAX_CACHED_SESSIONS,
+    ):
+        self.idle_ttl = idle_ttl
+        self.retention = retention
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    @staticmethod
+    def new_id() -> str:
+        """生成新的会话ID"""
+        return uuid.uuid4().hex
+
+    def get(self, conversation_id: Optional[str]) -> ConversationSession:
+        """
+        获取会话（不存在则创建）
+
+        参数:
+            conversation_id: 会话ID，为空时新建
+        返回:
+            ConversationSession
+        """
+        self._maybe_sweep()
+        conversation_id = conversation_id or self.new_id()
+
+        with self._lock:
+            session = self._cache.get(conversation_id)
+            if session:
+                self._cache.move_to_end(conversation_id)
+                session.last_access = time.time()
+                record_cache("session", hit=True)
+                return session
+        record_cache("session", hit=False)
+
+        session = ConversationSession(conversation_id)
+        db = SessionLocal()
+        try:
+            record = db.get(ChatSession, conversation_id)
+            if record:
+                session.load_record(record)
+        except Exception as e:
+            print(f"[会话] 加载失败 {conversation_id}: {e}")
+        finally:
+            db.close()
+
+        with self._lock:
+            # 并发加载时以先放入缓存的为准
+            existing = self._cache.get(conversation_id)
+            if existing:
+                return existing
+            self._cache[conversation_id] = session
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return session
+
+    def save(self, session: ConversationSession) -> None:
+        """
+        压缩并持久化会话（同一会话的保存串行执行）
+
+        压缩可能调用 LLM 生成摘要，是阻塞操作，异步接口中应放到线程里执行:
+            await asyncio.to_thread(session_store.save, session)
+        """
+        with session.save_lock:
+            compact_session(session)
+            session.last_access = time.time()
+
+            db = SessionLocal()
+            try:
+                record = db.get(ChatSession, session.conversation_id)
+                if record is None:
+                    record = ChatSession(conversation_id=session.conversation_id)
+                    db.add(record)
+                session.dump_record(record)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"[会话] 保存失败 {session.conversation_id}: {e}")
+            finally:
+                db.close()
+
+    def delete(self, conversation_id: str) -> bool:
+        """删除会话"""
+        with self._lock:
+            self._cache.pop(conversation_id, None)
+
+        db = SessionLocal()
+        try:
+            deleted = db.query(ChatSession).filter(
+                ChatSession.conversation_id == conversation_id
+            ).delete()
+            db.commit()
+            return deleted > 0
+        finally:
+            db.close()
+
+    def evict_idle(self) -> int:
+        """
+        淘汰空闲会话
+
+        返回:
+            从内存中淘汰的数量
+        """
+        now = time.time()
+        with self._lock:
+            idle_ids = [
+                cid for cid, s in self._cache.items()
+                if now - s.last_access > self.idle_ttl
+            ]
+            for cid in idle_ids:
+                del self._cache[cid]
+
+        # 清理数据库中过期会话
+        db = SessionLocal()
+        try:
+            cutoff = datetime.now() - timedelta(seconds=self.retention)
+            db.query(ChatSession).filter(ChatSession.updated_at < cutoff).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[会话] 清理过期会话失败: {e}")
+        finally:
+            db.close()
+
+        if idle_ids:
+            print(f"[会话] 淘汰空闲会话 {len(idle_ids)} 个")
+        return len(idle_ids)
+
+    def _maybe_sweep(self) -> None:
+        """按间隔触发淘汰扫描"""
+        if time.time() - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = time.time()
+        self.evict_idle()
+
+
+# 全局会话存储
+session_store = SessionStore()
+
+# endregion
+# ============================================
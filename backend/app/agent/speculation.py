@@ -0,0 +1,238 @@
+"""
+工具调用预取（推测执行）
+在等待 LLM 思考的同时，根据用户消息预测第一步最可能调用的工具并提前执行；
+模型选中相同动作时直接复用结果，否则丢弃
+
+类比：助理听到"查一下能源类业绩"就先去档案室翻资料，
+律师想好之后开口要的正是这份，就能立刻递上
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Optional, Tuple
+
+from app.tools import ToolRegistry
+from app.agent.intent import intent_router
+from app.telemetry import tracer
+from app.telemetry.metrics import record_cache
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 只预取只读工具，避免产生副作用
+SPECULATIVE_TOOLS = {
+    "search_performances",
+    "search_lawyers",
+    "search_enterprises",
+    "get_all_lawyers",
+}
+
+# 每次最多预取的候选数
+MAX_CANDIDATES = 2
+
+# 预取线程池（进程内共享）
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculate")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 命中统计
+# ============================================
+
+class SpeculationStats:
+    """预取命中率和节省时间统计（进程级）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def record_launch(self, count: int) -> None:
+        with self._lock:
+            self.launched += count
+
+    def record_hit(self, saved: float) -> None:
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += saved
+
+    def record_miss(self, count: int) -> None:
+        with self._lock:
+            self.misses += count
+
+    def snapshot(self) -> dict:
+        """当前统计快照"""
+        with self._lock:
+            resolved = self.hits + self.misses
+            return {
+                "launched": self.launched,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / resolved, 4) if resolved else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "avg_saved_seconds": round(self.saved_seconds / self.hits, 3) if self.hits else 0.0,
+            }
+
+
+# 全局统计
+speculation_stats = SpeculationStats()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 预测
+# ============================================
+
+def normalize_params(params: Optional[dict]) -> Tuple:
+    """参数归一化（忽略空值），用于判断预取是否命中"""
+    items = []
+    for key, value in (params or {}).items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        items.append((key, value))
+    return tuple(sorted(items))
+
+
+def predict_tool_calls(message: str) -> List[Tuple[str, dict]]:
+    """
+    预测第一步最可能的工具调用
+
+    参数:
+        message: 用户消息
+    返回:
+        [(工具名, 参数), ...]，按可能性排序
+    """
+    match = intent_router.classify(message)
+    candidates: List[Tuple[str, dict]] = []
+
+    if match.tool in SPECULATIVE_TOOLS:
+        candidates.append((match.tool, dict(match.params)))
+
+    # 业绩类问题常见的第二候选：只按关键词搜索
+    if match.intent == "performances" and match.params.get("keyword"):
+        alt = ("search_performances", {"keyword": match.params["keyword"]})
+        if alt not in candidates:
+            candidates.append(alt)
+
+    return candidates[:MAX_CANDIDATES]
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 推测执行器
+# ============================================
+
+class _Pending:
+    """一个预取中的工具调用"""
+
+    def __init__(self, tool_name: str, params: dict, future: Future):
+        self.tool_name = tool_name
+        self.params = params
+        self.future = future
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+
+class SpeculativeExecutor:
+    """
+    单次 Agent 运行内的推测执行器
+
+    用法:
+        spec = SpeculativeExecutor(registry)
+        spec.start(user_message)          # 与 LLM 请求并行
+        result = spec.take(tool, params)  # 命中返回结果，否则 None
+        spec.discard()                    # 运行结束，丢弃未使用的结果
+    """
+
+    def __init__(self, tool_registry: ToolRegistry, stats: SpeculationStats = speculation_stats):
+        self.tool_registry = tool_registry
+        self.stats = stats
+        self._pending: Dict[Tuple, _Pending] = {}
+
+    def start(self, message: str) -> int:
+        """
+        根据消息启动预取
+
+        返回:
+            启动的候选数
+        """
+        for tool_name, params in predict_tool_calls(message):
+            key = (tool_name, normalize_params(params))
+            if key in self._pending:
+                continue
+            pending = _Pending(tool_name, params, None)
+            # 复制上下文，使预取的 span 挂在当前 Agent 链路下
+            ctx = contextvars.copy_context()
+            pending.future = _executor.submit(ctx.run, self._run, pending)
+            self._pending[key] = pending
+
+        if self._pending:
+            self.stats.record_launch(len(self._pending))
+            names = ", ".join(p.tool_name for p in self._pending.values())
+            print(f"[预取] 已启动: {names}")
+        return len(self._pending)
+
+    def _run(self, pending: _Pending) -> dict:
+        try:
+            with tracer.span("agent.speculate", tool=pending.tool_name):
+                return self.tool_registry.execute(pending.tool_name, pending.params)
+        finally:
+            pending.finished = time.time()
+
+    def take(self, tool_name: str, params: Optional[dict]) -> Optional[dict]:
+        """
+        取出与模型动作匹配的预取结果
+
+        参数:
+            tool_name: 模型选择的工具
+            params: 模型给出的参数
+        返回:
+            工具结果，未命中返回 None
+        """
+        pending = self._pending.pop((tool_name, normalize_params(params)), None)
+        record_cache("speculation", hit=pending is not None)
+        if pending is None:
+            return None
+
+        requested = time.time()
+        try:
+            result = pending.future.result()
+        except Exception as e:
+            print(f"[预取] 结果不可用: {e}")
+            self.stats.record_miss(1)
+            return None
+
+        # 节省时间 = 工具耗时 - 模型选定动作后仍需等待的时间
+        finished = pending.finished or time.time()
+        tool_elapsed = finished - pending.started
+        waited = max(0.0, finished - requested)
+        saved = max(0.0, tool_elapsed - waited)
+        self.stats.record_hit(saved)
+        print(f"[预取] 命中 {tool_name}，节省 {saved:.2f}s")
+        return result
+
+    def discard(self) -> None:
+        """丢弃所有未使用的预取"""
+        if not self._pending:
+            return
+        for pending in self._pending.values():
+            pending.future.cancel()
+        self.stats.record_miss(len(self._pending))
+        self._pending.clear()
+
+# endregion
+# ============================================
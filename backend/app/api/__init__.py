@@ -8,6 +8,8 @@ from app.api.performance import router as performance_router
 from app.api.enterprise import router as enterprise_router
 from app.api.lawyer import router as lawyer_router
 from app.api.upload import router as upload_router
+from app.api.debug import router as debug_router
+from app.api.metrics import router as metrics_router
 
 __all__ = [
     "health_router",
@@ -16,4 +18,6 @@ __all__ = [
     "enterprise_router",
     "lawyer_router",
     "upload_router",
+    "debug_router",
+    "metrics_router",
 ]
\ No newline at end of file
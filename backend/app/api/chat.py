@@ -3,14 +3,17 @@
 提供 Agent 对话接口，支持 SSE 流式推送
 """
 
+import asyncio
 import json
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 
 from app.tools import tool_registry
 from app.agent import Agent
+from app.agent.session import session_store
+from app.agent.speculation import speculation_stats
 
 
 # ============================================
@@ -31,6 +34,7 @@ class ChatRequest(BaseModel):
     """对话请求"""
     message: str = Field(..., min_length=1, max_length=2000, description="用户消息")
     max_steps: Optional[int] = Field(None, ge=1, le=20, description="最大执行步骤")
+    conversation_id: Optional[str] = Field(None, max_length=64, description="会话ID（为空时新建会话）")
 
 
 class ChatResponse(BaseModel):
@@ -38,6 +42,8 @@ class ChatResponse(BaseModel):
     answer: str = Field(..., description="Agent 回答")
     steps: int = Field(..., description="执行步骤数")
     tool_calls: list = Field(default_factory=list, description="工具调用记录")
+    conversation_id: str = Field(..., description="会话ID（追问时回传）")
+    prompt_prefix: Optional[dict] = Field(None, description="系统提示词前缀 hash 和大小")
 
 # endregion
 # ============================================
@@ -68,24 +74,22 @@ async def chat(request: ChatRequest):
     """
     ensure_tools_registered()
     
-    agent = Agent(max_steps=request.max_steps or 10)
-    result = agent.run(request.message)
-    
-    # 提取工具调用记录
-    tool_calls = [
-        {
-            "tool": step.tool_name,
-            "params": step.tool_params,
-            "success": step.error is None,
-        }
-        for step in result.steps
-        if step.tool_name
-    ]
+    session = session_store.get(request.conversation_id)
+    agent = Agent(
+        tool_registry=tool_registry,
+        max_steps=request.max_steps or 10,
+        session=session,
+    )
+    answer = agent.run(request.message)
+    # 保存时可能调用 LLM 压缩历史，放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(session_store.save, session)
     
     return ChatResponse(
-        answer=result.final_answer or "抱歉，我无法完成这个任务。",
-        steps=result.current_step,
-        tool_calls=tool_calls,
+        answer=answer or "抱歉，我无法完成这个任务。",
+        steps=len(agent.tool_calls),
+        tool_calls=agent.tool_calls,
+        conversation_id=session.conversation_id,
+        prompt_prefix=agent.prompt_prefix.to_report(),
     )
 
 
@@ -97,20 +101,32 @@ async def chat_stream(request: ChatRequest):
     """
     ensure_tools_registered()
     
+    session = session_store.get(request.conversation_id)
     agent = Agent(
-            tool_registry=tool_registry,
-            max_steps=request.max_steps or 10
-        )
+        tool_registry=tool_registry,
+        max_steps=request.max_steps or 10,
+        session=session,
+    )
     
     async def event_generator():
         """生成 SSE 事件流"""
-        for event in agent.run_stream(request.message):
-            event_type = event.get("event", "message")
-            event_data = event.get("data", {})
-            
-            # SSE 格式: event: xxx\ndata: xxx\n\n
-            yield f"event: {event_type}\n"
-            yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+        # 先告知前端会话ID，便于追问时回传
+        yield "event: session\n"
+        yield f"data: {json.dumps({'conversation_id': session.conversation_id})}\n\n"
+        
+        stream = agent.run_stream(request.message)
+        try:
+            for event in stream:
+                event_type = event.get("type", "message")
+                
+                # SSE 格式: event: xxx\ndata: xxx\n\n
+                yield f"event: {event_type}\n"
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            # 客户端断开或出错时同样释放 Agent 资源并保存会话；
+            # shield 保证请求被取消时保存照常在线程里完成
+            stream.close()
+            await asyncio.shield(asyncio.to_thread(session_store.save, session))
     
     return StreamingResponse(
         event_generator(),
@@ -123,6 +139,24 @@ async def chat_stream(request: ChatRequest):
     )
 
 
+@router.delete("/sessions/{conversation_id}")
+async def delete_session(conversation_id: str):
+    """
+    删除会话（清空多轮上下文）
+    """
+    if not session_store.delete(conversation_id):
+        raise HTTPException(status_code=404, detail="会话不存在")
+    return {"message": "删除成功", "conversation_id": conversation_id}
+
+
+@router.get("/speculation/stats")
+async def get_speculation_stats():
+    """
+    工具预取命中率和节省时间统计
+    """
+    return speculation_stats.snapshot()
+
+
 @router.get("/tools")
 async def list_tools():
     """
@@ -0,0 +1,58 @@
+"""
+调试路由
+查看进程内记录的链路追踪（各阶段耗时）和慢查询
+"""
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+
+from app.db.database import slow_queries
+from app.telemetry import tracer
+
+
+# ============================================
+# region 路由定义
+# ============================================
+
+router = APIRouter(prefix="/debug")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 链路追踪接口
+# ============================================
+
+@router.get("/traces")
+async def list_traces(
+    limit: int = Query(20, ge=1, le=200, description="返回的链路数"),
+    name: Optional[str] = Query(None, description="按根 span 名称过滤，如 agent.run / http.request"),
+):
+    """
+    最近的链路追踪
+    每条链路包含所有 span 及其耗时，按开始时间排序
+    """
+    return {
+        "enabled": tracer.enabled,
+        "traces": tracer.get_traces(limit=limit, name=name),
+    }
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """单条链路的全部 span"""
+    spans = tracer.get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="链路不存在或已被淘汰")
+    return {"trace_id": trace_id, "spans": spans}
+
+
+@router.get("/slow-queries")
+async def list_slow_queries(limit: int = Query(20, ge=1, le=100, description="返回条数")):
+    """最近的慢查询（含执行计划），阈值由 DB_SLOW_QUERY_MS 配置"""
+    items = list(slow_queries)[-limit:]
+    return {"count": len(items), "queries": list(reversed(items))}
+
+# endregion
+# ============================================
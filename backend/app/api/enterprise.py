@@ -4,13 +4,16 @@
 """
 
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.db import crud
+from app.services.stats import stats_service
+from app.services.bulk_import import import_records, detect_format, DEFAULT_BATCH_SIZE
 from app.schemas import (
     EnterpriseCreate,
+    BulkImportResponse,
     EnterpriseUpdate,
     EnterpriseResponse,
 )
@@ -115,6 +118,25 @@ async def create_enterprise(
     enterprise = crud.create_enterprise(db, data)
     return enterprise
 
+
+@router.post("/bulk", response_model=BulkImportResponse)
+def bulk_import_enterprises(
+    file: UploadFile = File(..., description="CSV（首行为字段名）或 JSONL 文件"),
+    format: Optional[str] = Query(None, description="csv / jsonl，默认按扩展名判断"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000, description="每批写入行数"),
+    db: Session = Depends(get_db),
+):
+    """
+    批量导入企业
+    按 credit_code（统一社会信用代码） 新增或更新；
+    单行校验或写入失败只记录在 errors 中，不影响其他行
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return import_records(db, "enterprises", file.file, fmt, batch_size=batch_size)
+
 # endregion
 # ============================================
 
@@ -167,44 +189,12 @@ async def delete_enterprise(
 # ============================================
 
 @router.get("/stats/summary")
-async def get_enterprise_stats(db: Session = Depends(get_db)):
+async def get_enterprise_stats():
     """
     获取企业统计信息
+    读取预计算快照（写入后 STATS_MAX_STALENESS 秒内更新）
     """
-    from sqlalchemy import func
-    from app.db.models import Enterprise
-    
-    # 总数
-    total_count = db.query(func.count(Enterprise.credit_code)).scalar()
-    
-    # 国企数量
-    state_owned_count = db.query(func.count(Enterprise.credit_code)).filter(
-        Enterprise.is_state_owned == True
-    ).scalar()
-    
-    # 按行业统计
-    industry_stats = db.query(
-        Enterprise.industry,
-        func.count(Enterprise.credit_code).label("count"),
-    ).group_by(Enterprise.industry).all()
-    
-    # 自动填充数量
-    auto_filled_count = db.query(func.count(Enterprise.credit_code)).filter(
-        Enterprise.auto_filled == True
-    ).scalar()
-    
-    return {
-        "total_count": total_count,
-        "state_owned_count": state_owned_count,
-        "auto_filled_count": auto_filled_count,
-        "by_industry": [
-            {
-                "industry": item[0] or "未分类",
-                "count": item[1],
-            }
-            for item in industry_stats
-        ],
-    }
+    return stats_service.get("enterprises")
 
 # endregion
 # ============================================
\ No newline at end of file
@@ -4,10 +4,12 @@
 """
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
 from app.db.database import get_db
+from app.services.ocr_engine import ocr_engine
 
 
 # ============================================
@@ -28,14 +30,29 @@ router = APIRouter()
 async def health_check():
     """
     基础健康检查
-    返回服务运行状态
+    返回服务运行状态（进程存活即 healthy，是否可接流量见 ready）
     """
     return {
         "status": "healthy",
         "service": "bidding-assistant-api",
+        "ready": ocr_engine.ready,
+        "ocr": ocr_engine.describe(),
     }
 
 
+@router.get("/health/ready")
+async def readiness_check():
+    """
+    就绪检查（负载均衡 / k8s readinessProbe 使用）
+    需要预加载 OCR 模型的进程在模型加载并预热完成前返回 503
+    """
+    body = {
+        "status": "ready" if ocr_engine.ready else "starting",
+        "ocr": ocr_engine.describe(),
+    }
+    return JSONResponse(body, status_code=200 if ocr_engine.ready else 503)
+
+
 @router.get("/health/db")
 async def database_health_check(db: Session = Depends(get_db)):
     """
@@ -97,5 +114,25 @@ async def tables_health_check(db: Session = Depends(get_db)):
             "error": str(e),
         }
 
+
+@router.get("/health/embedding")
+async def embedding_health_check():
+    """
+    嵌入后端检查
+    返回当前使用的后端（remote / local）及本地模型加载状态
+    """
+    from app.services.embedding_backend import get_embedding_backend
+    
+    try:
+        return {
+            "status": "healthy",
+            **get_embedding_backend().describe(),
+        }
+    except Exception as e:
+        return {
+            "status": "unhealthy",
+            "error": str(e),
+        }
+
 # endregion
 # ============================================
\ No newline at end of file
@@ -4,13 +4,16 @@
 """
 
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.db import crud
+from app.services.stats import stats_service
+from app.services.bulk_import import import_records, detect_format, DEFAULT_BATCH_SIZE
 from app.schemas import (
     LawyerCreate,
+    BulkImportResponse,
     LawyerUpdate,
     LawyerResponse,
 )
@@ -109,6 +112,25 @@ async def create_lawyer(
     lawyer = crud.create_lawyer(db, data)
     return lawyer
 
+
+@router.post("/bulk", response_model=BulkImportResponse)
+def bulk_import_lawyers(
+    file: UploadFile = File(..., description="CSV（首行为字段名）或 JSONL 文件"),
+    format: Optional[str] = Query(None, description="csv / jsonl，默认按扩展名判断"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000, description="每批写入行数"),
+    db: Session = Depends(get_db),
+):
+    """
+    批量导入律师
+    按 license_no（执业证号，为空时总是新增）新增或更新；
+    单行校验或写入失败只记录在 errors 中，不影响其他行
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return import_records(db, "lawyers", file.file, fmt, batch_size=batch_size)
+
 # endregion
 # ============================================
 
@@ -161,33 +183,12 @@ async def delete_lawyer(
 # ============================================
 
 @router.get("/stats/summary")
-async def get_lawyer_stats(db: Session = Depends(get_db)):
+async def get_lawyer_stats():
     """
     获取律师统计信息
+    读取预计算快照（写入后 STATS_MAX_STALENESS 秒内更新）
     """
-    from sqlalchemy import func
-    from app.db.models import Lawyer
-    
-    # 总数
-    total_count = db.query(func.count(Lawyer.id)).scalar()
-    
-    # 有执业证号的数量
-    with_license_count = db.query(func.count(Lawyer.id)).filter(
-        Lawyer.license_no.isnot(None),
-        Lawyer.license_no != "",
-    ).scalar()
-    
-    # 有简历的数量
-    with_resume_count = db.query(func.count(Lawyer.id)).filter(
-        Lawyer.resume.isnot(None),
-        Lawyer.resume != "",
-    ).scalar()
-    
-    return {
-        "total_count": total_count,
-        "with_license_count": with_license_count,
-        "with_resume_count": with_resume_count,
-    }
+    return stats_service.get("lawyers")
 
 # endregion
 # ============================================
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+运行指标路由
+以 Prometheus 文本格式暴露请求耗时、依赖调用、缓存命中等指标
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.telemetry.metrics import metrics
+
+
+# ============================================
+# region 路由定义
+# ============================================
+
+router = APIRouter()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 指标接口
+# ============================================
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Prometheus 抓取接口
+    
+    常用查询:
+        P99 延迟: histogram_quantile(0.99, sum by (le, route) (rate(http_request_duration_seconds_bucket[5m])))
+        OCR 吞吐: rate(ocr_pages_total[5m])
+        快速路径命中率: agent_quick_path_hit_ratio
+    """
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+# endregion
+# ============================================
@@ -4,13 +4,19 @@
 """
 
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.db import crud
+from app.services.stats import stats_service
+from app.services.bulk_import import import_records, detect_format, DEFAULT_BATCH_SIZE
+from app.services.export import EXPORT_FORMATS, parquet_available, stream_export
 from app.schemas import (
     PerformanceCreate,
+    BulkImportResponse,
     PerformanceUpdate,
     PerformanceResponse,
 )
@@ -68,6 +74,45 @@ async def search_performances(
     return performances
 
 
+@router.get("/export")
+def export_performances(
+    format: str = Query("ndjson", description="ndjson / csv / parquet（parquet 需安装 pyarrow）"),
+    party_a: Optional[str] = Query(None, description="甲方名称（模糊匹配）"),
+    contract_type: Optional[str] = Query(None, description="合同类型"),
+    min_amount: Optional[float] = Query(None, ge=0, description="最小金额"),
+    max_amount: Optional[float] = Query(None, ge=0, description="最大金额"),
+    years: Optional[int] = Query(None, ge=1, le=10, description="近N年"),
+    keyword: Optional[str] = Query(None, description="关键词"),
+    include_raw_text: bool = Query(False, description="是否包含 OCR 原文"),
+):
+    """
+    流式导出业绩（筛选条件与搜索接口相同）
+    服务端游标分批读取、边读边写，不含图片和向量列，适合导出整个业绩库
+    """
+    fmt = format.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="服务端未安装 pyarrow，无法导出 Parquet")
+    
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"performances_{date.today():%Y%m%d}.{extension}"
+    return StreamingResponse(
+        stream_export(
+            fmt,
+            include_raw_text=include_raw_text,
+            party_a=party_a,
+            contract_type=contract_type,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            years=years,
+            keyword=keyword,
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/{performance_id}", response_model=PerformanceResponse)
 async def get_performance(
     performance_id: int,
@@ -105,6 +150,25 @@ async def create_performance(
     performance = crud.create_performance(db, data)
     return performance
 
+
+@router.post("/bulk", response_model=BulkImportResponse)
+def bulk_import_performances(
+    file: UploadFile = File(..., description="CSV（首行为字段名）或 JSONL 文件"),
+    format: Optional[str] = Query(None, description="csv / jsonl，默认按扩展名判断"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=5000, description="每批写入行数"),
+    db: Session = Depends(get_db),
+):
+    """
+    批量导入业绩
+    按 file_name（文件名） 新增或更新；
+    单行校验或写入失败只记录在 errors 中，不影响其他行
+    """
+    try:
+        fmt = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return import_records(db, "performances", file.file, fmt, batch_size=batch_size)
+
 # endregion
 # ============================================
 
@@ -157,38 +221,12 @@ async def delete_performance(
 # ============================================
 
 @router.get("/stats/summary")
-async def get_performance_stats(db: Session = Depends(get_db)):
+async def get_performance_stats():
     """
     获取业绩统计信息
+    读取预计算快照（写入后 STATS_MAX_STALENESS 秒内更新）
     """
-    from sqlalchemy import func
-    from app.db.models import Performance
-    
-    # 总数
-    total_count = db.query(func.count(Performance.id)).scalar()
-    
-    # 总金额
-    total_amount = db.query(func.sum(Performance.amount)).scalar() or 0
-    
-    # 按合同类型统计
-    type_stats = db.query(
-        Performance.contract_type,
-        func.count(Performance.id).label("count"),
-        func.sum(Performance.amount).label("amount"),
-    ).group_by(Performance.contract_type).all()
-    
-    return {
-        "total_count": total_count,
-        "total_amount": float(total_amount),
-        "by_type": [
-            {
-                "type": item[0] or "未分类",
-                "count": item[1],
-                "amount": float(item[2] or 0),
-            }
-            for item in type_stats
-        ],
-    }
+    return stats_service.get("performances")
 
 # endregion
 # ============================================
\ No newline at end of file
@@ -3,8 +3,10 @@
 功能：暴露向量搜索服务为 REST API
 """
 
+import asyncio
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 
@@ -14,6 +16,9 @@ from app.services.vector_search import (
     hybrid_search_performances,
     search_lawyers_by_resume,
 )
+from app.services.chunk_index import search_performance_chunks
+from app.services.coalescing import SingleFlight
+from app.services.search_cache import search_cache, etag_for
 
 
 # ============================================
@@ -22,6 +27,44 @@ from app.services.vector_search import (
 
 router = APIRouter(prefix="/search", tags=["语义搜索"])
 
+# 相同搜索请求的并发合并（截止日前大量用户同时搜索同一内容时，只算一次）
+search_flight = SingleFlight("search")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 结果缓存
+# ============================================
+
+async def _cached_search(http_request: Request, kind: str, search_request: BaseModel, tables, compute):
+    """
+    带缓存的搜索：ETag 未变化返回 304，缓存命中直接返回，否则合并并发请求后计算
+
+    参数:
+        http_request: 原始请求（读取 If-None-Match）
+        kind: 搜索类型
+        search_request: 请求参数（全部参与缓存键）
+        tables: 结果依赖的表版本名
+        compute: 实际搜索函数，返回响应模型
+    """
+    key = search_cache.make_key(kind, search_request.model_dump(), tables)
+    etag = etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if etag in http_request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    payload = search_cache.get(key)
+    if payload is None:
+        result = await asyncio.to_thread(search_flight.do, key, compute)
+        payload = result.model_dump(mode="json")
+        search_cache.put(key, payload)
+    
+    # 规范化后相同的查询共用缓存，回显本次请求的原文
+    return JSONResponse({**payload, "query": search_request.query}, headers=headers)
+
 # endregion
 # ============================================
 
@@ -34,7 +77,16 @@ class SemanticSearchRequest(BaseModel):
     """语义搜索请求体"""
     query: str = Field(..., min_length=1, max_length=500, description="搜索查询文本")
     top_k: int = Field(10, ge=1, le=50, description="返回结果数量")
-    mode: str = Field("hybrid", description="搜索模式: vector/keyword/hybrid")
+    mode: str = Field("hybrid", description="搜索模式: vector/keyword/hybrid/chunks")
+    pooling: str = Field("max", description="chunks 模式的文档聚合方式: max/sum")
+
+
+class ChunkSnippet(BaseModel):
+    """原文命中片段（chunks 模式）"""
+    page: Optional[int] = Field(None, description="所在页码")
+    chunk_index: int
+    score: float
+    text: str
 
 
 class PerformanceSearchResult(BaseModel):
@@ -48,6 +100,7 @@ class PerformanceSearchResult(BaseModel):
     project_detail: Optional[str] = None
     summary: Optional[str] = None
     score: float = Field(..., description="相似度得分（越高越相似）")
+    snippets: List[ChunkSnippet] = Field(default_factory=list, description="原文命中片段（chunks 模式）")
 
     class Config:
         from_attributes = True
@@ -92,6 +145,7 @@ class LawyerSearchResponse(BaseModel):
 @router.post("/semantic/performances", response_model=SearchResponse)
 async def search_performances_semantic(
     request: SemanticSearchRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
 ):
     """
@@ -103,95 +157,133 @@ async def search_performances_semantic(
         - [vector](cci:1://file:///e:/.Program/Python/bidding-assistant/backend/app/services/vector_search.py:132:0-195:37): 纯向量搜索（理解语义）
         - [keyword](cci:1://file:///e:/.Program/Python/bidding-assistant/config/settings.py:135:0-152:25): 纯关键词搜索（精确匹配）
         - [hybrid](cci:1://file:///e:/.Program/Python/bidding-assistant/backend/app/services/vector_search.py:198:0-254:18): 混合搜索（推荐，兼顾语义和精确）
+        - chunks: 原文分块搜索（检索合同正文中的条款，返回命中片段）
+    - **pooling**: chunks 模式下的文档聚合方式（max / sum）
+    
+    结果按表版本缓存（业绩有写入即失效），响应带 ETag；
+    同一时刻相同（query, mode, top_k, pooling）的请求只执行一次，共享结果
     """
     try:
-        if request.mode == "vector":
-            # 纯向量搜索
-            results = search_performances_by_vector(
-                db=db,
-                query=request.query,
-                top_k=request.top_k,
+        return await _cached_search(
+            http_request, "performances", request, ["performances"],
+            lambda: _run_performance_search(db, request),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+
+
+def _run_performance_search(db: Session, request: SemanticSearchRequest) -> SearchResponse:
+    """执行业绩搜索并转换为响应（不含 ORM 对象，可在合并的请求间共享）"""
+    if request.mode == "vector":
+        # 纯向量搜索
+        results = search_performances_by_vector(
+            db=db,
+            query=request.query,
+            top_k=request.top_k,
+        )
+        # 距离转相似度得分
+        search_results = [
+            PerformanceSearchResult(
+                id=perf.id,
+                file_name=perf.file_name,
+                party_a=perf.party_a,
+                contract_type=perf.contract_type,
+                amount=float(perf.amount) if perf.amount else None,
+                sign_date=str(perf.sign_date) if perf.sign_date else None,
+                project_detail=perf.project_detail[:200] if perf.project_detail else None,
+                summary=perf.summary[:200] if perf.summary else None,
+                score=round(1 - distance / 2, 4),  # 距离转相似度
             )
-            # 距离转相似度得分
-            search_results = [
-                PerformanceSearchResult(
-                    id=perf.id,
-                    file_name=perf.file_name,
-                    party_a=perf.party_a,
-                    contract_type=perf.contract_type,
-                    amount=float(perf.amount) if perf.amount else None,
-                    sign_date=str(perf.sign_date) if perf.sign_date else None,
-                    project_detail=perf.project_detail[:200] if perf.project_detail else None,
-                    summary=perf.summary[:200] if perf.summary else None,
-                    score=round(1 - distance / 2, 4),  # 距离转相似度
-                )
-                for perf, distance in results
-            ]
-        
-        elif request.mode == "keyword":
-            # 纯关键词搜索
-            from app.db.crud import search_performances
-            results = search_performances(db=db, keyword=request.query)
-            search_results = [
-                PerformanceSearchResult(
-                    id=perf.id,
-                    file_name=perf.file_name,
-                    party_a=perf.party_a,
-                    contract_type=perf.contract_type,
-                    amount=float(perf.amount) if perf.amount else None,
-                    sign_date=str(perf.sign_date) if perf.sign_date else None,
-                    project_detail=perf.project_detail[:200] if perf.project_detail else None,
-                    summary=perf.summary[:200] if perf.summary else None,
-                    score=1.0,  # 关键词命中给满分
-                )
-                for perf in results[:request.top_k]
-            ]
-        
-        else:  # hybrid
-            # 混合搜索
-            results = hybrid_search_performances(
-                db=db,
-                query=request.query,
-                top_k=request.top_k,
+            for perf, distance in results
+        ]
+    
+    elif request.mode == "keyword":
+        # 纯关键词搜索
+        from app.db.crud import search_performances
+        results = search_performances(db=db, keyword=request.query)
+        search_results = [
+            PerformanceSearchResult(
+                id=perf.id,
+                file_name=perf.file_name,
+                party_a=perf.party_a,
+                contract_type=perf.contract_type,
+                amount=float(perf.amount) if perf.amount else None,
+                sign_date=str(perf.sign_date) if perf.sign_date else None,
+                project_detail=perf.project_detail[:200] if perf.project_detail else None,
+                summary=perf.summary[:200] if perf.summary else None,
+                score=1.0,  # 关键词命中给满分
             )
-            search_results = [
-                PerformanceSearchResult(
-                    id=perf.id,
-                    file_name=perf.file_name,
-                    party_a=perf.party_a,
-                    contract_type=perf.contract_type,
-                    amount=float(perf.amount) if perf.amount else None,
-                    sign_date=str(perf.sign_date) if perf.sign_date else None,
-                    project_detail=perf.project_detail[:200] if perf.project_detail else None,
-                    summary=perf.summary[:200] if perf.summary else None,
-                    score=round(score, 4),
-                )
-                for perf, score in results
-            ]
-        
-        return SearchResponse(
+            for perf in results[:request.top_k]
+        ]
+    
+    elif request.mode == "chunks":
+        # 原文分块搜索
+        results = search_performance_chunks(
+            db=db,
             query=request.query,
-            mode=request.mode,
-            total=len(search_results),
-            results=search_results,
+            top_k=request.top_k,
+            pooling=request.pooling,
         )
+        search_results = [
+            PerformanceSearchResult(
+                id=perf.id,
+                file_name=perf.file_name,
+                party_a=perf.party_a,
+                contract_type=perf.contract_type,
+                amount=float(perf.amount) if perf.amount else None,
+                sign_date=str(perf.sign_date) if perf.sign_date else None,
+                project_detail=perf.project_detail[:200] if perf.project_detail else None,
+                summary=perf.summary[:200] if perf.summary else None,
+                score=round(score, 4),
+                snippets=[ChunkSnippet(**snippet) for snippet in snippets],
+            )
+            for perf, score, snippets in results
+        ]
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+    else:  # hybrid
+        # 混合搜索
+        results = hybrid_search_performances(
+            db=db,
+            query=request.query,
+            top_k=request.top_k,
+        )
+        search_results = [
+            PerformanceSearchResult(
+                id=perf.id,
+                file_name=perf.file_name,
+                party_a=perf.party_a,
+                contract_type=perf.contract_type,
+                amount=float(perf.amount) if perf.amount else None,
+                sign_date=str(perf.sign_date) if perf.sign_date else None,
+                project_detail=perf.project_detail[:200] if perf.project_detail else None,
+                summary=perf.summary[:200] if perf.summary else None,
+                score=round(score, 4),
+            )
+            for perf, score in results
+        ]
+    
+    return SearchResponse(
+        query=request.query,
+        mode=request.mode,
+        total=len(search_results),
+        results=search_results,
+    )
 
 
 @router.get("/semantic/performances")
 async def search_performances_get(
+    http_request: Request,
     q: str = Query(..., min_length=1, description="搜索关键词"),
     top_k: int = Query(10, ge=1, le=50, description="返回数量"),
     mode: str = Query("hybrid", description="搜索模式"),
+    pooling: str = Query("max", description="chunks 模式的文档聚合方式"),
     db: Session = Depends(get_db),
 ):
     """
     业绩语义搜索（GET 方法，便于浏览器测试）
     """
-    request = SemanticSearchRequest(query=q, top_k=top_k, mode=mode)
-    return await search_performances_semantic(request, db)
+    request = SemanticSearchRequest(query=q, top_k=top_k, mode=mode, pooling=pooling)
+    return await search_performances_semantic(request, http_request, db)
 
 # endregion
 # ============================================
@@ -204,6 +296,7 @@ async def search_performances_get(
 @router.post("/semantic/lawyers", response_model=LawyerSearchResponse)
 async def search_lawyers_semantic(
     request: SemanticSearchRequest,
+    http_request: Request,
     db: Session = Depends(get_db),
 ):
     """
@@ -212,33 +305,41 @@ async def search_lawyers_semantic(
     - **query**: 需求描述，如 "有能源行业诉讼经验"
     - **top_k**: 返回结果数量
     """
+    params = SemanticSearchRequest(query=request.query, top_k=request.top_k)
     try:
-        results = search_lawyers_by_resume(
-            db=db,
-            query=request.query,
-            top_k=request.top_k,
-        )
-        
-        search_results = [
-            LawyerSearchResult(
-                id=lawyer.id,
-                name=lawyer.name,
-                license_no=lawyer.license_no,
-                resume=lawyer.resume[:300] if lawyer.resume else None,
-                score=round(1 - distance / 2, 4),
-            )
-            for lawyer, distance in results
-        ]
-        
-        return LawyerSearchResponse(
-            query=request.query,
-            total=len(search_results),
-            results=search_results,
+        return await _cached_search(
+            http_request, "lawyers", params, ["lawyers"],
+            lambda: _run_lawyer_search(db, request),
         )
-    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
+
+def _run_lawyer_search(db: Session, request: SemanticSearchRequest) -> LawyerSearchResponse:
+    """执行律师搜索并转换为响应"""
+    results = search_lawyers_by_resume(
+        db=db,
+        query=request.query,
+        top_k=request.top_k,
+    )
+    
+    search_results = [
+        LawyerSearchResult(
+            id=lawyer.id,
+            name=lawyer.name,
+            license_no=lawyer.license_no,
+            resume=lawyer.resume[:300] if lawyer.resume else None,
+            score=round(1 - distance / 2, 4),
+        )
+        for lawyer, distance in results
+    ]
+    
+    return LawyerSearchResponse(
+        query=request.query,
+        total=len(search_results),
+        results=search_results,
+    )
+
 # endregion
 # ============================================
 
@@ -274,7 +375,7 @@ async def get_search_stats(db: Session = Depends(get_db)):
     """
     获取搜索相关统计信息
     """
-    from app.db.models import Performance, Lawyer
+    from app.db.models import Performance, PerformanceChunk, Lawyer
     from sqlalchemy import func
     
     # 统计业绩数据
@@ -289,6 +390,12 @@ async def get_search_stats(db: Session = Depends(get_db)):
         Lawyer.resume_embedding.isnot(None)
     ).scalar()
     
+    # 统计原文分块
+    total_chunks, indexed_performances = db.query(
+        func.count(PerformanceChunk.id),
+        func.count(func.distinct(PerformanceChunk.performance_id)),
+    ).one()
+    
     return {
         "performances": {
             "total": total_performances,
@@ -300,6 +407,10 @@ async def get_search_stats(db: Session = Depends(get_db)):
             "with_embedding": lawyers_with_embedding,
             "without_embedding": total_lawyers - lawyers_with_embedding,
         },
+        "chunks": {
+            "total": total_chunks,
+            "indexed_performances": indexed_performances,
+        },
     }
 
 # endregion
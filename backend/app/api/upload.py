@@ -3,23 +3,21 @@
 提供合同 PDF 上传和解析功能
 """
 
+import asyncio
 import io
-from datetime import datetime
-from typing import Optional
+import json
+from typing import Dict, Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 
+from app.config import BATCH_FILE_CONCURRENCY, UPLOAD_NEAR_DUPLICATE
 from app.db.database import get_db
-from app.db import crud
-from app.schemas import PerformanceCreate, PerformanceResponse
-from app.services import (
-    pdf_bytes_to_images,
-    ocr_images,
-    filter_watermarks,
-    extract_contract_info,
-    images_to_blob,
-)
+from app.schemas import PerformanceResponse
+
+# OCR / 提取服务依赖 numpy、PIL、pdf2image、openai 等较重的库，
+# 在接口内首次调用时才导入，不拖慢应用启动
 
 
 # ============================================
@@ -58,6 +56,13 @@ class ExtractResult(BaseModel):
     is_state_owned: bool = False
 
 
+class StageTiming(BaseModel):
+    """流水线阶段耗时"""
+    start: float = Field(..., description="相对流水线开始的时间（秒）")
+    seconds: float = Field(..., description="阶段耗时（秒）")
+    wait: float = Field(0, description="等待并发名额的时间（秒）")
+
+
 class UploadResponse(BaseModel):
     """上传响应"""
     success: bool = Field(..., description="是否成功")
@@ -66,7 +71,11 @@ class UploadResponse(BaseModel):
     page_count: int = Field(0, description="PDF 页数")
     ocr_text_length: int = Field(0, description="OCR 文本长度")
     extracted_info: Optional[ExtractResult] = Field(None, description="提取的合同信息")
-    performance_id: Optional[int] = Field(None, description="保存后的业绩 ID")
+    performance_id: Optional[int] = Field(None, description="保存后的业绩 ID（重复上传时为已有记录的 ID）")
+    duplicate_of: Optional[int] = Field(None, description="内容与已有记录相同（或近似）时，该记录的 ID")
+    similarity: Optional[float] = Field(None, description="与已有记录相同页面的占比（内容完全相同为 1）")
+    timings: Dict[str, StageTiming] = Field(default_factory=dict, description="流水线各阶段耗时（按开始时间排序）")
+    elapsed_seconds: Optional[float] = Field(None, description="流水线端到端耗时（秒）")
 
 # endregion
 # ============================================
@@ -84,6 +93,8 @@ async def upload_and_ocr(
     """
     上传 PDF 并进行 OCR 识别（仅识别，不提取信息）
     """
+    from app.services.ocr import extract_text_from_pdf
+    
     # 验证文件类型
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="只支持 PDF 文件")
@@ -92,26 +103,12 @@ async def upload_and_ocr(
         # 读取文件内容
         pdf_bytes = await file.read()
         
-        # 转换为图片
-        images = pdf_bytes_to_images(pdf_bytes)
-        
-        # OCR 识别
-        ocr_results = ocr_images(images)
-        
-        # 过滤水印
-        if filter_watermark:
-            ocr_results = filter_watermarks(ocr_results)
-        
-        # 合并全文
-        full_text = ""
-        for page in ocr_results:
-            full_text += f"\n--- 第{page['page']}页 ---\n"
-            for item in page["content"]:
-                full_text += item["text"] + "\n"
+        # 文本层 / OCR 识别（含水印过滤）
+        result = extract_text_from_pdf(pdf_bytes=pdf_bytes, filter_watermark=filter_watermark)
         
         return OCRResult(
-            page_count=len(images),
-            full_text=full_text.strip(),
+            page_count=result["page_count"],
+            full_text=result["full_text"],
         )
         
     except Exception as e:
@@ -130,98 +127,88 @@ async def upload_and_extract_contract(
     file: UploadFile = File(..., description="合同 PDF 文件"),
     use_vision: bool = Form(True, description="是否使用视觉模型"),
     save_to_db: bool = Form(True, description="是否保存到数据库"),
+    near_duplicate: bool = Form(UPLOAD_NEAR_DUPLICATE, description="是否检测近似重复（按页面图像比较）"),
     db: Session = Depends(get_db),
 ):
     """
     上传合同 PDF，进行 OCR 识别并提取关键信息
+    
+    先按内容哈希查重（可选近似重复检测），已入库的文件直接返回已有记录，不再解析；
+    文件名被其他内容占用时，入库时加上哈希后缀另存
+    
+    解析按阶段图并行执行（见 app.services.ingest）：视觉模型在前几页识别完后即开始，
+    图片打包与 OCR 同时进行，全部完成后入库；各阶段耗时见响应的 timings
     """
+    from app.services.dedup import content_hash, find_duplicate
+    from app.services.ingest import ingest_contract, save_performance
+    
     # 验证文件类型
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="只支持 PDF 文件")
     
     file_name = file.filename
     
-    # 检查文件是否已存在
-    existing = crud.get_performance_by_filename(db, file_name)
-    if existing:
-        raise HTTPException(status_code=400, detail=f"文件 '{file_name}' 已存在，ID: {existing.id}")
-    
     try:
         # 读取文件内容
         pdf_bytes = await file.read()
+        digest = content_hash(pdf_bytes)
         
-        # 1. PDF 转图片
-        images = pdf_bytes_to_images(pdf_bytes)
-        page_count = len(images)
-        
-        # 2. OCR 识别
-        ocr_results = ocr_images(images)
-        ocr_results = filter_watermarks(ocr_results)
+        # 按内容查重：命中时不渲染、不 OCR、不调用模型
+        match = await asyncio.to_thread(
+            find_duplicate, db, pdf_bytes, near_duplicate, digest, file_name=file_name
+        )
+        if match is not None:
+            return UploadResponse(
+                success=True,
+                message=match.describe(),
+                file_name=file_name,
+                performance_id=match.performance_id,
+                duplicate_of=match.performance_id,
+                similarity=round(match.similarity, 3),
+            )
         
-        # 合并全文
-        full_text = ""
-        for page in ocr_results:
-            full_text += f"\n--- 第{page['page']}页 ---\n"
-            for item in page["content"]:
-                full_text += item["text"] + "\n"
+        def save(extracted_info: dict, text: dict, image_blob: Optional[bytes], page_hashes):
+            return save_performance(
+                db, file_name, extracted_info, text["full_text"], image_blob,
+                content_hash=digest, page_hashes=page_hashes,
+            )
         
-        # 3. 提取合同信息
-        extracted_info = extract_contract_info(
-            images=images,
-            ocr_text=full_text,
+        # 解析流水线（渲染、OCR、模型调用都是阻塞操作，放到线程中执行，不占用事件循环）
+        result = await asyncio.to_thread(
+            ingest_contract,
+            pdf_bytes,
             use_vision=use_vision,
+            keep_images=save_to_db,
+            save=save if save_to_db else None,
         )
         
-        # 4. 保存到数据库
-        performance_id = None
-        if save_to_db:
-            # 转换日期格式
-            sign_date = None
-            if extracted_info.get("sign_date"):
-                try:
-                    sign_date = datetime.strptime(extracted_info["sign_date"], "%Y-%m-%d").date()
-                except ValueError:
-                    pass
-            
-            # 金额转换（元 -> 万元）
-            amount = extracted_info.get("amount")
-            if amount:
-                amount = amount / 10000  # 转为万元
-            
-            subject_amount = extracted_info.get("subject_amount")
-            if subject_amount:
-                subject_amount = subject_amount / 10000
-            
-            # 图片打包为 BLOB
-            image_blob = images_to_blob(images)
-            
-            # 创建业绩记录
-            performance_data = PerformanceCreate(
+        saved = result["saved"]
+        if saved is not None and saved.duplicate:
+            # 相同文件被并发上传，另一方先入库
+            return UploadResponse(
+                success=True,
+                message=f"相同内容已由同时进行的上传入库（ID: {saved.performance_id}，{saved.file_name}），未重复保存",
                 file_name=file_name,
-                party_a=extracted_info.get("party_a"),
-                party_a_credit_code=extracted_info.get("party_a_credit_code"),
-                contract_type=extracted_info.get("contract_type"),
-                amount=amount,
-                sign_date=sign_date,
-                project_detail=extracted_info.get("project_detail"),
-                subject_amount=subject_amount,
-                opponent=extracted_info.get("opponent"),
-                team_member=extracted_info.get("team_member"),
-                summary=extracted_info.get("summary"),
-                raw_text=full_text,
+                performance_id=saved.performance_id,
+                duplicate_of=saved.performance_id,
+                similarity=1.0,
             )
-            
-            performance = crud.create_performance(db, performance_data)
-            performance_id = performance.id
+        
+        stored_name = saved.file_name if saved is not None else file_name
+        message = "合同解析成功" + ("，已保存到数据库" if save_to_db else "")
+        if stored_name != file_name:
+            message += f"（文件名已被占用，保存为 '{stored_name}'）"
         
         return UploadResponse(
             success=True,
-            message="合同解析成功" + ("，已保存到数据库" if save_to_db else ""),
-            file_name=file_name,
-            page_count=page_count,
-            ocr_text_length=len(full_text),
-            extracted_info=ExtractResult(**extracted_info),
-            performance_id=performance_id,
+            message=message,
+            file_name=stored_name,
+            page_count=result["page_count"],
+            ocr_text_length=len(result["full_text"]),
+            extracted_info=ExtractResult(**result["extracted_info"]),
+            performance_id=saved.performance_id if saved is not None else None,
+            timings=result["timings"],
+            elapsed_seconds=result["elapsed"],
         )
         
     except HTTPException:
@@ -241,106 +228,36 @@ async def upload_and_extract_contract(
 async def batch_upload_contracts(
     files: list[UploadFile] = File(..., description="多个合同 PDF 文件"),
     use_vision: bool = Form(True, description="是否使用视觉模型"),
-    db: Session = Depends(get_db),
+    concurrency: int = Form(BATCH_FILE_CONCURRENCY, ge=1, le=32, description="同时处理的文件数"),
+    dry_run: bool = Form(False, description="试运行：只估算耗时和吞吐，不调用模型、不入库"),
+    near_duplicate: bool = Form(UPLOAD_NEAR_DUPLICATE, description="是否检测近似重复（按页面图像比较）"),
 ):
     """
     批量上传合同 PDF
+    
+    内容与已入库记录（或批次内其他文件）相同的文件不再解析，返回已有记录（duplicate_of）；
+    多个文件并发解析（本地计算和模型调用分别限制并发，模型调用按令牌桶限速、429 时退避），
+    结果以 NDJSON 流式返回：每完成一个文件输出一行（event=file），最后一行为汇总（event=summary）
     """
-    results = []
+    from app.services.ingest import estimate_batch, ingest_batch
     
-    for file in files:
-        if not file.filename.lower().endswith(".pdf"):
-            results.append({
-                "file_name": file.filename,
-                "success": False,
-                "message": "不是 PDF 文件",
-            })
-            continue
-        
-        # 检查是否已存在
-        existing = crud.get_performance_by_filename(db, file.filename)
-        if existing:
-            results.append({
-                "file_name": file.filename,
-                "success": False,
-                "message": f"文件已存在，ID: {existing.id}",
-            })
-            continue
-        
-        try:
-            # 读取文件
-            pdf_bytes = await file.read()
-            
-            # 转图片
-            images = pdf_bytes_to_images(pdf_bytes)
-            
-            # OCR
-            ocr_results = ocr_images(images)
-            ocr_results = filter_watermarks(ocr_results)
-            
-            full_text = ""
-            for page in ocr_results:
-                full_text += f"\n--- 第{page['page']}页 ---\n"
-                for item in page["content"]:
-                    full_text += item["text"] + "\n"
-            
-            # 提取信息
-            extracted_info = extract_contract_info(
-                images=images,
-                ocr_text=full_text,
-                use_vision=use_vision,
-            )
-            
-            # 保存
-            sign_date = None
-            if extracted_info.get("sign_date"):
-                try:
-                    sign_date = datetime.strptime(extracted_info["sign_date"], "%Y-%m-%d").date()
-                except ValueError:
-                    pass
-            
-            amount = extracted_info.get("amount")
-            if amount:
-                amount = amount / 10000
-            
-            performance_data = PerformanceCreate(
-                file_name=file.filename,
-                party_a=extracted_info.get("party_a"),
-                party_a_credit_code=extracted_info.get("party_a_credit_code"),
-                contract_type=extracted_info.get("contract_type"),
-                amount=amount,
-                sign_date=sign_date,
-                project_detail=extracted_info.get("project_detail"),
-                summary=extracted_info.get("summary"),
-                raw_text=full_text,
-            )
-            
-            performance = crud.create_performance(db, performance_data)
-            
-            results.append({
-                "file_name": file.filename,
-                "success": True,
-                "message": "解析成功",
-                "performance_id": performance.id,
-            })
-            
-        except Exception as e:
-            results.append({
-                "file_name": file.filename,
-                "success": False,
-                "message": str(e),
-            })
+    # 先读出全部文件：流式响应开始发送时请求体已经关闭
+    uploads = [(file.filename, await file.read()) for file in files]
+    
+    if dry_run:
+        events = estimate_batch(uploads, use_vision=use_vision, concurrency=concurrency)
+    else:
+        events = ingest_batch(uploads, use_vision=use_vision, concurrency=concurrency, near_duplicate=near_duplicate)
     
-    # 统计
-    success_count = sum(1 for r in results if r["success"])
-    fail_count = len(results) - success_count
+    async def ndjson():
+        async for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
     
-    return {
-        "total": len(results),
-        "success_count": success_count,
-        "fail_count": fail_count,
-        "results": results,
-    }
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},  # 禁用 Nginx 缓冲，逐行送达
+    )
 
 # endregion
 # ============================================
\ No newline at end of file
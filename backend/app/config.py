@@ -35,6 +35,29 @@ EXTRACT_MODEL = os.getenv("EXTRACT_MODEL", "Qwen/Qwen2.5-72B-Instruct")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
 EMBEDDING_DIM = 1024
 
+# 嵌入后端：remote（硅基流动 API）/ local（本机 CPU 推理，适合内网或离线部署）
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "remote").lower()
+
+# 本地模型路径（默认按 EMBEDDING_MODEL 从 HuggingFace 缓存加载），推理运行时 torch / onnx
+EMBEDDING_LOCAL_PATH = os.getenv("EMBEDDING_LOCAL_PATH", "")
+EMBEDDING_LOCAL_RUNTIME = os.getenv("EMBEDDING_LOCAL_RUNTIME", "torch").lower()
+
+# 本地推理线程数（0 表示由运行时决定）
+EMBEDDING_LOCAL_THREADS = int(os.getenv("EMBEDDING_LOCAL_THREADS", "0"))
+
+# 本地推理动态批处理：最多攒多少条文本、最多等多久（毫秒）
+EMBEDDING_LOCAL_MAX_BATCH = int(os.getenv("EMBEDDING_LOCAL_MAX_BATCH", "32"))
+EMBEDDING_LOCAL_MAX_WAIT_MS = float(os.getenv("EMBEDDING_LOCAL_MAX_WAIT_MS", "10"))
+
+# 单条向量请求合并窗口（毫秒）：窗口内并发的不同文本合并成一次批量调用，0 表示不合并
+EMBEDDING_COALESCE_WINDOW_MS = float(os.getenv("EMBEDDING_COALESCE_WINDOW_MS", "5"))
+EMBEDDING_COALESCE_MAX_BATCH = int(os.getenv("EMBEDDING_COALESCE_MAX_BATCH", "32"))
+# 同时进行的合并批次数（远程后端每批一次网络往返，多批并行，避免不同请求排队等前一批返回）
+EMBEDDING_COALESCE_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_COALESCE_MAX_IN_FLIGHT", "4"))
+
+# 启动时在后台预热嵌入模型（本地后端加载模型并试跑一次，不阻塞启动）
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+
 # 重排序模型
 RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-v2-m3")
 
@@ -55,7 +78,207 @@ DATABASE_URL = os.getenv(
     f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
+# 连接池：常驻连接数 / 额外溢出连接数 / 获取连接的超时（秒）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# 连接最长存活时间（秒），超过后重建，避免被数据库或代理的空闲超时断开
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# 连接有效性检测策略：always（每次取连接都 ping）/ idle（空闲超过阈值才 ping）/ off
+DB_PRE_PING = os.getenv("DB_PRE_PING", "idle").lower()
+DB_PRE_PING_IDLE = float(os.getenv("DB_PRE_PING_IDLE", "60"))
+
+# 单条 SQL 超时（毫秒），0 表示不限制
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# 慢查询阈值（毫秒），超过后打印 SQL 和执行计划
+DB_SLOW_QUERY_MS = int(os.getenv("DB_SLOW_QUERY_MS", "500"))
+DB_EXPLAIN_SLOW = os.getenv("DB_EXPLAIN_SLOW", "true").lower() == "true"
+
+# ============================================
+# 统计汇总配置
+# ============================================
+# 统计数据最大延迟（秒）：写入后最多这么久统计接口就能看到变化
+STATS_MAX_STALENESS = float(os.getenv("STATS_MAX_STALENESS", "5"))
+
+# 全量重算间隔（秒），兜底绕过 ORM 的写入（如手工 SQL）
+STATS_FULL_REFRESH = float(os.getenv("STATS_FULL_REFRESH", "300"))
+
+# ============================================
+# 向量维护配置
+# ============================================
+# 是否在写入后后台自动生成/更新向量
+EMBEDDING_WORKER_ENABLED = os.getenv("EMBEDDING_WORKER_ENABLED", "true").lower() == "true"
+
+# 防抖时间（秒）：同一条记录在此时间内的多次写入只生成一次向量
+EMBEDDING_DEBOUNCE = float(os.getenv("EMBEDDING_DEBOUNCE", "2"))
+
+# 每次调用 Embedding API 的最大文本数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# 兜底扫描间隔（秒）：补齐缺失向量的记录（批量导入、调用失败、换模型后）
+EMBEDDING_SWEEP_INTERVAL = float(os.getenv("EMBEDDING_SWEEP_INTERVAL", "60"))
+
+# 向量缓存：相同文本（按模型 + 内容哈希）直接复用已生成的向量
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+# 向量缓存最多保留的条数，超出后淘汰最久未使用的
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+# 向量缓存命中计数（hits、last_used_at）先记在内存里，每隔多少秒批量写回一次
+# （命中不再让每次读缓存都变成一次写事务；最近使用时间只用于淘汰，精确到分钟级足够）
+EMBEDDING_CACHE_TOUCH_FLUSH_SECONDS = float(os.getenv("EMBEDDING_CACHE_TOUCH_FLUSH_SECONDS", "300"))
+
+# ============================================
+# 原文分块检索配置
+# ============================================
+# 每块最大字符数，以及相邻块的重叠字符数（避免条款被切断后检索不到）
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "80"))
+
+# 分块检索时先取的候选块数（再按文档聚合）
+CHUNK_SEARCH_CANDIDATES = int(os.getenv("CHUNK_SEARCH_CANDIDATES", "200"))
+
+# HNSW 检索的候选列表大小（越大召回越高、越慢）
+CHUNK_EF_SEARCH = int(os.getenv("CHUNK_EF_SEARCH", "100"))
+
+# ============================================
+# 搜索结果缓存配置
+# ============================================
+# 缓存后端：memory（进程内 LRU）/ sqlite（多进程共享的 SQLite 文件）/ off
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory").lower()
+
+# 最多缓存的搜索结果数（超出后淘汰最久未使用的）
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+
+# 缓存有效期（秒），兜底绕过 ORM 的写入（如手工 SQL）
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+
+# 表版本号（存在数据库，多进程共享）在进程内缓存的秒数：其他进程写入后，最迟这么久后旧结果失效
+SEARCH_CACHE_VERSION_REFRESH = float(os.getenv("SEARCH_CACHE_VERSION_REFRESH", "1"))
+
+# sqlite 后端的文件路径
+SEARCH_CACHE_SQLITE_PATH = os.getenv(
+    "SEARCH_CACHE_SQLITE_PATH", str(BACKEND_DIR / "temp" / "search_cache.sqlite3")
+)
+
 # ============================================
 # OCR 配置
 # ============================================
-OCR_LANG = os.getenv("OCR_LANG", "ch")
\ No newline at end of file
+OCR_LANG = os.getenv("OCR_LANG", "ch")
+
+# 是否优先使用 PDF 自带的文本层（电子版合同的页面跳过 OCR）
+PDF_TEXT_LAYER_ENABLED = os.getenv("PDF_TEXT_LAYER_ENABLED", "true").lower() == "true"
+
+# 单页文本层至少要有多少个有效字符才直接使用，否则按扫描页 OCR
+PDF_TEXT_LAYER_MIN_CHARS = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "30"))
+
+# 有效字符（汉字、字母数字、常用标点）占比下限，低于此值视为乱码（字体缺少编码映射等）
+PDF_TEXT_LAYER_MIN_QUALITY = float(os.getenv("PDF_TEXT_LAYER_MIN_QUALITY", "0.85"))
+
+# 自适应分辨率：先低分辨率预扫描，跳过空白页、裁掉空白边，按文字大小选择 OCR 分辨率
+OCR_ADAPTIVE_DPI = os.getenv("OCR_ADAPTIVE_DPI", "true").lower() == "true"
+
+# 预扫描分辨率
+OCR_PREPASS_DPI = int(os.getenv("OCR_PREPASS_DPI", "50"))
+
+# OCR 分辨率范围（按文字行高在此范围内选择）
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+
+# 期望文字行高（像素）：正文五号字按此值算出约 200 DPI，大字页降低、小字页提高
+OCR_TARGET_TEXT_PX = int(os.getenv("OCR_TARGET_TEXT_PX", "32"))
+
+# 墨迹像素占比低于此值视为空白页（约相当于 5 个汉字），不做 OCR
+OCR_BLANK_INK_RATIO = float(os.getenv("OCR_BLANK_INK_RATIO", "0.0005"))
+
+# 本进程的角色：all（全部功能）/ api（只处理查询，不做 OCR）/ ocr（专门处理上传识别）
+WORKER_ROLE = os.getenv("WORKER_ROLE", "all")
+
+# 启动时预加载 OCR 模型的角色（逗号分隔），其他角色首次使用时再加载
+OCR_PRELOAD_ROLES = [r.strip() for r in os.getenv("OCR_PRELOAD_ROLES", "all,ocr").split(",") if r.strip()]
+
+# 预加载后是否用合成图片跑一次识别预热（首次推理的算子初始化也提前完成）
+OCR_WARMUP = os.getenv("OCR_WARMUP", "true").lower() == "true"
+
+# OCR 模型空闲多久后卸载释放内存（秒），0 表示常驻；内存紧张的节点可以打开
+OCR_IDLE_UNLOAD = int(os.getenv("OCR_IDLE_UNLOAD", "0"))
+
+# ============================================
+# 上传流水线配置
+# ============================================
+# 上传流水线各阶段（渲染、OCR、视觉提取、图片打包等）共用的线程数
+INGEST_STAGE_WORKERS = int(os.getenv("INGEST_STAGE_WORKERS", "16"))
+
+# 同时执行的本地计算阶段数（渲染、OCR、图片打包；OCR 推理本身在引擎内串行）
+INGEST_CPU_CONCURRENCY = int(os.getenv("INGEST_CPU_CONCURRENCY", str(os.cpu_count() or 4)))
+
+# 同时进行的远程模型调用数（视觉 / 文本提取）
+INGEST_REMOTE_CONCURRENCY = int(os.getenv("INGEST_REMOTE_CONCURRENCY", "4"))
+
+# 批量上传同时处理的文件数
+BATCH_FILE_CONCURRENCY = int(os.getenv("BATCH_FILE_CONCURRENCY", "4"))
+
+# 提取模型调用速率上限（次/分钟，0 表示不限速）与允许的突发次数；
+# 遇到 429 时自动降速，之后逐步恢复
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "60"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "5"))
+
+# 上传去重：默认是否做近似重复检测（按页差值哈希比较，需要低分辨率渲染全部页面）；
+# 内容完全相同的文件始终按哈希去重
+UPLOAD_NEAR_DUPLICATE = os.getenv("UPLOAD_NEAR_DUPLICATE", "false").lower() == "true"
+
+# 两页视为相同的最大汉明距离（256 位差值哈希），以及相同页面占比达到多少视为近似重复
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "24"))
+NEAR_DUPLICATE_MIN_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_MIN_SIMILARITY", "0.9"))
+
+# 429 / 5xx / 连接错误最多重试次数，退避基数（秒，指数退避 + 随机抖动，优先使用 Retry-After）
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+
+# ============================================
+# 启动配置
+# ============================================
+# 服务进程启动时是否执行建表和结构补丁（app.db.setup）
+# 默认只在单进程部署（WORKER_ROLE=all）时执行；多角色部署应在发布前单独运行
+#   python -m app.db.setup
+DB_SETUP_ON_STARTUP = os.getenv(
+    "DB_SETUP_ON_STARTUP", "true" if WORKER_ROLE == "all" else "false"
+).lower() == "true"
+
+# ============================================
+# 会话配置
+# ============================================
+# 单个会话历史的 token 预算，超出后增量压缩为摘要
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "3000"))
+
+# 内存中会话的空闲淘汰时间（秒）
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+
+# 数据库中会话的保留时间（秒），超过后删除
+SESSION_RETENTION = int(os.getenv("SESSION_RETENTION", str(7 * 24 * 3600)))
+
+
+# ============================================
+# Agent 配置
+# ============================================
+# 等待 LLM 时是否预取最可能的第一步工具结果
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "true").lower() == "true"
+
+
+# ============================================
+# 链路追踪配置
+# ============================================
+# 是否启用追踪
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+
+# 进程内环形缓冲区保留的 span 数
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+
+# OTLP/JSON 导出文件路径（为空则不导出）
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+
+# OTLP/HTTP collector 地址，如 http://localhost:4318/v1/traces（为空则不发送）
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
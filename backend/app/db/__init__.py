@@ -3,8 +3,25 @@
 导出数据库连接和模型
 """
 
-from app.db.database import engine, SessionLocal, Base, get_db
-from app.db.models import Performance, Enterprise, Lawyer
+from app.db.database import (
+    engine,
+    SessionLocal,
+    Base,
+    get_db,
+    create_db_engine,
+    SessionScope,
+    bind_session_scope,
+    db_session,
+)
+from app.db.models import (
+    Performance,
+    PerformanceChunk,
+    Enterprise,
+    Lawyer,
+    ChatSession,
+    StatsSummary,
+    EmbeddingCache,
+)
 
 __all__ = [
     # 数据库连接
@@ -12,8 +29,16 @@ __all__ = [
     "SessionLocal", 
     "Base",
     "get_db",
+    "create_db_engine",
+    "SessionScope",
+    "bind_session_scope",
+    "db_session",
     # 模型
     "Performance",
+    "PerformanceChunk",
     "Enterprise",
     "Lawyer",
+    "ChatSession",
+    "StatsSummary",
+    "EmbeddingCache",
 ]
\ No newline at end of file
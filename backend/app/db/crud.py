@@ -5,9 +5,11 @@
 """
 
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Iterator, Optional, List, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, func, insert, update, literal_column, case, null
+from sqlalchemy.engine import Row
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.db.models import Performance, Enterprise, Lawyer
 from app.schemas.common import (
@@ -21,15 +23,29 @@ from app.schemas.common import (
 # region 业绩表 CRUD
 # ============================================
 
-def create_performance(db: Session, data: PerformanceCreate) -> Performance:
+def create_performance(
+    db: Session,
+    data: PerformanceCreate,
+    image_data: Optional[bytes] = None,
+    content_hash: Optional[str] = None,
+    page_hashes: Optional[List[str]] = None,
+) -> Performance:
     """
     创建业绩记录
     
     参数:
         db: 数据库会话
         data: 经过 Pydantic 验证的输入数据
+        image_data: 合同页面图片（ZIP BLOB，见 images_to_blob）
+        content_hash: PDF 内容哈希（上传去重）
+        page_hashes: 每页差值哈希（近似重复检测）
     """
-    performance = Performance(**data.model_dump(exclude_none=True))
+    performance = Performance(
+        **data.model_dump(exclude_none=True),
+        image_data=image_data,
+        content_hash=content_hash,
+        page_hashes=page_hashes,
+    )
     db.add(performance)
     db.commit()
     db.refresh(performance)
@@ -46,33 +62,47 @@ def get_performance_by_filename(db: Session, file_name: str) -> Optional[Perform
     return db.query(Performance).filter(Performance.file_name == file_name).first()
 
 
+def get_performance_by_content_hash(db: Session, content_hash: str) -> Optional[Performance]:
+    """根据 PDF 内容哈希获取业绩（最早的一条）"""
+    return (
+        db.query(Performance)
+        .filter(Performance.content_hash == content_hash)
+        .order_by(Performance.id)
+        .first()
+    )
+
+
+def get_page_hash_candidates(db: Session, page_count: int, tolerance: int = 1) -> List[Tuple[int, str, List[str]]]:
+    """
+    近似重复检测的候选：有页面哈希且页数相近的记录
+    
+    返回:
+        [(id, file_name, page_hashes)]
+    """
+    length = func.json_array_length(Performance.page_hashes)
+    return (
+        db.query(Performance.id, Performance.file_name, Performance.page_hashes)
+        .filter(Performance.page_hashes.isnot(None))
+        .filter(length.between(page_count - tolerance, page_count + tolerance))
+        .all()
+    )
+
+
 def get_all_performances(db: Session, skip: int = 0, limit: int = 100) -> List[Performance]:
     """获取所有业绩（分页）"""
     return db.query(Performance).offset(skip).limit(limit).all()
 
 
-def search_performances(
-    db: Session,
+def _filter_performances(
+    query,
     party_a: Optional[str] = None,
     contract_type: Optional[str] = None,
     min_amount: Optional[float] = None,
     max_amount: Optional[float] = None,
     years: Optional[int] = None,
     keyword: Optional[str] = None,
-) -> List[Performance]:
-    """
-    多条件搜索业绩
-    
-    参数:
-        party_a: 甲方名称（模糊匹配）
-        contract_type: 合同类型
-        min_amount: 最小金额
-        max_amount: 最大金额
-        years: 近N年
-        keyword: 关键词（搜索项目详情和摘要）
-    """
-    query = db.query(Performance)
-    
+):
+    """为业绩查询追加筛选条件（搜索和导出共用）"""
     # 甲方名称模糊匹配
     if party_a:
         query = query.filter(Performance.party_a.ilike(f"%{party_a}%"))
@@ -102,9 +132,80 @@ def search_performances(
             )
         )
     
+    return query
+
+
+def search_performances(
+    db: Session,
+    party_a: Optional[str] = None,
+    contract_type: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    years: Optional[int] = None,
+    keyword: Optional[str] = None,
+) -> List[Performance]:
+    """
+    多条件搜索业绩
+    
+    参数:
+        party_a: 甲方名称（模糊匹配）
+        contract_type: 合同类型
+        min_amount: 最小金额
+        max_amount: 最大金额
+        years: 近N年
+        keyword: 关键词（搜索项目详情和摘要）
+    """
+    query = _filter_performances(
+        db.query(Performance),
+        party_a=party_a,
+        contract_type=contract_type,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        years=years,
+        keyword=keyword,
+    )
     return query.all()
 
 
+# 导出的列（不含图片 BLOB 和向量）
+PERFORMANCE_EXPORT_COLUMNS = [
+    "id", "file_name", "party_a", "party_a_credit_code", "contract_type",
+    "amount", "sign_date", "project_detail", "subject_amount", "opponent",
+    "team_member", "summary", "created_at", "updated_at",
+]
+
+
+def iter_performances_for_export(
+    db: Session,
+    batch_size: int = 1000,
+    include_raw_text: bool = False,
+    **filters,
+) -> Iterator[List[Row]]:
+    """
+    流式读取业绩用于导出（服务端游标，按批返回，内存占用与总行数无关）
+    
+    参数:
+        db: 数据库会话
+        batch_size: 每批行数（yield_per）
+        include_raw_text: 是否包含 OCR 原文（体积较大，默认不导出）
+        **filters: 与 search_performances 相同的筛选条件
+    返回:
+        迭代每批行（Row，按 PERFORMANCE_EXPORT_COLUMNS 顺序，可选末尾 raw_text）
+    """
+    names = PERFORMANCE_EXPORT_COLUMNS + (["raw_text"] if include_raw_text else [])
+    query = db.query(*[getattr(Performance, name) for name in names])
+    query = _filter_performances(query, **filters).order_by(Performance.id)
+    
+    result = db.execute(
+        query.statement.execution_options(yield_per=batch_size)
+    )
+    try:
+        for partition in result.partitions():
+            yield partition
+    finally:
+        result.close()
+
+
 def update_performance(
     db: Session, 
     performance_id: int, 
@@ -337,4 +438,133 @@ def delete_lawyer(db: Session, lawyer_id: int) -> bool:
     return False
 
 # endregion
-# ============================================
\ No newline at end of file
+# ============================================
+
+
+# ============================================
+# region 批量写入
+# ============================================
+
+def _bulk_upsert(
+    db: Session,
+    model,
+    key: str,
+    records: List[dict],
+    embedding: Optional[Tuple[str, Tuple[str, ...]]] = None,
+) -> Tuple[int, int]:
+    """
+    多行 INSERT ... ON CONFLICT DO UPDATE（一次往返写入整批）
+    
+    参数:
+        db: 数据库会话
+        model: ORM 模型
+        key: 冲突判断的唯一列
+        records: 行数据（键集合一致）
+        embedding: (向量哈希列, 向量相关字段)，相关字段有变化时清空哈希，由向量维护后台补齐
+    返回:
+        (新增数, 更新数)
+    
+    原理:
+        导入行中为空的字段保留库里原值（COALESCE），不会把已有数据覆盖成空；
+        RETURNING (xmax = 0) 为真表示本行是新插入的，否则是冲突后更新的；
+        写入行的主键记在 db.info["bulk_written"]，供提交后的钩子（如分块索引）使用
+    """
+    if not records:
+        return 0, 0
+    
+    stmt = pg_insert(model).values(records)
+    table = model.__table__
+    columns = [c for c in records[0] if c != key]
+    set_ = {c: func.coalesce(stmt.excluded[c], table.c[c]) for c in columns}
+    if "updated_at" in table.c:
+        set_["updated_at"] = datetime.now()
+    if embedding:
+        hash_column, fields = embedding
+        changed = [
+            stmt.excluded[f].isnot(None) & stmt.excluded[f].is_distinct_from(table.c[f])
+            for f in fields if f in columns
+        ]
+        if changed:
+            set_[hash_column] = case((or_(*changed), null()), else_=table.c[hash_column])
+    
+    pk = list(table.primary_key.columns)[0]
+    stmt = stmt.on_conflict_do_update(index_elements=[key], set_=set_).returning(
+        literal_column("(xmax = 0)").label("inserted"), pk
+    )
+    flags = []
+    written = db.info.setdefault("bulk_written", {}).setdefault(table.name, set())
+    for row in db.execute(stmt):
+        flags.append(row.inserted)
+        written.add(row[1])
+    db.commit()
+    created = sum(1 for f in flags if f)
+    return created, len(flags) - created
+
+
+def bulk_upsert_performances(db: Session, rows: List[PerformanceCreate]) -> Tuple[int, int]:
+    """
+    批量写入业绩（按 file_name 新增或更新）
+    
+    返回:
+        (新增数, 更新数)
+    """
+    return _bulk_upsert(
+        db, Performance, "file_name", [r.model_dump() for r in rows],
+        embedding=("embedding_hash", ("party_a", "contract_type", "project_detail", "summary")),
+    )
+
+
+def bulk_upsert_enterprises(db: Session, rows: List[EnterpriseCreate]) -> Tuple[int, int]:
+    """
+    批量写入企业（按 credit_code 新增或更新）
+    
+    返回:
+        (新增数, 更新数)
+    """
+    return _bulk_upsert(db, Enterprise, "credit_code", [r.model_dump() for r in rows])
+
+
+def bulk_upsert_lawyers(db: Session, rows: List[LawyerCreate]) -> Tuple[int, int]:
+    """
+    批量写入律师（有执业证号且库中已存在时更新，否则新增）
+    
+    律师表没有唯一约束，无法使用 ON CONFLICT：先一次查出已存在的执业证号，
+    再分别做批量 UPDATE 和批量 INSERT
+    
+    返回:
+        (新增数, 更新数)
+    """
+    if not rows:
+        return 0, 0
+    
+    license_nos = {r.license_no for r in rows if r.license_no}
+    existing = {}
+    if license_nos:
+        existing = {
+            license_no: (lawyer_id, resume)
+            for license_no, lawyer_id, resume in
+            db.query(Lawyer.license_no, Lawyer.id, Lawyer.resume)
+            .filter(Lawyer.license_no.in_(license_nos))
+            .all()
+        }
+    
+    to_insert, to_update = [], []
+    for row in rows:
+        lawyer_id, resume = existing.get(row.license_no, (None, None)) if row.license_no else (None, None)
+        if lawyer_id:
+            values = {"id": lawyer_id, **row.model_dump(exclude_none=True)}
+            if "resume" in values and values["resume"] != resume:
+                values["resume_embedding_hash"] = None  # 简历有变化，由向量维护后台重新生成
+            to_update.append(values)
+        else:
+            to_insert.append(row.model_dump())
+    
+    if to_update:
+        db.execute(update(Lawyer), to_update)
+    if to_insert:
+        db.execute(insert(Lawyer), to_insert)
+    db.commit()
+    return len(to_insert), len(to_update)
+
+# endregion
+# ============================================
@@ -2,22 +2,233 @@
 数据库连接管理
 """
 
-from sqlalchemy import create_engine
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
-from app.config import DATABASE_URL
+from app.config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_PRE_PING,
+    DB_PRE_PING_IDLE,
+    DB_STATEMENT_TIMEOUT_MS,
+    DB_SLOW_QUERY_MS,
+    DB_EXPLAIN_SLOW,
+)
+from app.telemetry import tracer
+from app.telemetry.metrics import DB_POOL_WAIT, DB_QUERY_LATENCY, metrics
 
 
 # ============================================
 # region 数据库引擎
 # ============================================
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,  # 生产环境设为 False，调试时可设为 True 查看 SQL
-    pool_pre_ping=True,  # 连接前检测是否有效
-)
+class TimedQueuePool(QueuePool):
+    """记录连接获取等待时间的连接池（池满时等待会体现在 db_pool_checkout_wait_seconds）"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def create_db_engine(
+    url: str = DATABASE_URL,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: float = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE,
+    pre_ping: str = DB_PRE_PING,
+    pre_ping_idle: float = DB_PRE_PING_IDLE,
+    statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+    slow_query_ms: int = DB_SLOW_QUERY_MS,
+) -> Engine:
+    """
+    创建数据库引擎（参数默认取自配置，压测时可逐项覆盖）
+
+    参数:
+        url: 数据库连接地址
+        pool_size: 常驻连接数
+        max_overflow: 池满后允许额外创建的连接数
+        pool_timeout: 获取连接的最长等待（秒），超时抛出 TimeoutError
+        pool_recycle: 连接最长存活时间（秒）
+        pre_ping: always / idle / off
+        pre_ping_idle: idle 策略下，空闲超过该秒数的连接才检测
+        statement_timeout_ms: 单条 SQL 超时（毫秒，仅 PostgreSQL），0 不限制
+        slow_query_ms: 慢查询阈值（毫秒），0 不记录
+    返回:
+        Engine
+    """
+    connect_args = {}
+    if statement_timeout_ms and url.startswith("postgresql"):
+        # 在连接建立时设置，避免每次 checkout 额外执行 SET
+        connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+
+    new_engine = create_engine(
+        url,
+        echo=False,  # 生产环境设为 False，调试时可设为 True 查看 SQL
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=(pre_ping == "always"),  # 每次取连接前检测（多一次往返）
+        connect_args=connect_args,
+    )
+    if pre_ping == "idle":
+        _install_idle_ping(new_engine, pre_ping_idle)
+    _install_statement_timing(new_engine, slow_query_ms)
+    return new_engine
+
+
+def _install_idle_ping(target: Engine, idle_seconds: float) -> None:
+    """
+    只对空闲较久的连接做有效性检测
+
+    原理:
+        刚归还的连接几乎不可能失效，每次 checkout 都 ping 会给短查询多加一次往返；
+        只检测空闲超过阈值的连接，失效时抛出 DisconnectionError，
+        连接池会丢弃该连接并重新获取
+    """
+    @event.listens_for(target, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        if record is not None:
+            record.info["checkin_at"] = time.monotonic()
+
+    @event.listens_for(target, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        checkin_at = record.info.get("checkin_at")
+        if checkin_at is None or time.monotonic() - checkin_at < idle_seconds:
+            return
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception as e:
+            raise exc.DisconnectionError(f"空闲连接已失效: {e}")
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        # 检测通过后结束隐式事务
+        dbapi_conn.rollback()
+
+# endregion
+# ============================================
+
+# ============================================
+# region SQL 计时与慢查询
+# ============================================
+
+# 最近的慢查询（供 /debug/slow-queries 查看）
+slow_queries: deque = deque(maxlen=100)
+
+DB_SLOW_QUERIES = metrics.counter("db_slow_queries_total", "超过阈值的慢查询数")
+
+
+# 可获取执行计划的语句（EXPLAIN 不带 ANALYZE，只规划不执行）
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """
+    获取慢查询的执行计划
+
+    EXPLAIN 在调用方的连接和事务里执行，先建保存点：PostgreSQL 中失败的语句会让整个事务
+    进入 aborted 状态，回滚到保存点后调用方的事务不受影响（自动提交模式下不需要保存点）
+    """
+    if not DB_EXPLAIN_SLOW or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    in_transaction = not getattr(conn.connection.dbapi_connection, "autocommit", False)
+    cursor = conn.connection.cursor()
+    try:
+        if in_transaction:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute("EXPLAIN " + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:
+            if in_transaction:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return f"EXPLAIN 失败: {e}"
+        finally:
+            if in_transaction:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return "\n".join(str(row[0]) if len(row) == 1 else " | ".join(map(str, row)) for row in rows)
+    except Exception as e:
+        return f"EXPLAIN 失败: {e}"
+    finally:
+        cursor.close()
+
+
+def _install_statement_timing(target: Engine, slow_query_ms: int) -> None:
+    """注册语句级计时：记录指标和 db.query span，超过阈值打印慢查询及执行计划"""
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        """记录 SQL 开始时间"""
+        context._trace_start_ns = time.time_ns()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        """SQL 执行完成后记录耗时，在请求链路内同时记录 db.query span"""
+        start_ns = getattr(context, "_trace_start_ns", None)
+        if start_ns is None:
+            return
+        end_ns = time.time_ns()
+        elapsed_ms = (end_ns - start_ns) / 1e6
+        DB_QUERY_LATENCY.observe(elapsed_ms / 1000)
+        compact = " ".join(statement.split())
+        tracer.record(
+            "db.query",
+            start_ns,
+            end_ns,
+            statement=compact[:300],
+            rowcount=cursor.rowcount,
+        )
+
+        if slow_query_ms and elapsed_ms >= slow_query_ms:
+            DB_SLOW_QUERIES.inc()
+            plan = None if executemany else _explain(conn, statement, parameters)
+            slow_queries.append({
+                "at": time.time(),
+                "elapsed_ms": round(elapsed_ms, 1),
+                "statement": compact[:2000],
+                "plan": plan,
+            })
+            print(f"🐢 [数据库] 慢查询 {elapsed_ms:.0f}ms: {compact[:200]}")
+            if plan:
+                print(plan)
+
+
+engine = create_db_engine()
+
+
+def _pool_state() -> dict:
+    """连接池使用情况（/metrics 抓取时计算）"""
+    pool = engine.pool
+    return {
+        ("size",): pool.size(),
+        ("checked_out",): pool.checkedout(),
+        ("idle",): pool.checkedin(),
+        ("overflow",): max(0, pool.overflow()),
+    }
+
+
+metrics.gauge("db_pool_connections", "数据库连接池连接数", ("state",), _pool_state)
 
 # endregion
 # ============================================
@@ -41,6 +252,36 @@ def init_pgvector():
 # endregion
 # ============================================
 
+# ============================================
+# region 增量表结构
+# ============================================
+
+# 已有表新增的列（create_all 只建新表，不会给已存在的表加列）
+SCHEMA_PATCHES = [
+    "ALTER TABLE performances ADD COLUMN IF NOT EXISTS embedding_hash VARCHAR(64)",
+    "ALTER TABLE lawyers ADD COLUMN IF NOT EXISTS resume_embedding_hash VARCHAR(64)",
+    "ALTER TABLE performances ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE performances ADD COLUMN IF NOT EXISTS page_hashes JSON",
+    # 内容哈希改为唯一索引：已有的重复内容只保留最早一条的哈希
+    "DROP INDEX IF EXISTS ix_performances_content_hash",
+    "UPDATE performances SET content_hash = NULL WHERE content_hash IS NOT NULL AND id NOT IN "
+    "(SELECT MIN(id) FROM performances WHERE content_hash IS NOT NULL GROUP BY content_hash)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_performances_content_hash ON performances (content_hash) "
+    "WHERE content_hash IS NOT NULL",
+]
+
+
+def apply_schema_patches():
+    """为已存在的表补齐新增列（在 create_all 之后执行，可重复执行）"""
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        for statement in SCHEMA_PATCHES:
+            conn.execute(text(statement))
+        conn.commit()
+
+# endregion
+# ============================================
+
 # ============================================
 # region 会话工厂
 # ============================================
@@ -85,4 +326,73 @@ def get_db():
         db.close()
 
 # endregion
-# ============================================
\ No newline at end of file
+# ============================================
+
+
+# ============================================
+# region 请求级会话
+# ============================================
+
+class SessionScope:
+    """
+    一次请求内共享的数据库会话（首次使用时创建）
+
+    每次使用结束都会结束事务，连接立即归还连接池，
+    不会在等待 LLM 的几秒里一直占用连接
+    """
+
+    def __init__(self):
+        self._session: Optional[Session] = None
+
+    def session(self) -> Session:
+        if self._session is None:
+            self._session = SessionLocal()
+        return self._session
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+_current_scope: ContextVar[Optional[SessionScope]] = ContextVar("db_session_scope", default=None)
+
+
+@contextmanager
+def bind_session_scope(scope: SessionScope) -> Iterator[SessionScope]:
+    """在当前上下文内绑定请求级会话（工具通过 db_session() 取用）"""
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+@contextmanager
+def db_session() -> Iterator[Session]:
+    """
+    获取数据库会话：已绑定请求级会话时复用，否则临时创建并在结束时关闭
+
+    用法:
+        with db_session() as db:
+            crud.search_performances(db, ...)
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    db = scope.session()
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+# endregion
+# ============================================
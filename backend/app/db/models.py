@@ -1,12 +1,13 @@
 """
 数据库模型定义
-对应三张核心表：业绩库、企业库、律师库
+对应三张核心表：业绩库、企业库、律师库，以及原文分块表、对话会话表、统计汇总表、向量缓存表和搜索缓存版本表
 """
 
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Text, Boolean, 
-    DateTime, Float, LargeBinary, Date, DECIMAL
+    Column, Integer, BigInteger, String, Text, Boolean, 
+    DateTime, Float, LargeBinary, Date, DECIMAL, JSON,
+    ForeignKey, Index,
 )
 from pgvector.sqlalchemy import Vector
 
@@ -47,15 +48,31 @@ class Performance(Base):
     
     # 向量嵌入
     embedding = Column(Vector(EMBEDDING_DIM), comment="文档向量")
+    embedding_hash = Column(String(64), comment="生成向量时的文本哈希（未变化则不重新生成）")
     
     # 原始数据
     raw_text = Column(Text, comment="OCR原文")
     image_data = Column(LargeBinary, comment="图片数据")
     
+    # 上传去重
+    content_hash = Column(String(64), comment="PDF 内容 SHA-256（上传去重）")
+    page_hashes = Column(JSON, comment="每页差值哈希（近似重复检测）")
+    
     # 时间戳
     created_at = Column(DateTime, default=datetime.now, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
     
+    __table_args__ = (
+        # 相同内容只入库一次：并发上传相同文件时，后插入的一方触发唯一约束，改为返回已有记录
+        # （查重上线前的旧记录没有内容哈希，不参与约束）
+        Index(
+            "ux_performances_content_hash",
+            "content_hash",
+            unique=True,
+            postgresql_where=content_hash.isnot(None),
+        ),
+    )
+    
     def __repr__(self):
         return f"<Performance(id={self.id}, file_name='{self.file_name}')>"
     
@@ -81,6 +98,46 @@ class Performance(Base):
 # ============================================
 
 
+# ============================================
+# region 业绩原文分块 (performance_chunks)
+# ============================================
+
+class PerformanceChunk(Base):
+    """
+    业绩 OCR 原文分块（按页切分，每块一个向量），用于检索合同正文中的条款
+    
+    HNSW 近似最近邻索引（余弦距离）保证百万级分块下检索仍是毫秒级
+    """
+    __tablename__ = "performance_chunks"
+    __table_args__ = (
+        Index(
+            "ix_performance_chunks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    performance_id = Column(
+        Integer, ForeignKey("performances.id", ondelete="CASCADE"),
+        nullable=False, index=True, comment="所属业绩",
+    )
+    chunk_index = Column(Integer, nullable=False, comment="块序号（从 0 开始）")
+    page = Column(Integer, comment="所在页码")
+    content = Column(Text, nullable=False, comment="块文本")
+    content_hash = Column(String(64), nullable=False, comment="块文本哈希（未变化则复用向量）")
+    embedding = Column(Vector(EMBEDDING_DIM), comment="块向量")
+    created_at = Column(DateTime, default=datetime.now, comment="创建时间")
+    
+    def __repr__(self):
+        return f"<PerformanceChunk(performance_id={self.performance_id}, page={self.page}, index={self.chunk_index})>"
+
+# endregion
+# ============================================
+
+
 # ============================================
 # region 企业库 (enterprises)
 # ============================================
@@ -139,6 +196,7 @@ class Lawyer(Base):
     # 简历
     resume = Column(Text, comment="简历内容")
     resume_embedding = Column(Vector(EMBEDDING_DIM), comment="简历向量")
+    resume_embedding_hash = Column(String(64), comment="生成简历向量时的文本哈希")
     
     # 证件图片路径
     id_card_image = Column(String(255), comment="身份证图片路径")
@@ -167,4 +225,87 @@ class Lawyer(Base):
         }
 
 # endregion
-# ============================================
\ No newline at end of file
+# ============================================
+
+
+# ============================================
+# region 对话会话 (chat_sessions)
+# ============================================
+
+class ChatSession(Base):
+    """多轮对话会话表"""
+    __tablename__ = "chat_sessions"
+    
+    conversation_id = Column(String(64), primary_key=True, comment="会话ID")
+    
+    # 压缩后的历史
+    summary = Column(Text, comment="早期对话摘要")
+    messages = Column(JSON, comment="近期对话消息")
+    
+    # 工具结果引用
+    result_refs = Column(JSON, comment="工具结果引用列表")
+    last_result = Column(JSON, comment="最近一次结果集（供追问复用）")
+    
+    turn_count = Column(Integer, default=0, comment="对话轮数")
+    
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.now, comment="创建时间")
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
+    
+    def __repr__(self):
+        return f"<ChatSession(conversation_id='{self.conversation_id}', turns={self.turn_count})>"
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 统计汇总 (stats_summary)
+# ============================================
+
+class StatsSummary(Base):
+    """预计算的统计汇总（每个统计范围一行），供统计接口常数时间读取"""
+    __tablename__ = "stats_summary"
+    
+    scope = Column(String(32), primary_key=True, comment="统计范围（performances/enterprises/lawyers）")
+    data = Column(JSON, nullable=False, comment="统计结果")
+    refreshed_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="重算时间")
+    
+    def __repr__(self):
+        return f"<StatsSummary(scope='{self.scope}', refreshed_at={self.refreshed_at})>"
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 向量缓存 (embedding_cache)
+# ============================================
+
+class EmbeddingCache(Base):
+    """按内容哈希缓存的文本向量（相同文本不再重复调用 Embedding API）"""
+    __tablename__ = "embedding_cache"
+    
+    content_hash = Column(String(64), primary_key=True, comment="sha256(模型名 + 文本)")
+    model = Column(String(100), nullable=False, index=True, comment="生成向量的模型")
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=False, comment="文本向量")
+    hits = Column(Integer, default=0, comment="命中次数")
+    created_at = Column(DateTime, default=datetime.now, comment="创建时间")
+    last_used_at = Column(DateTime, default=datetime.now, index=True, comment="最近使用时间（LRU 淘汰依据）")
+    
+    def __repr__(self):
+        return f"<EmbeddingCache(model='{self.model}', hash='{self.content_hash[:8]}', hits={self.hits})>"
+
+
+class SearchCacheVersion(Base):
+    """搜索结果缓存的表版本号（所有进程共享，任一进程写入后递增，各进程的旧缓存结果随之失效）"""
+    __tablename__ = "search_cache_versions"
+    
+    name = Column(String(50), primary_key=True, comment="表版本名（performances / lawyers）")
+    version = Column(BigInteger, nullable=False, default=0, comment="版本号")
+    
+    def __repr__(self):
+        return f"<SearchCacheVersion(name='{self.name}', version={self.version})>"
+
+# endregion
+# ============================================
@@ -0,0 +1,41 @@
+"""
+数据库结构初始化
+启用 pgvector 扩展、创建缺失的表、补齐已有表的新增列（均可重复执行）
+
+部署时在启动服务进程之前单独执行一次，服务进程启动时就不用再连库建表
+（单进程部署 WORKER_ROLE=all 时服务启动会自动执行，见 DB_SETUP_ON_STARTUP）:
+    python -m app.db.setup
+
+类比：开店前的装修
+装修队先把货架搭好（建表），店员上班直接开门营业，而不是每次开门前都检查一遍货架
+"""
+
+import time
+
+from app.db.database import engine, Base, init_pgvector, apply_schema_patches
+
+
+def setup_database() -> float:
+    """
+    初始化数据库结构
+
+    返回:
+        耗时（秒）
+    """
+    # 注册全部模型到 Base.metadata
+    import app.db.models  # noqa: F401
+
+    start = time.perf_counter()
+    # 启用 pgvector 扩展（必须在创建表之前）
+    init_pgvector()
+    # 创建数据库表（如果不存在）
+    # 注意：生产环境建议使用 Alembic 迁移
+    Base.metadata.create_all(bind=engine)
+    apply_schema_patches()
+    elapsed = time.perf_counter() - start
+    print(f"✅ 数据库表已就绪（{elapsed:.2f}s）")
+    return elapsed
+
+
+if __name__ == "__main__":
+    setup_database()
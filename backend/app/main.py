@@ -1,13 +1,23 @@
 """
 FastAPI 应用主入口
+
+启动耗时分析（导入耗时报告 + 预算检查）:
+    python -m benchmarks.startup
 """
 
+import time
+
+# 导入阶段计时起点（尽量靠前，包含下面 fastapi 等依赖的导入）
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.config import BACKEND_DIR
-from app.db.database import engine, Base
+from app.config import EMBEDDING_WARMUP, DB_SETUP_ON_STARTUP
+from app.telemetry import tracer
+from app.telemetry.metrics import APP_STARTUP_SECONDS, HTTP_LATENCY, HTTP_REQUESTS
 
 
 # ============================================
@@ -18,25 +28,52 @@ from app.db.database import engine, Base
 async def lifespan(app: FastAPI):
     """
     应用生命周期管理
-    - 启动时：初始化数据库表
+    - 启动时：初始化数据库表（DB_SETUP_ON_STARTUP）、启动后台任务
     - 关闭时：清理资源
     """
     # 启动时执行
     print("🚀 正在启动应用...")
+    lifespan_started = time.perf_counter()
 
-    # 启用 pgvector 扩展（必须在创建表之前）
-    from app.db.database import init_pgvector
-    init_pgvector()
+    # 数据库结构初始化（多角色部署时由发布流程单独执行 python -m app.db.setup）
+    if DB_SETUP_ON_STARTUP:
+        from app.db.setup import setup_database
+        APP_STARTUP_SECONDS.set(await asyncio.to_thread(setup_database), phase="db_setup")
+    
+    # 统计汇总后台刷新
+    from app.services.stats import stats_service
+    stats_service.start()
+    
+    # 嵌入模型预热（本地后端加载模型，避免第一个搜索请求承担加载耗时；后台进行，不阻塞启动）
+    if EMBEDDING_WARMUP:
+        from app.services.embedding_backend import start_embedding_warmup
+        start_embedding_warmup()
+    
+    # 向量增量维护
+    from app.services.embedding_worker import embedding_worker
+    embedding_worker.start()
     
-    # 创建数据库表（如果不存在）
-    # 注意：生产环境建议使用 Alembic 迁移
-    Base.metadata.create_all(bind=engine)
-    print("✅ 数据库表已就绪")
+    # OCR 模型预加载（按 WORKER_ROLE，后台进行，完成前 /health/ready 返回 503）
+    from app.services.ocr_engine import ocr_engine
+    ocr_engine.start()
+    
+    lifespan_seconds = time.perf_counter() - lifespan_started
+    APP_STARTUP_SECONDS.set(lifespan_seconds, phase="lifespan")
+    print(
+        f"✅ 启动完成：导入 {_IMPORT_SECONDS:.2f}s，"
+        f"初始化 {lifespan_seconds:.2f}s"
+    )
     
     yield  # 应用运行中
     
     # 关闭时执行
     print("👋 应用正在关闭...")
+    stats_service.stop()
+    embedding_worker.stop()
+    from app.services.vector_search import flush_embedding_cache_touches
+    flush_embedding_cache_touches()
+    ocr_engine.stop()
+    tracer.shutdown()
 
 # endregion
 # ============================================
@@ -70,6 +107,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """按路由模板记录请求数和耗时（不使用原始路径，避免 ID 造成标签爆炸）"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_LATENCY.observe(time.perf_counter() - start, route=route_path, method=request.method)
+        HTTP_REQUESTS.inc(route=route_path, method=request.method, status=str(status))
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """为每个请求记录根 span，并通过响应头返回 trace id"""
+    with tracer.span("http.request", method=request.method, path=request.url.path) as span:
+        response = await call_next(request)
+        if span:
+            span.set(status=response.status_code)
+            response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
 # endregion
 # ============================================
 
@@ -82,6 +146,10 @@ app.add_middleware(
 from app.api.health import router as health_router
 app.include_router(health_router, tags=["健康检查"])
 
+# 运行指标路由（Prometheus 抓取）
+from app.api.metrics import router as metrics_router
+app.include_router(metrics_router, tags=["运行指标"])
+
 # 对话路由
 from app.api.chat import router as chat_router
 app.include_router(chat_router, prefix="/api/v1", tags=["对话"])
@@ -106,6 +174,13 @@ app.include_router(upload_router, prefix="/api/v1", tags=["文件上传"])
 from app.api.search import router as search_router
 app.include_router(search_router, prefix="/api/v1", tags=["语义搜索"])
 
+# 调试路由（链路追踪）
+from app.api.debug import router as debug_router
+app.include_router(debug_router, prefix="/api/v1", tags=["调试"])
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+APP_STARTUP_SECONDS.set(_IMPORT_SECONDS, phase="import")
+
 # endregion
 # ============================================
 
@@ -17,6 +17,9 @@ from app.schemas.common import (
     LawyerCreate,
     LawyerUpdate,
     LawyerResponse,
+    # 批量导入
+    BulkRowError,
+    BulkImportResponse,
 )
 
 __all__ = [
@@ -33,4 +36,7 @@ __all__ = [
     "LawyerCreate",
     "LawyerUpdate",
     "LawyerResponse",
+    # 批量导入
+    "BulkRowError",
+    "BulkImportResponse",
 ]
\ No newline at end of file
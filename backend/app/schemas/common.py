@@ -172,4 +172,30 @@ class PerformanceSearchParams(BaseModel):
     keyword: Optional[str] = Field(None, description="关键词")
 
 # endregion
-# ============================================
\ No newline at end of file
+# ============================================
+
+
+# ============================================
+# region 批量导入 Schema
+# ============================================
+
+class BulkRowError(BaseModel):
+    """批量导入中单行的错误"""
+    line: int = Field(..., description="行号（CSV 含表头时从 2 开始）")
+    key: Optional[str] = Field(None, description="该行的唯一键（文件名/信用代码/姓名）")
+    error: str = Field(..., description="错误原因")
+
+
+class BulkImportResponse(BaseModel):
+    """批量导入结果"""
+    total: int = Field(0, description="读取的数据行数")
+    created: int = Field(0, description="新增行数")
+    updated: int = Field(0, description="按唯一键更新的行数")
+    failed: int = Field(0, description="失败行数")
+    duplicates: int = Field(0, description="文件内唯一键重复、被后面的行覆盖的行数")
+    batches: int = Field(0, description="写入批次数")
+    elapsed: float = Field(0.0, description="耗时（秒）")
+    errors: List[BulkRowError] = Field(default_factory=list, description="失败明细（最多返回前 100 条）")
+
+# endregion
+# ============================================
@@ -3,29 +3,77 @@
 提供 OCR、合同提取等业务服务
 """
 
-from app.services.ocr import (
-    pdf_to_images,
-    pdf_bytes_to_images,
-    ocr_images,
-    extract_text_from_pdf,
-    filter_watermarks,
-)
-from app.services.extractor import (
-    extract_contract_info,
-    extract_with_vision,
-    extract_with_text,
-    images_to_blob,
-)
+import importlib
+from typing import TYPE_CHECKING
+
+# 导出名 -> 所在子模块
+# 按需导入：访问时才加载对应子模块，避免启动时把 PIL、numpy、pdf2image、openai 等全部加载
+# （与子模块同名的后台单例 embedding_worker、ocr_engine 请直接从子模块导入）
+_EXPORTS = {
+    # OCR
+    "pdf_to_images": "app.services.ocr",
+    "pdf_bytes_to_images": "app.services.ocr",
+    "ocr_images": "app.services.ocr",
+    "extract_text_from_pdf": "app.services.ocr",
+    "filter_watermarks": "app.services.ocr",
+    "detect_spatial_watermarks": "app.services.ocr",
+    # 提取
+    "extract_contract_info": "app.services.extractor",
+    "extract_with_vision": "app.services.extractor",
+    "extract_with_text": "app.services.extractor",
+    "images_to_blob": "app.services.extractor",
+    # 上传流水线
+    "ingest_contract": "app.services.ingest",
+    # 向量搜索
+    "get_embedding": "app.services.vector_search",
+    "get_embeddings_batch": "app.services.vector_search",
+    "search_performances_by_vector": "app.services.vector_search",
+    "hybrid_search_performances": "app.services.vector_search",
+    "search_lawyers_by_resume": "app.services.vector_search",
+    "update_performance_embedding": "app.services.vector_search",
+    "batch_update_embeddings": "app.services.vector_search",
+    "prune_embedding_cache": "app.services.vector_search",
+    # 统计汇总
+    "stats_service": "app.services.stats",
+}
+
+if TYPE_CHECKING:
+    from app.services.ocr import (
+        pdf_to_images,
+        pdf_bytes_to_images,
+        ocr_images,
+        extract_text_from_pdf,
+        filter_watermarks,
+        detect_spatial_watermarks,
+    )
+    from app.services.extractor import (
+        extract_contract_info,
+        extract_with_vision,
+        extract_with_text,
+        images_to_blob,
+    )
+    from app.services.ingest import ingest_contract
+    from app.services.vector_search import (
+        get_embedding,
+        get_embeddings_batch,
+        search_performances_by_vector,
+        hybrid_search_performances,
+        search_lawyers_by_resume,
+        update_performance_embedding,
+        batch_update_embeddings,
+        prune_embedding_cache,
+    )
+    from app.services.stats import stats_service
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
 
-from app.services.vector_search import (
-    get_embedding,
-    get_embeddings_batch,
-    search_performances_by_vector,
-    hybrid_search_performances,
-    search_lawyers_by_resume,
-    update_performance_embedding,
-    batch_update_embeddings,
-)
 
 __all__ = [
     # OCR
@@ -34,11 +82,14 @@ __all__ = [
     "ocr_images",
     "extract_text_from_pdf",
     "filter_watermarks",
+    "detect_spatial_watermarks",
     # 提取
     "extract_contract_info",
     "extract_with_vision",
     "extract_with_text",
     "images_to_blob",
+    # 上传流水线
+    "ingest_contract",
     # 向量搜索
     "get_embedding",
     "get_embeddings_batch",
@@ -47,4 +98,7 @@ __all__ = [
     "search_lawyers_by_resume",
     "update_performance_embedding",
     "batch_update_embeddings",
+    "prune_embedding_cache",
+    # 统计汇总
+    "stats_service",
 ]
\ No newline at end of file
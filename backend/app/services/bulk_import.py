@@ -0,0 +1,246 @@
+"""
+批量导入服务
+流式读取 CSV / JSONL，按批用 Pydantic Schema 校验，
+整批多行写入（按唯一键新增或更新），单行错误只记录不中断
+
+类比：搬家时整箱搬运
+不是一件一件地搬（每行两次往返），而是装满一箱（一批）一次搬上车；
+某一箱搬不上去时，再拆开逐件检查是哪件出了问题
+"""
+
+import csv
+import io
+import json
+import time
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.schemas import (
+    PerformanceCreate,
+    EnterpriseCreate,
+    LawyerCreate,
+    BulkRowError,
+    BulkImportResponse,
+)
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 默认每批写入行数
+DEFAULT_BATCH_SIZE = 500
+
+# 响应中最多返回的错误明细数
+MAX_REPORTED_ERRORS = 100
+
+# 布尔字段的中文写法
+BOOL_TEXT = {"是": True, "否": False, "Y": True, "N": False}
+
+# 导入类型 -> (Schema, 批量写入函数, 唯一键字段)
+IMPORT_KINDS: Dict[str, Tuple[Type[BaseModel], Callable, Optional[str]]] = {
+    "performances": (PerformanceCreate, crud.bulk_upsert_performances, "file_name"),
+    "enterprises": (EnterpriseCreate, crud.bulk_upsert_enterprises, "credit_code"),
+    "lawyers": (LawyerCreate, crud.bulk_upsert_lawyers, "license_no"),
+}
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 流式读取
+# ============================================
+
+def detect_format(filename: Optional[str], fmt: Optional[str] = None) -> str:
+    """根据参数或文件扩展名判断格式（csv / jsonl）"""
+    if fmt:
+        fmt = fmt.lower()
+    elif filename and filename.lower().endswith((".jsonl", ".ndjson", ".json")):
+        fmt = "jsonl"
+    else:
+        fmt = "csv"
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"不支持的格式: {fmt}（支持 csv / jsonl）")
+    return fmt
+
+
+def _clean_csv_row(row: Dict[str, Optional[str]]) -> dict:
+    """CSV 单元格清洗：去空白、空串转 None、中文布尔值转换"""
+    cleaned = {}
+    for key, value in row.items():
+        if key is None:
+            continue  # 多出的列
+        key = key.strip()
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                value = None
+            elif value in BOOL_TEXT:
+                value = BOOL_TEXT[value]
+        cleaned[key] = value
+    return cleaned
+
+
+def iter_records(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    逐行读取记录（不把整个文件读入内存）
+
+    参数:
+        stream: 二进制文件流
+        fmt: csv / jsonl
+    返回:
+        迭代 (行号, 记录, 解析错误)
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, _clean_csv_row(row), None
+            return
+
+        for line_no, line in enumerate(text, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"JSON 解析失败: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "每行应为 JSON 对象"
+                continue
+            yield line_no, record, None
+    finally:
+        text.detach()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 批量导入
+# ============================================
+
+def _format_validation_error(error: ValidationError) -> str:
+    parts = []
+    for item in error.errors()[:3]:
+        field = ".".join(str(p) for p in item.get("loc", ()))
+        parts.append(f"{field}: {item.get('msg')}")
+    return "; ".join(parts)
+
+
+class _Importer:
+    """单次导入的状态（结果统计和错误明细）"""
+
+    def __init__(self, db: Session, kind: str):
+        self.db = db
+        self.schema, self.writer, self.key_field = IMPORT_KINDS[kind]
+        self.result = BulkImportResponse()
+
+    def error(self, line: int, key: Optional[str], message: str) -> None:
+        self.result.failed += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(BulkRowError(line=line, key=key, error=message[:500]))
+
+    def flush(self, batch: List[Tuple[int, BaseModel]]) -> None:
+        """写入一批；整批失败时逐行重试，定位出错的行"""
+        if not batch:
+            return
+
+        # 同一批内唯一键重复时以最后一行为准（ON CONFLICT 不允许同一语句更新同一行两次）
+        if self.key_field:
+            latest: Dict[str, int] = {}
+            for i, (_, row) in enumerate(batch):
+                key = getattr(row, self.key_field)
+                if key:
+                    latest[key] = i
+            deduped = [
+                item for i, item in enumerate(batch)
+                if not getattr(item[1], self.key_field) or latest[getattr(item[1], self.key_field)] == i
+            ]
+            self.result.duplicates += len(batch) - len(deduped)
+            batch = deduped
+
+        self.result.batches += 1
+        try:
+            created, updated = self.writer(self.db, [row for _, row in batch])
+            self.result.created += created
+            self.result.updated += updated
+            return
+        except Exception as e:
+            self.db.rollback()
+            print(f"[批量导入] 第 {self.result.batches} 批写入失败，逐行重试: {e}")
+
+        for line, row in batch:
+            try:
+                created, updated = self.writer(self.db, [row])
+                self.result.created += created
+                self.result.updated += updated
+            except Exception as e:
+                self.db.rollback()
+                key = getattr(row, self.key_field) if self.key_field else None
+                self.error(line, key, str(getattr(e, "orig", e)).strip())
+
+
+def import_records(
+    db: Session,
+    kind: str,
+    stream: BinaryIO,
+    fmt: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> BulkImportResponse:
+    """
+    批量导入
+
+    参数:
+        db: 数据库会话
+        kind: performances / enterprises / lawyers
+        stream: CSV 或 JSONL 文件流
+        fmt: csv / jsonl
+        batch_size: 每批行数
+    返回:
+        BulkImportResponse（新增/更新/失败数和错误明细）
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"未知导入类型: {kind}")
+
+    start = time.time()
+    importer = _Importer(db, kind)
+    batch: List[Tuple[int, BaseModel]] = []
+
+    for line, record, parse_error in iter_records(stream, fmt):
+        importer.result.total += 1
+        if parse_error:
+            importer.error(line, None, parse_error)
+            continue
+
+        try:
+            row = importer.schema.model_validate(record)
+        except ValidationError as e:
+            key = record.get(importer.key_field) if importer.key_field else None
+            importer.error(line, str(key) if key else None, _format_validation_error(e))
+            continue
+
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            importer.flush(batch)
+            batch = []
+
+    importer.flush(batch)
+
+    result = importer.result
+    result.elapsed = round(time.time() - start, 3)
+    print(
+        f"[批量导入] {kind}: 共 {result.total} 行，新增 {result.created}，"
+        f"更新 {result.updated}，失败 {result.failed}，耗时 {result.elapsed:.2f}s"
+    )
+    return result
+
+# endregion
+# ============================================
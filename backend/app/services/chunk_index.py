@@ -0,0 +1,311 @@
+"""
+业绩原文分块索引
+把 OCR 原文按页切成带重叠的小块，每块单独生成向量存入 performance_chunks 表，
+检索时在 HNSW 索引上取最相近的块，再按文档聚合并返回命中片段
+
+类比：书的索引页
+整本合同只有一个"简介"向量时，第 12 页的违约条款永远搜不到；
+给每一页、每一段都建一条索引，就能直接翻到那一页
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, select, text, or_
+from sqlalchemy.orm import Session
+
+from app.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_SEARCH_CANDIDATES,
+    CHUNK_EF_SEARCH,
+    EMBEDDING_BATCH_SIZE,
+)
+from app.db.models import Performance, PerformanceChunk
+from app.services.vector_search import (
+    get_embedding,
+    get_embeddings_batch,
+    embedding_content_hash,
+)
+from app.telemetry import traced
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# OCR 原文中的分页标记（见 ocr.extract_text_from_pdf / upload）
+PAGE_MARKER = re.compile(r"\n*--- 第(\d+)页 ---\n")
+
+# 优先在这些字符之后断开，避免把一句话切成两半
+BREAK_CHARS = "\n。；;！!？?"
+
+# 每个文档最多返回的命中片段数
+MAX_SNIPPETS = 3
+
+# 片段最大长度（字符）
+SNIPPET_LENGTH = 200
+
+# 文档聚合方式
+POOLING_MODES = ("max", "sum")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 分块
+# ============================================
+
+class Chunk(NamedTuple):
+    """原文分块"""
+    index: int
+    page: Optional[int]
+    content: str
+
+
+def split_pages(raw_text: str) -> List[Tuple[Optional[int], str]]:
+    """
+    按分页标记拆分原文
+
+    参数:
+        raw_text: OCR 原文（含 "--- 第N页 ---" 标记）
+    返回:
+        [(页码, 页面文本)]；没有分页标记时整篇视为页码 None
+    """
+    parts = PAGE_MARKER.split(raw_text or "")
+    pages: List[Tuple[Optional[int], str]] = []
+    if parts[0].strip():
+        pages.append((None, parts[0]))
+    for i in range(1, len(parts) - 1, 2):
+        if parts[i + 1].strip():
+            pages.append((int(parts[i]), parts[i + 1]))
+    return pages
+
+
+def _split_window(text_: str, size: int, overlap: int) -> List[str]:
+    """滑动窗口切分单页文本，尽量在句末断开"""
+    text_ = text_.strip()
+    if len(text_) <= size:
+        return [text_] if text_ else []
+
+    pieces = []
+    start = 0
+    while start < len(text_):
+        end = min(start + size, len(text_))
+        if end < len(text_):
+            # 在窗口后半段找最后一个断句字符
+            cut = max(text_.rfind(c, start + size // 2, end) for c in BREAK_CHARS)
+            if cut != -1:
+                end = cut + 1
+        piece = text_[start:end].strip()
+        if piece:
+            pieces.append(piece)
+        if end >= len(text_):
+            break
+        # 重叠部分从句首开始
+        next_start = end - overlap
+        breaks = [i for i in (text_.find(c, next_start, end) for c in BREAK_CHARS) if i != -1]
+        if breaks and min(breaks) + 1 < end:
+            next_start = min(breaks) + 1
+        start = max(next_start, start + 1)
+    return pieces
+
+
+def chunk_text(raw_text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Chunk]:
+    """
+    页感知分块：块不跨页，页内按 size 切分并保留 overlap 重叠
+
+    参数:
+        raw_text: OCR 原文
+        size: 每块最大字符数
+        overlap: 相邻块重叠字符数
+    返回:
+        Chunk 列表（按原文顺序）
+    """
+    overlap = min(overlap, size // 2)
+    chunks: List[Chunk] = []
+    for page, page_text in split_pages(raw_text):
+        for piece in _split_window(page_text, size, overlap):
+            chunks.append(Chunk(index=len(chunks), page=page, content=piece))
+    return chunks
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 建索引
+# ============================================
+
+def index_performance_chunks(db: Session, performance_id: int) -> Dict[str, int]:
+    """
+    重建单条业绩的原文分块索引（内容未变化的块复用原向量，不调用 API）
+
+    参数:
+        db: 数据库会话
+        performance_id: 业绩 ID
+    返回:
+        {"chunks": 块数, "embedded": 新生成向量数, "reused": 复用数, "failed": 失败数}
+    """
+    raw_text = db.execute(
+        select(Performance.raw_text).where(Performance.id == performance_id)
+    ).scalar()
+    chunks = chunk_text(raw_text or "")
+
+    existing = {
+        content_hash: embedding
+        for content_hash, embedding in db.execute(
+            select(PerformanceChunk.content_hash, PerformanceChunk.embedding)
+            .where(PerformanceChunk.performance_id == performance_id)
+        )
+        if embedding is not None
+    }
+    hashes = [embedding_content_hash(c.content) for c in chunks]
+    stats = {"chunks": len(chunks), "embedded": 0, "reused": 0, "failed": 0}
+
+    if len(existing) == len(set(hashes)) and set(hashes) == set(existing):
+        stats["reused"] = len(chunks)
+        return stats  # 原文未变化
+
+    to_embed = [i for i, h in enumerate(hashes) if h not in existing]
+    new_vectors = {}
+    for start in range(0, len(to_embed), EMBEDDING_BATCH_SIZE):
+        batch = to_embed[start:start + EMBEDDING_BATCH_SIZE]
+        new_vectors.update(zip(batch, get_embeddings_batch([chunks[i].content for i in batch])))
+
+    rows = []
+    for i, chunk in enumerate(chunks):
+        embedding = existing.get(hashes[i])
+        if embedding is not None:
+            stats["reused"] += 1
+        else:
+            embedding = new_vectors.get(i)
+            stats["embedded" if embedding else "failed"] += 1
+        rows.append({
+            "performance_id": performance_id,
+            "chunk_index": chunk.index,
+            "page": chunk.page,
+            "content": chunk.content,
+            "content_hash": hashes[i],
+            "embedding": embedding,
+        })
+
+    db.execute(delete(PerformanceChunk).where(PerformanceChunk.performance_id == performance_id))
+    if rows:
+        db.bulk_insert_mappings(PerformanceChunk, rows)
+    db.commit()
+    return stats
+
+
+def performances_missing_chunks(db: Session, limit: int) -> List[int]:
+    """有原文但还没有分块索引、或有分块向量生成失败的业绩（兜底扫描使用）"""
+    chunks = select(PerformanceChunk.id).where(PerformanceChunk.performance_id == Performance.id)
+    missing_vectors = chunks.where(PerformanceChunk.embedding.is_(None))
+    return list(db.execute(
+        select(Performance.id)
+        .where(
+            Performance.raw_text.isnot(None),
+            Performance.raw_text != "",
+            or_(~chunks.exists(), missing_vectors.exists()),
+        )
+        .order_by(Performance.id)
+        .limit(limit)
+    ).scalars())
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 分块检索
+# ============================================
+
+def _snippet(content: str) -> str:
+    content = " ".join(content.split())
+    return content if len(content) <= SNIPPET_LENGTH else content[:SNIPPET_LENGTH] + "…"
+
+
+@traced("search.performance_chunks")
+def search_performance_chunks(
+    db: Session,
+    query: str,
+    top_k: int = 10,
+    pooling: str = "max",
+    candidates: int = CHUNK_SEARCH_CANDIDATES,
+) -> List[Tuple[Performance, float, List[dict]]]:
+    """
+    在原文分块中检索，并聚合到文档级
+
+    参数:
+        db: 数据库会话
+        query: 查询文本
+        top_k: 返回文档数
+        pooling: max（取最相近的块）/ sum（累加命中块，命中越多越靠前）
+        candidates: 先从 HNSW 索引取的候选块数
+    返回:
+        (Performance, 得分, 命中片段列表) 元组，按得分降序；
+        片段为 {"page", "chunk_index", "score", "text"}
+    """
+    if pooling not in POOLING_MODES:
+        raise ValueError(f"不支持的聚合方式: {pooling}")
+
+    query_embedding = get_embedding(query)
+    if not query_embedding:
+        print("❌ 无法生成查询向量")
+        return []
+    vector_str = "[" + ",".join(map(str, query_embedding)) + "]"
+
+    # ORDER BY 距离 + LIMIT 才会走 HNSW 索引；ef_search 只在本事务内生效
+    db.execute(
+        text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+        {"ef": str(max(CHUNK_EF_SEARCH, candidates))},
+    )
+    rows = db.execute(
+        text("""
+            SELECT performance_id, chunk_index, page, content,
+                   embedding <=> CAST(:query_vec AS vector) AS distance
+            FROM performance_chunks
+            WHERE embedding IS NOT NULL
+            ORDER BY embedding <=> CAST(:query_vec AS vector)
+            LIMIT :candidates
+        """),
+        {"query_vec": vector_str, "candidates": candidates},
+    ).fetchall()
+
+    # 按文档聚合（余弦距离 0~2 -> 相似度 1~0）
+    docs: Dict[int, List[dict]] = {}
+    for row in rows:
+        if row.distance is None:
+            continue  # 向量生成失败的分块
+        docs.setdefault(row.performance_id, []).append({
+            "page": row.page,
+            "chunk_index": row.chunk_index,
+            "score": round(1 - row.distance / 2, 4),
+            "text": row.content,
+        })
+
+    scored = []
+    for performance_id, hits in docs.items():
+        scores = [h["score"] for h in hits]
+        score = max(scores) if pooling == "max" else sum(scores)
+        scored.append((performance_id, score, hits))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    scored = scored[:top_k]
+
+    performances = {
+        p.id: p for p in db.query(Performance).filter(Performance.id.in_([s[0] for s in scored]))
+    }
+    results = []
+    for performance_id, score, hits in scored:
+        perf = performances.get(performance_id)
+        if perf is None:
+            continue
+        snippets = [{**h, "text": _snippet(h["text"])} for h in hits[:MAX_SNIPPETS]]
+        results.append((perf, score, snippets))
+
+    print(f"🔍 分块检索: 候选块 {len(rows)}，命中文档 {len(docs)}，聚合方式 {pooling}")
+    return results
+
+# endregion
+# ============================================
@@ -0,0 +1,212 @@
+"""
+并发请求合并
+- SingleFlight：同一时刻相同的请求只执行一次，其余请求等待并共享结果
+- MicroBatcher：短时间窗口内不同的请求合并成一次批量调用
+
+类比：电梯
+同一层等电梯的人（相同请求）只需要有一个人按按钮；
+电梯门开着的几秒内进来的人（不同请求）一趟一起送
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.telemetry.metrics import metrics
+
+
+# ============================================
+# region 相同请求合并
+# ============================================
+
+COALESCED_CALLS = metrics.counter(
+    "coalesced_calls_total", "请求合并次数（role: leader 实际执行 / follower 共享结果 / batched 并入他人批次）", ("name", "role"))
+
+
+class _Call:
+    """一次进行中的调用"""
+
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    相同 key 的并发调用只执行一次
+
+    用法:
+        search_flight = SingleFlight("search")
+        result = search_flight.do(("能源", "hybrid", 10), lambda: run_search(...))
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        执行 fn，若相同 key 的调用正在进行则等待它的结果
+
+        参数:
+            key: 请求标识（可哈希）
+            fn: 实际执行的函数
+        返回:
+            fn 的返回值（异常同样会传给所有等待者）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.followers += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            COALESCED_CALLS.inc(name=self.name, role="follower")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        COALESCED_CALLS.inc(name=self.name, role="leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 不同请求批量合并
+# ============================================
+
+class MicroBatcher:
+    """
+    动态批处理：把短时间内并发提交的多组文本合并成一次调用
+
+    批次在提交者的上下文（contextvars）中执行，批量调用的 span 挂在第一个请求的 trace 下
+
+    用法:
+        batcher = MicroBatcher(model_encode, max_batch=32, max_wait=0.01)
+        vectors = batcher.submit(["文本"])   # 阻塞直到所在批次完成
+
+    参数:
+        max_in_flight: 同时执行的批次数。本地推理（CPU 已占满）用 1；
+            远程调用每批都要等一次网络往返，应允许多批同时进行，
+            否则不同请求会排队等前一批返回
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[str]], list],
+        max_batch: int,
+        max_wait: float,
+        name: str = "batcher",
+        max_in_flight: int = 1,
+    ):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.max_in_flight = max(1, max_in_flight)
+        self.name = name
+        self._queue: "queue.Queue[Tuple[List[str], Future, contextvars.Context]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # 批次槽位：全部占满时先不收集，让排队的请求攒成下一批
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if self.max_in_flight > 1:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=name)
+        self.batches = 0
+
+    def submit(self, texts: List[str]) -> list:
+        """提交一组文本，返回对应结果（顺序一致）"""
+        if not texts:
+            return []
+        future: Future = Future()
+        self._queue.put((list(texts), future, contextvars.copy_context()))
+        self._ensure_thread()
+        return future.result()
+
+    def _ensure_thread(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _collect(self) -> List[Tuple[List[str], Future, contextvars.Context]]:
+        """取出第一项后，在 max_wait 内继续收集，直到攒够 max_batch 条文本"""
+        first = self._queue.get()
+        items = [first]
+        count = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while count < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+
+    def _loop(self) -> None:
+        while True:
+            self._slots.acquire()
+            items = self._collect()
+            if self._pool is None:
+                self._dispatch(items)
+            else:
+                self._pool.submit(self._dispatch, items)
+
+    def _dispatch(self, items: List[Tuple[List[str], Future, contextvars.Context]]) -> None:
+        try:
+            self._run(items)
+        finally:
+            self._slots.release()
+
+    def _run(self, items: List[Tuple[List[str], Future, contextvars.Context]]) -> None:
+        texts = [text for group, _, _ in items for text in group]
+        try:
+            results = items[0][2].run(self.fn, texts)
+        except Exception as e:
+            for _, future, _ in items:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.batches += 1
+        if len(items) > 1:
+            COALESCED_CALLS.inc(len(items) - 1, name=self.name, role="batched")
+        offset = 0
+        for group, future, _ in items:
+            future.set_result(results[offset:offset + len(group)])
+            offset += len(group)
+
+# endregion
+# ============================================
@@ -0,0 +1,202 @@
+"""
+上传去重
+按文件内容而不是文件名识别重复上传：
+
+    - 内容哈希：PDF 字节的 SHA-256，入库时保存并建索引；上传时先查哈希，
+      命中直接返回已有记录，不渲染、不 OCR、不调用模型
+    - 近似重复（可选）：每页一个 256 位差值哈希（dHash），重新扫描、重新导出等
+      字节不同但页面相同的文件，按页比较汉明距离（允许整体错开一页，如多一页封面）；
+      需要低分辨率渲染全部页面
+    - 文件名只用于显示：不同内容用了已存在的文件名时，入库时加上内容哈希后缀另存，不再拒绝
+    - 查重上线前入库的记录没有内容哈希，同名上传仍按原来的方式视为已存在
+
+类比：图书馆按 ISBN 查重
+同一本书换了书皮（文件名）还是同一本，不同的书碰巧同名也照样上架
+"""
+
+import hashlib
+import os
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.config import (
+    OCR_PREPASS_DPI,
+    NEAR_DUPLICATE_MAX_DISTANCE,
+    NEAR_DUPLICATE_MIN_SIMILARITY,
+)
+from app.db import crud
+from app.telemetry.metrics import UPLOAD_DUPLICATES
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 差值哈希边长（16 → 256 位；8×8 只剩版式轮廓，同一模板的不同合同也会很接近）
+DHASH_SIZE = 16
+
+# 近似重复候选的页数容差（扫描时多一页封面、少一页空白页）
+PAGE_COUNT_TOLERANCE = 1
+
+# 文件名后缀使用的哈希位数
+NAME_SUFFIX_LENGTH = 8
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 指纹
+# ============================================
+
+def content_hash(pdf_bytes: bytes) -> str:
+    """PDF 内容哈希（SHA-256 十六进制）"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def dhash(image: Image.Image, size: int = DHASH_SIZE) -> str:
+    """
+    页面差值哈希：缩成 (size+1)×size 灰度图，比较相邻像素明暗
+
+    与分辨率、压缩质量基本无关，同一页重新扫描的哈希只差几位
+
+    返回:
+        十六进制字符串（size=16 时 64 个字符）
+    """
+    pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return bits.tobytes().hex()
+
+
+def page_hashes(images: List[Image.Image]) -> List[str]:
+    """每页的差值哈希"""
+    return [dhash(image) for image in images]
+
+
+def render_page_hashes(pdf_bytes: bytes) -> List[str]:
+    """按预扫描分辨率渲染全部页面并计算差值哈希（dHash 与分辨率无关，低分辨率即可）"""
+    from app.services.ocr import pdf_bytes_to_images
+
+    return page_hashes(pdf_bytes_to_images(pdf_bytes, dpi=OCR_PREPASS_DPI))
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def page_similarity(
+    a: List[str],
+    b: List[str],
+    max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE,
+    max_shift: int = PAGE_COUNT_TOLERANCE,
+) -> float:
+    """
+    按页对齐比较两份文件
+
+    允许整体错开最多 max_shift 页（多一页封面、少一页空白页），取相同页最多的对齐方式
+
+    返回:
+        相同页（汉明距离不超过 max_distance）占较短一方页数的比例
+    """
+    if not a or not b:
+        return 0.0
+    best = 0
+    for shift in range(-max_shift, max_shift + 1):
+        same = sum(
+            1 for i, x in enumerate(a)
+            if 0 <= i + shift < len(b) and hamming(x, b[i + shift]) <= max_distance
+        )
+        best = max(best, same)
+    return best / min(len(a), len(b))
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 查重
+# ============================================
+
+class DuplicateMatch(NamedTuple):
+    """命中的已有记录"""
+    performance_id: int
+    file_name: str
+    similarity: float
+    exact: bool
+    legacy: bool = False
+
+    def describe(self) -> str:
+        if self.legacy:
+            return f"同名文件已存在（ID: {self.performance_id}），该记录入库时未保存内容哈希，按文件名视为重复，未重复解析"
+        if self.exact:
+            return f"内容与已有记录相同（ID: {self.performance_id}，{self.file_name}），未重复解析"
+        return (f"与已有记录近似重复（ID: {self.performance_id}，{self.file_name}，"
+                f"相同页面 {self.similarity:.0%}），未重复解析")
+
+
+def find_duplicate(
+    db: Session,
+    pdf_bytes: bytes,
+    near: bool = False,
+    digest: Optional[str] = None,
+    min_similarity: float = NEAR_DUPLICATE_MIN_SIMILARITY,
+    file_name: Optional[str] = None,
+) -> Optional[DuplicateMatch]:
+    """
+    查找内容相同（或近似）的已有记录
+
+    参数:
+        db: 数据库会话
+        pdf_bytes: PDF 文件字节
+        near: 是否做近似重复检测（内容哈希未命中时渲染页面比较）
+        digest: 已算好的内容哈希
+        min_similarity: 近似重复的相同页面占比下限
+        file_name: 上传的文件名（与没有内容哈希的旧记录同名时视为已存在）
+    返回:
+        命中的记录，没有时为 None
+    """
+    existing = crud.get_performance_by_content_hash(db, digest or content_hash(pdf_bytes))
+    if existing is not None:
+        UPLOAD_DUPLICATES.inc(kind="exact")
+        return DuplicateMatch(existing.id, existing.file_name, 1.0, True)
+
+    # 查重上线前的记录没有内容哈希，无法比较内容，同名时沿用原来的按文件名判重
+    if file_name:
+        legacy = crud.get_performance_by_filename(db, file_name)
+        if legacy is not None and legacy.content_hash is None:
+            UPLOAD_DUPLICATES.inc(kind="legacy_name")
+            return DuplicateMatch(legacy.id, legacy.file_name, 1.0, True, legacy=True)
+
+    if not near:
+        return None
+
+    hashes = render_page_hashes(pdf_bytes)
+    best: Optional[DuplicateMatch] = None
+    for performance_id, file_name, candidate in crud.get_page_hash_candidates(db, len(hashes), PAGE_COUNT_TOLERANCE):
+        similarity = page_similarity(hashes, candidate)
+        if similarity >= min_similarity and (best is None or similarity > best.similarity):
+            best = DuplicateMatch(performance_id, file_name, similarity, False)
+    if best is not None:
+        UPLOAD_DUPLICATES.inc(kind="near")
+    return best
+
+
+def candidate_file_names(file_name: str, digest: Optional[str]) -> List[str]:
+    """
+    入库时依次尝试的文件名：原名 → 加短哈希后缀 → 加完整哈希后缀
+
+    名字在插入时才确定（唯一约束冲突就换下一个），同一批次里同名的不同文件并发入库也不会互相挤掉
+    """
+    names = [file_name]
+    if digest:
+        stem, ext = os.path.splitext(file_name)
+        for length in (NAME_SUFFIX_LENGTH, len(digest)):
+            suffix = f" ({digest[:length]}){ext}"
+            names.append(stem[:255 - len(suffix)] + suffix)
+    return names
+
+# endregion
+# ============================================
@@ -0,0 +1,268 @@
+"""
+向量嵌入后端
+统一"文本 -> 向量"的调用接口，可在远程 API 和本机 CPU 推理之间切换（EMBEDDING_BACKEND）
+
+- remote：硅基流动 /embeddings 接口（原有方式）
+- local：本机加载同一 bge-m3 模型（sentence-transformers，可选 ONNX 运行时），
+  并发的单条请求在几毫秒的窗口内合并成一批推理，减少逐条前向计算的开销
+
+两种后端输出同一模型的 1024 维向量，可以混用同一份向量数据
+
+类比：外卖 vs 自己下厨
+外卖（远程 API）不用自己备菜，但每单都要等骑手往返；
+自己下厨（本地模型）先要备好厨房（加载模型），之后几个人同时点菜就一锅一起炒
+"""
+
+import importlib.util
+import os
+import threading
+import time
+from typing import List, Optional
+
+import httpx
+
+from app.config import (
+    SILICONFLOW_API_KEY,
+    SILICONFLOW_BASE_URL,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIM,
+    EMBEDDING_BACKEND,
+    EMBEDDING_LOCAL_PATH,
+    EMBEDDING_LOCAL_RUNTIME,
+    EMBEDDING_LOCAL_THREADS,
+    EMBEDDING_LOCAL_MAX_BATCH,
+    EMBEDDING_LOCAL_MAX_WAIT_MS,
+)
+from app.services.coalescing import MicroBatcher
+from app.telemetry.metrics import EMBEDDING_ERRORS, EMBEDDING_LATENCY, track_call
+
+
+# ============================================
+# region 后端实现
+# ============================================
+
+class EmbeddingBackend:
+    """嵌入后端接口"""
+
+    name = "base"
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """批量生成向量，失败的位置为 None"""
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> Optional[List[float]]:
+        """生成单条向量，失败返回 None"""
+        return self.embed([text])[0]
+
+    def warmup(self) -> None:
+        """预热（加载模型等），默认无操作"""
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "model": EMBEDDING_MODEL}
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """硅基流动 /embeddings 接口"""
+
+    name = "remote"
+
+    def _post(self, payload_input, op: str, timeout: float) -> Optional[list]:
+        with track_call(EMBEDDING_LATENCY, EMBEDDING_ERRORS, model=EMBEDDING_MODEL, op=op):
+            response = httpx.post(
+                f"{SILICONFLOW_BASE_URL}/embeddings",
+                headers={
+                    "Authorization": f"Bearer {SILICONFLOW_API_KEY}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": EMBEDDING_MODEL,
+                    "input": payload_input,
+                    "encoding_format": "float"
+                },
+                timeout=timeout
+            )
+        if response.status_code != 200:
+            EMBEDDING_ERRORS.inc(model=EMBEDDING_MODEL, op=op)
+            print(f"❌ Embedding API 错误: {response.status_code}")
+            return None
+        # 按 index 排序确保顺序正确
+        data = sorted(response.json()["data"], key=lambda x: x["index"])
+        return [item["embedding"] for item in data]
+
+    def embed_one(self, text: str) -> Optional[List[float]]:
+        try:
+            result = self._post(text, op="single", timeout=30.0)
+            return result[0] if result else None
+        except Exception as e:
+            print(f"❌ 获取向量失败: {e}")
+            return None
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        if not texts:
+            return []
+        try:
+            result = self._post(texts, op="batch", timeout=60.0)
+            return result if result else [None] * len(texts)
+        except Exception as e:
+            print(f"❌ 批量获取向量失败: {e}")
+            return [None] * len(texts)
+
+
+def local_backend_available() -> bool:
+    """是否安装了 sentence-transformers（本地后端为可选功能）"""
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    本机 CPU 推理（sentence-transformers，runtime=onnx 时使用 ONNX Runtime）
+
+    并发请求经 MicroBatcher 合并为一批 encode，线程数由 threads 控制
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_path: str = EMBEDDING_LOCAL_PATH or EMBEDDING_MODEL,
+        runtime: str = EMBEDDING_LOCAL_RUNTIME,
+        threads: int = EMBEDDING_LOCAL_THREADS,
+        max_batch: int = EMBEDDING_LOCAL_MAX_BATCH,
+        max_wait_ms: float = EMBEDDING_LOCAL_MAX_WAIT_MS,
+    ):
+        self.model_path = model_path
+        self.runtime = runtime
+        self.threads = threads
+        self.max_batch = max_batch
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.batcher = MicroBatcher(
+            self._encode, max_batch=max_batch, max_wait=max_wait_ms / 1000, name="embedding-local"
+        )
+
+    def _load(self):
+        if self._model is not None:
+            return self._model
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+            if self.threads > 0:
+                # ONNX Runtime / MKL 读取环境变量，需在加载模型前设置
+                os.environ.setdefault("OMP_NUM_THREADS", str(self.threads))
+            from sentence_transformers import SentenceTransformer
+
+            start = time.perf_counter()
+            kwargs = {"device": "cpu"}
+            if self.runtime == "onnx":
+                kwargs["backend"] = "onnx"
+            model = SentenceTransformer(self.model_path, **kwargs)
+            if self.threads > 0 and self.runtime != "onnx":
+                import torch
+                torch.set_num_threads(self.threads)
+
+            dim = model.get_sentence_embedding_dimension()
+            if dim != EMBEDDING_DIM:
+                raise ValueError(f"本地嵌入模型维度 {dim} 与数据库向量维度 {EMBEDDING_DIM} 不一致")
+            self._model = model
+            print(
+                f"🧠 本地嵌入模型已加载: {self.model_path}（{self.runtime}，"
+                f"线程 {self.threads or '自动'}，耗时 {time.perf_counter() - start:.1f}s）"
+            )
+            return model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        model = self._load()
+        with track_call(EMBEDDING_LATENCY, EMBEDDING_ERRORS, model=EMBEDDING_MODEL, op="local"):
+            vectors = model.encode(
+                texts,
+                batch_size=self.max_batch,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectors.tolist()
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        if not texts:
+            return []
+        try:
+            return self.batcher.submit(texts)
+        except Exception as e:
+            print(f"❌ 本地生成向量失败: {e}")
+            return [None] * len(texts)
+
+    def warmup(self) -> None:
+        self._load()
+        self._encode(["预热"])
+
+    def describe(self) -> dict:
+        return {
+            **super().describe(),
+            "path": self.model_path,
+            "runtime": self.runtime,
+            "threads": self.threads,
+            "loaded": self._model is not None,
+            "batches": self.batcher.batches,
+        }
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 后端选择
+# ============================================
+
+EMBEDDING_BACKENDS = {
+    "remote": RemoteEmbeddingBackend,
+    "local": LocalEmbeddingBackend,
+}
+
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """
+    获取当前嵌入后端（按 EMBEDDING_BACKEND 创建，进程内单例）
+
+    后台预热线程和请求线程会同时调用，创建时加锁，保证只有一个实例（模型只加载一次）
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_cls = EMBEDDING_BACKENDS.get(EMBEDDING_BACKEND)
+                if backend_cls is None:
+                    raise ValueError(f"未知嵌入后端: {EMBEDDING_BACKEND}（支持 {', '.join(EMBEDDING_BACKENDS)}）")
+                if backend_cls is LocalEmbeddingBackend and not local_backend_available():
+                    raise RuntimeError("EMBEDDING_BACKEND=local 需要安装 sentence-transformers")
+                _backend = backend_cls()
+    return _backend
+
+
+def warmup_embedding_backend() -> None:
+    """预热当前嵌入后端（应用启动时调用，失败只打印不阻止启动）"""
+    try:
+        backend = get_embedding_backend()
+        start = time.perf_counter()
+        backend.warmup()
+        if backend.name != "remote":
+            print(f"🔥 嵌入后端预热完成: {backend.name}（{time.perf_counter() - start:.1f}s）")
+    except Exception as e:
+        print(f"⚠️ 嵌入后端预热失败: {e}")
+
+
+def start_embedding_warmup() -> threading.Thread:
+    """
+    在后台线程预热嵌入后端，不阻塞应用启动
+
+    预热完成前到达的搜索请求会在模型加载锁上等待，不会重复加载；
+    加载状态见 /health/embedding
+    """
+    thread = threading.Thread(target=warmup_embedding_backend, daemon=True, name="embedding-warmup")
+    thread.start()
+    return thread
+
+# endregion
+# ============================================
@@ -0,0 +1,404 @@
+"""
+向量增量维护
+业绩 / 律师写入后，把受影响的 ID 放入待处理队列，后台线程防抖合并后
+批量调用 get_embeddings_batch 生成向量；文本哈希未变化的记录直接跳过
+
+除记录本身的向量外，业绩 OCR 原文变化时还会重建原文分块索引（chunks，见 chunk_index）
+
+入队方式:
+    - 写入钩子：ORM 会话提交时，新增记录和向量相关字段有变化的记录自动入队；
+      批量导入写入的业绩 ID 也会在提交后入队
+    - 兜底扫描：批量导入（绕过 ORM）会把哈希置空，后台定期扫描哈希为空的记录补齐；
+      调用失败的记录哈希保持为空，下次扫描时重试
+
+类比：洗衣房收衣篮
+衣服（写入）随时扔进篮子，同一件衣服扔两次也只洗一次；
+攒够一桶或等了一会儿再统一开机，而不是每件衣服都开一次洗衣机
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.orm import Session, attributes
+
+from app.config import (
+    EMBEDDING_WORKER_ENABLED,
+    EMBEDDING_DEBOUNCE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_SWEEP_INTERVAL,
+)
+from app.db.database import SessionLocal, engine
+from app.db.models import Performance, Lawyer
+from app.services.vector_search import (
+    PERFORMANCE_EMBED_FIELDS,
+    LAWYER_EMBED_FIELDS,
+    performance_embedding_text,
+    lawyer_embedding_text,
+    embedding_content_hash,
+    get_embeddings_batch,
+    prune_embedding_cache,
+)
+from app.services.chunk_index import index_performance_chunks, performances_missing_chunks
+from app.services.search_cache import search_cache
+from app.telemetry.metrics import metrics, SLOW_BUCKETS
+
+
+# ============================================
+# region 向量目标
+# ============================================
+
+# 类型 -> (模型, 触发字段, 文本函数, 向量列, 哈希列)
+EMBEDDING_TARGETS: Dict[str, tuple] = {
+    "performances": (
+        Performance, PERFORMANCE_EMBED_FIELDS, performance_embedding_text,
+        "embedding", "embedding_hash",
+    ),
+    "lawyers": (
+        Lawyer, LAWYER_EMBED_FIELDS, lawyer_embedding_text,
+        "resume_embedding", "resume_embedding_hash",
+    ),
+}
+
+# 模型 -> 类型（写入钩子使用）
+_MODEL_KINDS = {target[0]: kind for kind, target in EMBEDDING_TARGETS.items()}
+
+# 业绩原文分块索引（以业绩 ID 入队，原文字段变化时触发）
+CHUNK_KIND = "chunks"
+CHUNK_FIELDS = ("raw_text",)
+
+# 每轮兜底扫描最多入队的记录数
+SWEEP_LIMIT = 1000
+
+# 向量缓存清理间隔（秒）
+CACHE_PRUNE_INTERVAL = 3600
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 后台生成
+# ============================================
+
+EMBEDDING_UPDATES = metrics.counter(
+    "embedding_updates_total", "向量维护处理的记录数（result: embedded/unchanged/empty/failed）",
+    ("kind", "result"))
+EMBEDDING_LAG = metrics.histogram(
+    "embedding_lag_seconds", "从写入入队到向量落库的延迟", ("kind",), SLOW_BUCKETS)
+
+
+class EmbeddingWorker:
+    """
+    向量增量维护（进程级单例）
+
+    用法:
+        embedding_worker.enqueue("performances", [1, 2, 3])
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        debounce: float = EMBEDDING_DEBOUNCE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        sweep_interval: float = EMBEDDING_SWEEP_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.debounce = debounce
+        self.batch_size = max(1, batch_size)
+        self.sweep_interval = sweep_interval
+        # (类型, ID) -> (首次入队时间, 最近入队时间)
+        self._pending: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_sweep = 0.0
+        self._last_prune = 0.0
+
+    # ---------- 入队 ----------
+
+    def enqueue(self, kind: str, ids: Iterable[int], ready: bool = False) -> None:
+        """
+        标记记录需要检查向量
+
+        参数:
+            kind: performances / lawyers
+            ids: 记录 ID
+            ready: 为 True 时跳过防抖（兜底扫描使用）
+        """
+        if kind not in EMBEDDING_TARGETS and kind != CHUNK_KIND:
+            raise KeyError(f"未知向量类型: {kind}")
+        now = time.time()
+        last = now - self.debounce if ready else now
+        with self._lock:
+            for record_id in ids:
+                key = (kind, record_id)
+                first = self._pending.get(key, (now, now))[0]
+                self._pending[key] = (first, last)
+        self._wakeup.set()
+
+    def enqueue_sweep(self) -> None:
+        """提前触发兜底扫描（批量写入后调用）"""
+        self._last_sweep = 0.0
+        self._wakeup.set()
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def oldest_pending_age(self) -> float:
+        with self._lock:
+            if not self._pending:
+                return 0.0
+            return time.time() - min(first for first, _ in self._pending.values())
+
+    def _take_ready(self) -> Dict[str, Dict[int, float]]:
+        """取出已过防抖期的记录，返回 {类型: {ID: 首次入队时间}}"""
+        now = time.time()
+        ready: Dict[str, Dict[int, float]] = {}
+        with self._lock:
+            for key, (first, last) in list(self._pending.items()):
+                if now - last >= self.debounce:
+                    del self._pending[key]
+                    ready.setdefault(key[0], {})[key[1]] = first
+        return ready
+
+    # ---------- 处理 ----------
+
+    def process(self, kind: str, id_times: Dict[int, float]) -> Dict[str, int]:
+        """
+        为一组记录生成向量（哈希未变化的跳过）
+
+        参数:
+            kind: performances / lawyers
+            id_times: {ID: 首次入队时间}
+        返回:
+            各结果的记录数
+        """
+        if kind == CHUNK_KIND:
+            return self._process_chunks(id_times)
+
+        model, fields, build_text, vector_column, hash_column = EMBEDDING_TARGETS[kind]
+        counts = {"embedded": 0, "unchanged": 0, "empty": 0, "failed": 0}
+        ids = list(id_times)
+
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(model.id, *(getattr(model, f) for f in fields), getattr(model, hash_column))
+                .filter(model.id.in_(ids))
+                .all()
+            )
+        finally:
+            db.close()
+
+        updates: List[dict] = []
+        to_embed: List[Tuple[int, str, str]] = []
+        for row in rows:
+            text_to_embed = build_text(row)
+            content_hash = embedding_content_hash(text_to_embed)
+            if content_hash == row[-1]:
+                counts["unchanged"] += 1
+            elif not text_to_embed.strip():
+                # 文本被清空：同时清掉旧向量，避免按过期内容命中
+                updates.append({"_id": row.id, "vector": None, "content_hash": content_hash})
+                counts["empty"] += 1
+            else:
+                to_embed.append((row.id, text_to_embed, content_hash))
+
+        for start in range(0, len(to_embed), self.batch_size):
+            chunk = to_embed[start:start + self.batch_size]
+            vectors = get_embeddings_batch([text for _, text, _ in chunk])
+            for (record_id, _, content_hash), vector in zip(chunk, vectors):
+                if vector:
+                    updates.append({"_id": record_id, "vector": vector, "content_hash": content_hash})
+                    counts["embedded"] += 1
+                else:
+                    counts["failed"] += 1  # 哈希保持不变，兜底扫描时重试
+
+        if updates:
+            # 直接走连接写入，不触发 ORM 写入钩子（否则会再次入队 / 标记统计为脏）
+            table = model.__table__
+            stmt = (
+                update(table)
+                .where(table.c.id == bindparam("_id"))
+                .values({vector_column: bindparam("vector"), hash_column: bindparam("content_hash")})
+            )
+            with engine.begin() as conn:
+                conn.execute(stmt, updates)
+            search_cache.bump(kind)  # 向量变化会影响搜索结果
+
+        now = time.time()
+        for record_id in ids:
+            EMBEDDING_LAG.observe(now - id_times[record_id], kind=kind)
+        for result, count in counts.items():
+            if count:
+                EMBEDDING_UPDATES.inc(count, kind=kind, result=result)
+        return counts
+
+    def _process_chunks(self, id_times: Dict[int, float]) -> Dict[str, int]:
+        """逐条业绩重建原文分块索引（每条业绩的分块批量生成向量）"""
+        counts = {"embedded": 0, "unchanged": 0, "failed": 0}
+        for performance_id, first in id_times.items():
+            db = self.session_factory()
+            try:
+                stats = index_performance_chunks(db, performance_id)
+                counts["embedded"] += stats["embedded"]
+                counts["unchanged"] += stats["reused"]
+                counts["failed"] += stats["failed"]
+            except Exception as e:
+                db.rollback()
+                counts["failed"] += 1
+                print(f"[向量维护] 业绩 {performance_id} 分块索引失败: {e}")
+            finally:
+                db.close()
+            EMBEDDING_LAG.observe(time.time() - first, kind=CHUNK_KIND)
+        if counts["embedded"]:
+            search_cache.bump("performances")
+        for result, count in counts.items():
+            if count:
+                EMBEDDING_UPDATES.inc(count, kind=CHUNK_KIND, result=result)
+        return counts
+
+    def sweep(self) -> int:
+        """把哈希为空的记录（未生成过向量）和缺少分块索引的业绩加入队列"""
+        total = 0
+        db = self.session_factory()
+        try:
+            chunk_ids = performances_missing_chunks(db, SWEEP_LIMIT)
+            if chunk_ids:
+                self.enqueue(CHUNK_KIND, chunk_ids, ready=True)
+                total += len(chunk_ids)
+            for kind, (model, _, _, _, hash_column) in EMBEDDING_TARGETS.items():
+                ids = [
+                    record_id for (record_id,) in
+                    db.query(model.id)
+                    .filter(getattr(model, hash_column).is_(None))
+                    .order_by(model.id)
+                    .limit(SWEEP_LIMIT)
+                    .all()
+                ]
+                if ids:
+                    self.enqueue(kind, ids, ready=True)
+                    total += len(ids)
+        except Exception as e:
+            print(f"[向量维护] 扫描失败: {e}")
+        finally:
+            db.close()
+        self._last_sweep = time.time()
+        return total
+
+    # ---------- 后台线程 ----------
+
+    def start(self) -> None:
+        """启动后台线程（应用启动时调用）"""
+        if not EMBEDDING_WORKER_ENABLED:
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._last_sweep = 0.0  # 启动后立即扫描一次
+        self._last_prune = 0.0  # 启动后立即清理一次（清掉旧模型的缓存）
+        self._thread = threading.Thread(target=self._loop, name="embedding-worker", daemon=True)
+        self._thread.start()
+        print(f"🧬 向量增量维护已启动（防抖 {self.debounce:g}s，批量 {self.batch_size}）")
+
+    def stop(self) -> None:
+        """停止后台线程"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            if time.time() - self._last_prune >= CACHE_PRUNE_INTERVAL:
+                prune_embedding_cache()
+                self._last_prune = time.time()
+            if time.time() - self._last_sweep >= self.sweep_interval:
+                self.sweep()
+
+            self._wakeup.wait(timeout=min(self.debounce, self.sweep_interval) or 1.0)
+            if self._stop.is_set():
+                return
+            self._wakeup.clear()
+
+            for kind, id_times in self._take_ready().items():
+                try:
+                    counts = self.process(kind, id_times)
+                    print(f"[向量维护] {kind}: {counts}")
+                except Exception as e:
+                    print(f"[向量维护] 处理 {kind} 失败: {e}")
+
+
+# 全局向量维护
+embedding_worker = EmbeddingWorker()
+
+metrics.gauge(
+    "embedding_queue_depth", "等待生成向量的记录数", (),
+    lambda: {(): float(embedding_worker.queue_depth())})
+metrics.gauge(
+    "embedding_queue_oldest_seconds", "队列中最早一条记录已等待的时间", (),
+    lambda: {(): embedding_worker.oldest_pending_age()})
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 写入钩子
+# ============================================
+
+def _text_changed(obj, fields: Tuple[str, ...]) -> bool:
+    return any(attributes.get_history(obj, f).has_changes() for f in fields)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_embedding_ids(session: Session, flush_context) -> None:
+    """记录本次事务中新增或向量相关字段有变化的记录"""
+    pending = session.info.setdefault("embedding_ids", {})
+    for obj in (*session.new, *session.dirty):
+        kind = _MODEL_KINDS.get(type(obj))
+        if not kind:
+            continue
+        is_new = obj in session.new
+        if is_new or _text_changed(obj, EMBEDDING_TARGETS[kind][1]):
+            pending.setdefault(kind, set()).add(obj.id)
+        if kind == "performances" and (is_new or _text_changed(obj, CHUNK_FIELDS)):
+            pending.setdefault(CHUNK_KIND, set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_embedding_ids(session: Session) -> None:
+    """事务提交后入队"""
+    pending = session.info.pop("embedding_ids", None) or {}
+    # 批量导入（crud._bulk_upsert）写入的业绩：原文可能变化，重建分块索引（未变化时不调用 API）
+    written = session.info.pop("bulk_written", None) or {}
+    if written.get("performances"):
+        pending.setdefault(CHUNK_KIND, set()).update(written["performances"])
+    for kind, ids in pending.items():
+        if ids:
+            embedding_worker.enqueue(kind, ids)
+    if session.info.pop("embedding_sweep", False):
+        embedding_worker.enqueue_sweep()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_embedding_ids(session: Session) -> None:
+    session.info.pop("embedding_ids", None)
+    session.info.pop("bulk_written", None)
+    session.info.pop("embedding_sweep", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_embedding_writes(orm_execute_state) -> None:
+    """批量写入不经过 flush，拿不到 ID：提交后提前触发一次兜底扫描"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper and mapper.class_ in _MODEL_KINDS:
+        orm_execute_state.session.info["embedding_sweep"] = True
+
+# endregion
+# ============================================
@@ -6,9 +6,8 @@
 import json
 import base64
 import io
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 from PIL import Image
-from openai import OpenAI
 # 视觉模型从配置导入
 from app.config import (
     SILICONFLOW_API_KEY,
@@ -16,6 +15,12 @@ from app.config import (
     EXTRACT_MODEL,
     VISION_MODEL
 )
+from app.services.throttle import llm_throttle
+from app.telemetry import tracer, traced, annotate_llm_usage
+from app.telemetry.metrics import LLM_ERRORS, LLM_LATENCY, record_llm_usage, track_call
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
 # ============================================
@@ -25,6 +30,9 @@ from app.config import (
 # 视觉模型（用于图片识别）
 VISION_MODEL = "THUDM/GLM-4.1V-9B-Thinking"
 
+# 视觉模型最多看前几页（合同关键信息基本都在首页和签署页之前）
+VISION_MAX_PAGES = 5
+
 # 提取提示词
 EXTRACT_PROMPT = """
 请从以下合同图片和OCR文本中提取关键信息，以JSON格式输出。
@@ -94,11 +102,18 @@ TEXT_EXTRACT_PROMPT = """
 # region LLM 客户端
 # ============================================
 
-def get_client() -> OpenAI:
-    """获取 LLM 客户端"""
+def get_client() -> "OpenAI":
+    """
+    获取 LLM 客户端（openai 导入较慢，首次调用时才加载）
+
+    限流和重试由 llm_throttle 统一负责（429 时全局降速），关闭客户端自带的重试
+    """
+    from openai import OpenAI
+
     return OpenAI(
         api_key=SILICONFLOW_API_KEY,
         base_url=SILICONFLOW_BASE_URL,
+        max_retries=0,
     )
 
 # endregion
@@ -131,6 +146,7 @@ def image_to_base64(image: Image.Image, max_size: int = 1024) -> str:
     return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
+@traced("extract.images_to_blob")
 def images_to_blob(images: List[Image.Image]) -> bytes:
     """
     将多张图片打包为 ZIP BLOB
@@ -197,10 +213,11 @@ def parse_extracted_info(text: str) -> dict:
 # region 视觉模型提取
 # ============================================
 
+@traced("extract.vision", model=VISION_MODEL)
 def extract_with_vision(
     images: List[Image.Image],
     ocr_text: str,
-    max_pages: int = 5,
+    max_pages: int = VISION_MAX_PAGES,
 ) -> dict:
     """
     使用视觉模型提取合同信息
@@ -236,14 +253,20 @@ def extract_with_vision(
         "text": prompt,
     })
     
+    def create():
+        with track_call(LLM_LATENCY, LLM_ERRORS, model=VISION_MODEL, op="extract_vision"):
+            return client.chat.completions.create(
+                model=VISION_MODEL,
+                messages=[{"role": "user", "content": content}],
+                temperature=0.1,
+                max_tokens=2000,
+            )
+    
     try:
-        response = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[{"role": "user", "content": content}],
-            temperature=0.1,
-            max_tokens=2000,
-        )
+        response = llm_throttle.call(create)
         
+        annotate_llm_usage(tracer.current_span(), response)
+        record_llm_usage(VISION_MODEL, response)
         result_text = response.choices[0].message.content.strip()
         return parse_extracted_info(result_text)
         
@@ -259,6 +282,7 @@ def extract_with_vision(
 # region 文本模型提取
 # ============================================
 
+@traced("extract.text", model=EXTRACT_MODEL)
 def extract_with_text(text: str) -> dict:
     """
     使用纯文本模型提取合同信息（备用方案）
@@ -272,20 +296,26 @@ def extract_with_text(text: str) -> dict:
     
     prompt = TEXT_EXTRACT_PROMPT.replace("{contract_text}", text[:8000])
     
+    def create():
+        with track_call(LLM_LATENCY, LLM_ERRORS, model=EXTRACT_MODEL, op="extract_text"):
+            return client.chat.completions.create(
+                model=EXTRACT_MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "你是专业的法律合同信息提取专家。请严格按JSON格式输出。"
+                    },
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=2000,
+            )
+    
     try:
-        response = client.chat.completions.create(
-            model=EXTRACT_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "你是专业的法律合同信息提取专家。请严格按JSON格式输出。"
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=2000,
-        )
+        response = llm_throttle.call(create)
         
+        annotate_llm_usage(tracer.current_span(), response)
+        record_llm_usage(EXTRACT_MODEL, response)
         result_text = response.choices[0].message.content.strip()
         return parse_extracted_info(result_text)
         
@@ -354,6 +384,7 @@ def clean_extracted_info(info: dict) -> dict:
 # region 主函数
 # ============================================
 
+@traced("extract.contract")
 def extract_contract_info(
     images: List[Image.Image],
     ocr_text: str,
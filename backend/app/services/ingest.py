@@ -0,0 +1,759 @@
+"""
+合同上传流水线
+把"转图片 → OCR → 水印过滤 → 视觉提取 → 图片打包 → 入库"拆成有向无环图（DAG），
+每个阶段的依赖一就绪就提交到线程池执行，互不依赖的阶段并行：
+
+    - 视觉模型只看前 VISION_MAX_PAGES 页：前几页渲染、识别完就开始调用，
+      与其余页面的 OCR 并行
+    - 图片打包不依赖 OCR：页面渲染完就开始压缩，与 OCR 并行
+    - 其余扫描页的预扫描和渲染（poppler 子进程）与前几页的识别并行；
+      识别在 OCR 引擎内串行，前几页优先
+    - 入库等所有阶段完成后执行
+
+端到端耗时接近最慢的那条链（通常是 OCR 或视觉模型调用），而不是各阶段之和；
+每个阶段的开始时间和耗时随结果返回，便于看出瓶颈
+
+上传前按内容哈希查重（见 app.services.dedup），已入库的文件直接返回已有记录；
+批量上传（ingest_batch）在此之上多文件并发：文件数、本地计算阶段、远程模型调用
+分别限制并发（BATCH_FILE_CONCURRENCY / INGEST_CPU_CONCURRENCY / INGEST_REMOTE_CONCURRENCY），
+模型调用另有令牌桶限速（见 app.services.throttle）；试运行（estimate_batch）只读页数和文本层，
+按实测的单位耗时估算吞吐和瓶颈
+
+类比：后厨出菜
+凉菜做好先上，热菜还在灶上；洗碗、备料同时进行，等所有菜都上齐了才结账
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import (
+    INGEST_STAGE_WORKERS,
+    INGEST_CPU_CONCURRENCY,
+    INGEST_REMOTE_CONCURRENCY,
+    BATCH_FILE_CONCURRENCY,
+    UPLOAD_NEAR_DUPLICATE,
+    OCR_ADAPTIVE_DPI,
+    PDF_TEXT_LAYER_ENABLED,
+)
+from app.db import crud
+from app.db.database import db_session
+from app.schemas import PerformanceCreate
+from app.services.dedup import candidate_file_names, content_hash, find_duplicate, page_hashes as dhash_pages
+from app.services.extractor import (
+    EXTRACT_MODEL,
+    VISION_MAX_PAGES,
+    VISION_MODEL,
+    clean_extracted_info,
+    extract_with_text,
+    extract_with_vision,
+    images_to_blob,
+)
+from app.services.ocr import (
+    assemble_pages,
+    build_full_text,
+    filter_watermarks,
+    log_text_layer_usage,
+    ocr_pages,
+    pdf_page_count,
+    prepare_ocr_pages,
+    rasterize_pages,
+    read_text_layer,
+    recognize_pages,
+)
+from app.services.throttle import llm_throttle
+from app.telemetry import tracer
+from app.telemetry.metrics import (
+    INGEST_LATENCY,
+    INGEST_SLOT_WAIT,
+    INGEST_STAGE_LATENCY,
+    LLM_LATENCY,
+    OCR_PAGE_LATENCY,
+    UPLOAD_DUPLICATES,
+)
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 阶段线程池（进程内共享；渲染在 poppler 子进程、模型调用在等网络，线程足够）
+_executor = ThreadPoolExecutor(max_workers=INGEST_STAGE_WORKERS, thread_name_prefix="ingest")
+
+# 阶段并发名额（进程内所有上传共享）：本地计算（渲染、OCR、打包）/ 远程模型调用
+STAGE_SLOTS = {
+    "cpu": threading.BoundedSemaphore(INGEST_CPU_CONCURRENCY),
+    "remote": threading.BoundedSemaphore(INGEST_REMOTE_CONCURRENCY),
+}
+
+# 试运行估算的默认单位耗时（秒），本进程还没有实测数据时使用
+DEFAULT_OCR_PAGE_SECONDS = 1.5
+DEFAULT_VISION_SECONDS = 10.0
+DEFAULT_TEXT_MODEL_SECONDS = 6.0
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region DAG 执行
+# ============================================
+
+class StageError(RuntimeError):
+    """流水线某个阶段失败"""
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(f"{stage}: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Pipeline:
+    """
+    按依赖关系并行执行的阶段图
+
+    用法:
+        pipeline = Pipeline("ingest")
+        pipeline.stage("images", render, kind="cpu")
+        pipeline.stage("blob", lambda images: pack(images), "images", kind="cpu")
+        results = pipeline.run()
+        pipeline.timings  # {"images": {"start": 0.0, "seconds": 1.2, "wait": 0.0}, ...}
+
+    阶段函数以依赖阶段名为关键字参数接收其结果；kind 指定占用哪类并发名额（STAGE_SLOTS），
+    名额用完时阶段排队等待（计入 wait）；
+    任一阶段失败时不再启动新阶段，等已启动的阶段结束后抛出 StageError
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...], Optional[str]]] = {}
+        self.timings: Dict[str, dict] = {}
+        self.elapsed = 0.0
+
+    def stage(self, name: str, fn: Callable[..., Any], *deps: str, kind: Optional[str] = None) -> None:
+        """添加阶段（依赖必须先添加）"""
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"阶段 {name} 依赖未定义的阶段: {', '.join(missing)}")
+        if kind is not None and kind not in STAGE_SLOTS:
+            raise ValueError(f"未知的并发名额类型: {kind}")
+        self._stages[name] = (fn, deps, kind)
+
+    def _run_stage(self, name: str, fn: Callable[..., Any], kind: Optional[str], kwargs: dict, started: float):
+        queued = time.perf_counter()
+        with STAGE_SLOTS[kind] if kind else nullcontext():
+            offset = time.perf_counter() - started
+            waited = time.perf_counter() - queued
+            if kind:
+                INGEST_SLOT_WAIT.observe(waited, kind=kind)
+            with tracer.span(f"{self.name}.{name}"), INGEST_STAGE_LATENCY.time(stage=name):
+                try:
+                    return fn(**kwargs)
+                finally:
+                    self.timings[name] = {
+                        "start": round(offset, 3),
+                        "seconds": round(time.perf_counter() - started - offset, 3),
+                        "wait": round(waited, 3),
+                    }
+
+    def run(self) -> Dict[str, Any]:
+        """执行全部阶段，返回 {阶段名: 结果}"""
+        results: Dict[str, Any] = {}
+        waiting = dict(self._stages)
+        running: Dict[Future, str] = {}
+        failure: Optional[StageError] = None
+        started = time.perf_counter()
+
+        with tracer.span(f"{self.name}.pipeline", stages=len(waiting)):
+            while True:
+                if failure is None:
+                    for name, (fn, deps, kind) in list(waiting.items()):
+                        if all(dep in results for dep in deps):
+                            del waiting[name]
+                            # 复制上下文，使各阶段的 span 挂在流水线链路下
+                            ctx = contextvars.copy_context()
+                            kwargs = {dep: results[dep] for dep in deps}
+                            future = _executor.submit(ctx.run, self._run_stage, name, fn, kind, kwargs, started)
+                            running[future] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        failure = failure or StageError(name, e)
+
+        self.elapsed = time.perf_counter() - started
+        if failure is not None:
+            raise failure
+        return results
+
+    def report(self) -> Dict[str, dict]:
+        """按开始时间排序的阶段耗时"""
+        return dict(sorted(self.timings.items(), key=lambda item: item[1]["start"]))
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 合同上传
+# ============================================
+
+def ingest_contract(
+    pdf_bytes: bytes,
+    use_vision: bool = True,
+    keep_images: bool = True,
+    filter_watermark: bool = True,
+    save: Optional[Callable[[dict, dict, Optional[bytes], Optional[List[str]]], Any]] = None,
+    use_text_layer: bool = PDF_TEXT_LAYER_ENABLED,
+    adaptive_dpi: bool = OCR_ADAPTIVE_DPI,
+    vision_pages: int = VISION_MAX_PAGES,
+) -> dict:
+    """
+    合同 PDF 解析流水线：文本层 / OCR、信息提取、图片打包、入库
+
+    参数:
+        pdf_bytes: PDF 文件字节
+        use_vision: 是否使用视觉模型（失败时回退到文本模型）
+        keep_images: 是否渲染全部页面，打包为图片 BLOB 并计算每页差值哈希（交给 save 入库）
+        filter_watermark: 是否过滤水印
+        save: 入库函数 save(extracted_info, text, image_blob, page_hashes)，其返回值作为 saved；
+              为 None 时不入库
+        use_text_layer: 是否优先使用 PDF 文本层
+        adaptive_dpi: 其余扫描页是否自适应分辨率
+        vision_pages: 视觉模型看的页数（也是优先识别的页数）
+    返回:
+        {
+            "pages": [...], "full_text": "...", "page_count": 10,
+            "text_layer_pages": 8, "skipped_pages": 1,     # 同 extract_text_from_pdf
+            "extracted_info": {...},                       # 清洗后的合同信息
+            "saved": ...,                                  # save 的返回值
+            "timings": {阶段: {"start": 秒, "seconds": 秒, "wait": 等待并发名额的秒数}},
+            "elapsed": 12.3,
+        }
+    """
+    need_head_images = use_vision or keep_images
+    pipeline = Pipeline("ingest")
+
+    # --- 文本层和页数 ---
+
+    def text_layer():
+        return read_text_layer(pdf_bytes) if use_text_layer else None
+
+    def page_count(text_layer):
+        return len(text_layer) if text_layer is not None else pdf_page_count(pdf_bytes)
+
+    def head_count(page_count):
+        return min(vision_pages, page_count)
+
+    def scanned(text_layer, first: int, last: int) -> List[int]:
+        """[first, last] 中需要 OCR 的页"""
+        return [i for i in range(first, last + 1) if text_layer is None or text_layer[i - 1] is None]
+
+    pipeline.stage("text_layer", text_layer, kind="cpu")
+    pipeline.stage("page_count", page_count, "text_layer")
+
+    # --- 前几页：渲染 → 识别 → 视觉提取 ---
+
+    if need_head_images:
+        # 不等页数：pdf2image 会把超出的页码截掉
+        pipeline.stage(
+            "head_images", lambda: rasterize_pages(pdf_bytes, list(range(1, vision_pages + 1))), kind="cpu"
+        )
+
+    def head_ocr(text_layer, page_count, head_images=None):
+        images = [head_images[i] for i in sorted(head_images)] if head_images else None
+        return ocr_pages(pdf_bytes, scanned(text_layer, 1, head_count(page_count)), images, adaptive=adaptive_dpi)
+
+    pipeline.stage(
+        "head_ocr", head_ocr, "text_layer", "page_count", *(["head_images"] if need_head_images else []), kind="cpu"
+    )
+
+    def head_pages(text_layer, page_count, head_ocr) -> List[dict]:
+        count = head_count(page_count)
+        text_pages = text_layer[:count] if text_layer is not None else [None] * count
+        return assemble_pages(text_pages, head_ocr)
+
+    if use_vision:
+        def vision(text_layer, page_count, head_ocr, head_images):
+            pages = head_pages(text_layer, page_count, head_ocr)
+            if filter_watermark:
+                pages = filter_watermarks(pages)
+            images = [head_images[i] for i in sorted(head_images)]
+            return extract_with_vision(images, build_full_text(pages), max_pages=vision_pages)
+
+        pipeline.stage("vision", vision, "text_layer", "page_count", "head_ocr", "head_images", kind="remote")
+
+    # --- 其余页：渲染与前几页的识别并行，识别排在前几页之后 ---
+
+    def tail_render(text_layer, page_count):
+        return prepare_ocr_pages(
+            pdf_bytes, scanned(text_layer, head_count(page_count) + 1, page_count), adaptive=adaptive_dpi
+        )
+
+    def tail_ocr(tail_render, head_ocr):
+        return recognize_pages(*tail_render)
+
+    pipeline.stage("tail_render", tail_render, "text_layer", "page_count", kind="cpu")
+    pipeline.stage("tail_ocr", tail_ocr, "tail_render", "head_ocr", kind="cpu")
+
+    def text(text_layer, page_count, head_ocr, tail_ocr):
+        if text_layer is not None:
+            log_text_layer_usage(text_layer)
+        pages = head_pages(text_layer, page_count, head_ocr)
+        tail_pages = text_layer[len(pages):] if text_layer is not None else [None] * (page_count - len(pages))
+        pages += assemble_pages(tail_pages, tail_ocr, first_page=len(pages) + 1)
+        if filter_watermark:
+            pages = filter_watermarks(pages)
+        return {
+            "pages": pages,
+            "full_text": build_full_text(pages),
+            "page_count": page_count,
+            "text_layer_pages": sum(1 for page in pages if page.get("source") == "text"),
+            "skipped_pages": sum(1 for page in pages if page.get("source") == "blank"),
+        }
+
+    pipeline.stage("text", text, "text_layer", "page_count", "head_ocr", "tail_ocr")
+
+    # --- 信息提取：视觉模型失败时用全文走文本模型 ---
+
+    def extract(text, vision=None):
+        info = vision or {}
+        if not info and text["full_text"]:
+            info = extract_with_text(text["full_text"])
+        return clean_extracted_info(info)
+
+    pipeline.stage("extract", extract, "text", *(["vision"] if use_vision else []), kind="remote")
+
+    # --- 图片打包：不依赖 OCR ---
+
+    if keep_images:
+        def tail_images(page_count):
+            return rasterize_pages(pdf_bytes, list(range(vision_pages + 1, page_count + 1)))
+
+        def all_images(head_images, tail_images) -> list:
+            pages = {**head_images, **tail_images}
+            return [pages[i] for i in sorted(pages)]
+
+        def blob(head_images, tail_images):
+            return images_to_blob(all_images(head_images, tail_images))
+
+        def page_hashes(head_images, tail_images):
+            return dhash_pages(all_images(head_images, tail_images))
+
+        pipeline.stage("tail_images", tail_images, "page_count", kind="cpu")
+        pipeline.stage("blob", blob, "head_images", "tail_images", kind="cpu")
+        pipeline.stage("page_hashes", page_hashes, "head_images", "tail_images", kind="cpu")
+
+    # --- 入库：等所有部分完成 ---
+
+    if save is not None:
+        def saved(extract, text, blob=None, page_hashes=None):
+            return save(extract, text, blob, page_hashes)
+
+        pipeline.stage("save", saved, "extract", "text", *(["blob", "page_hashes"] if keep_images else []))
+
+    results = pipeline.run()
+    INGEST_LATENCY.observe(pipeline.elapsed)
+
+    timings = pipeline.report()
+    slowest = max(timings.items(), key=lambda item: item[1]["seconds"])
+    print(
+        f"📥 上传流水线完成: {pipeline.elapsed:.1f}s（各阶段合计 "
+        f"{sum(t['seconds'] for t in timings.values()):.1f}s，最慢 {slowest[0]} {slowest[1]['seconds']:.1f}s）"
+    )
+    return {
+        **results["text"],
+        "extracted_info": results["extract"],
+        "saved": results.get("save"),
+        "timings": timings,
+        "elapsed": round(pipeline.elapsed, 3),
+    }
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 入库
+# ============================================
+
+class SavedPerformance(NamedTuple):
+    """入库结果"""
+    performance_id: int
+    file_name: str
+    # 相同内容已由并发的另一次上传入库，performance_id 为那条记录
+    duplicate: bool = False
+
+
+def save_performance(
+    db: Session,
+    file_name: str,
+    extracted_info: dict,
+    full_text: str,
+    image_blob: Optional[bytes] = None,
+    content_hash: Optional[str] = None,
+    page_hashes: Optional[List[str]] = None,
+) -> SavedPerformance:
+    """
+    解析结果保存为业绩记录
+    
+    文件名在插入时确定：已被其他内容占用（唯一约束冲突）时依次改用加哈希后缀的名字，
+    并发上传的同名文件不会在解析完成后才因重名失败；
+    内容哈希冲突（相同文件被并发上传，另一方先入库）时不再插入，返回已有记录
+    
+    参数:
+        db: 数据库会话
+        file_name: 文件名
+        extracted_info: 清洗后的合同信息
+        full_text: OCR 全文
+        image_blob: 页面图片 ZIP
+        content_hash: PDF 内容哈希（同时用于生成后缀文件名）
+        page_hashes: 每页差值哈希
+    返回:
+        SavedPerformance
+    """
+    # 转换日期格式
+    sign_date = None
+    if extracted_info.get("sign_date"):
+        try:
+            sign_date = datetime.strptime(extracted_info["sign_date"], "%Y-%m-%d").date()
+        except ValueError:
+            pass
+    
+    # 金额转换（元 -> 万元）
+    amount = extracted_info.get("amount")
+    if amount:
+        amount = amount / 10000  # 转为万元
+    
+    subject_amount = extracted_info.get("subject_amount")
+    if subject_amount:
+        subject_amount = subject_amount / 10000
+    
+    # 创建业绩记录
+    performance_data = PerformanceCreate(
+        file_name=file_name,
+        party_a=extracted_info.get("party_a"),
+        party_a_credit_code=extracted_info.get("party_a_credit_code"),
+        contract_type=extracted_info.get("contract_type"),
+        amount=amount,
+        sign_date=sign_date,
+        project_detail=extracted_info.get("project_detail"),
+        subject_amount=subject_amount,
+        opponent=extracted_info.get("opponent"),
+        team_member=extracted_info.get("team_member"),
+        summary=extracted_info.get("summary"),
+        raw_text=full_text,
+    )
+    
+    names = candidate_file_names(file_name, content_hash)
+    for i, name in enumerate(names):
+        performance_data.file_name = name
+        try:
+            performance = crud.create_performance(
+                db, performance_data, image_data=image_blob, content_hash=content_hash, page_hashes=page_hashes
+            )
+            return SavedPerformance(performance.id, name)
+        except IntegrityError:
+            db.rollback()
+            existing = crud.get_performance_by_content_hash(db, content_hash) if content_hash else None
+            if existing is not None:
+                UPLOAD_DUPLICATES.inc(kind="concurrent")
+                return SavedPerformance(existing.id, existing.file_name, duplicate=True)
+            # 只处理文件名冲突，其他约束错误照常抛出
+            if i == len(names) - 1 or crud.get_performance_by_filename(db, name) is None:
+                raise
+    raise AssertionError("unreachable")
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 批量上传
+# ============================================
+
+def _failure(file_name: str, message: str) -> dict:
+    return {"file_name": file_name, "success": False, "message": message}
+
+
+def _duplicate(file_name: str, message: str, performance_id: Optional[int] = None, similarity: float = 1.0) -> dict:
+    return {
+        "file_name": file_name,
+        "success": True,
+        "message": message,
+        "performance_id": performance_id,
+        "duplicate_of": performance_id,
+        "similarity": round(similarity, 3),
+    }
+
+
+def _precheck(file_name: str, pdf_bytes: bytes, digest: str, near_duplicate: bool = False) -> Optional[dict]:
+    """解析前检查（类型、内容是否已入库），不需要解析时返回该文件的结果"""
+    if not file_name.lower().endswith(".pdf"):
+        return _failure(file_name, "不是 PDF 文件")
+    with db_session() as db:
+        match = find_duplicate(db, pdf_bytes, near=near_duplicate, digest=digest, file_name=file_name)
+    if match is not None:
+        return _duplicate(file_name, match.describe(), match.performance_id, match.similarity)
+    return None
+
+
+def ingest_file(
+    file_name: str,
+    pdf_bytes: bytes,
+    use_vision: bool = True,
+    near_duplicate: bool = UPLOAD_NEAR_DUPLICATE,
+) -> dict:
+    """
+    解析并保存单个文件（批量上传的一个任务，在工作线程中执行，使用独立的数据库会话）
+    
+    参数:
+        file_name: 文件名
+        pdf_bytes: PDF 文件字节
+        use_vision: 是否使用视觉模型
+        near_duplicate: 是否做近似重复检测
+    返回:
+        {"file_name", "success", "message", "performance_id", "page_count", "elapsed", "timings"}；
+        重复的文件为 {"file_name", "success", "message", "performance_id", "duplicate_of", "similarity"}
+    """
+    digest = content_hash(pdf_bytes)
+    skipped = _precheck(file_name, pdf_bytes, digest, near_duplicate)
+    if skipped:
+        return skipped
+    
+    def save(extracted_info: dict, text: dict, image_blob: Optional[bytes], page_hashes: Optional[List[str]]) -> SavedPerformance:
+        with db_session() as db:
+            return save_performance(
+                db, file_name, extracted_info, text["full_text"], image_blob,
+                content_hash=digest, page_hashes=page_hashes,
+            )
+    
+    try:
+        result = ingest_contract(pdf_bytes, use_vision=use_vision, save=save)
+    except Exception as e:
+        return _failure(file_name, str(e))
+    saved: SavedPerformance = result["saved"]
+    if saved.duplicate:
+        return _duplicate(
+            file_name, f"相同内容已由同时进行的上传入库（ID: {saved.performance_id}，{saved.file_name}）",
+            saved.performance_id,
+        )
+    stored_name = saved.file_name
+    return {
+        "file_name": file_name,
+        "success": True,
+        "message": "解析成功" + (f"，文件名已被占用，保存为 '{stored_name}'" if stored_name != file_name else ""),
+        "performance_id": saved.performance_id,
+        "stored_name": stored_name,
+        "page_count": result["page_count"],
+        "elapsed": result["elapsed"],
+        "timings": result["timings"],
+    }
+
+
+async def _run_bounded(
+    files: List[Tuple[str, bytes]],
+    concurrency: int,
+    work: Callable[[str, bytes], dict],
+) -> AsyncIterator[dict]:
+    """最多 concurrency 个文件同时在线程中执行 work，按完成顺序产出结果（批次内内容相同的文件只处理第一个）"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run_one(file_name: str, pdf_bytes: bytes) -> dict:
+        async with semaphore:
+            return await asyncio.to_thread(work, file_name, pdf_bytes)
+    
+    seen: Dict[str, str] = {}
+    repeated = []
+    tasks = []
+    for file_name, pdf_bytes in files:
+        digest = content_hash(pdf_bytes)
+        if digest in seen:
+            repeated.append(_duplicate(file_name, f"与批次内的 '{seen[digest]}' 内容相同，未重复解析"))
+            continue
+        seen[digest] = file_name
+        tasks.append(asyncio.create_task(run_one(file_name, pdf_bytes)))
+    
+    try:
+        for result in repeated:
+            yield result
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # 客户端断开时取消还没开始的文件（已在线程中执行的会跑完）
+        for task in tasks:
+            task.cancel()
+
+
+async def ingest_batch(
+    files: List[Tuple[str, bytes]],
+    use_vision: bool = True,
+    concurrency: int = BATCH_FILE_CONCURRENCY,
+    near_duplicate: bool = UPLOAD_NEAR_DUPLICATE,
+) -> AsyncIterator[dict]:
+    """
+    批量解析入库，每完成一个文件产出一条结果，最后产出汇总
+    
+    参数:
+        files: [(文件名, PDF 字节)]
+        use_vision: 是否使用视觉模型
+        concurrency: 同时处理的文件数
+        near_duplicate: 是否做近似重复检测
+    返回:
+        异步迭代 {"event": "file", ...ingest_file 的结果}，最后一条 {"event": "summary", ...}
+    """
+    started = time.perf_counter()
+    success_count = duplicate_count = fail_count = pages = 0
+    
+    def work(file_name: str, pdf_bytes: bytes) -> dict:
+        return ingest_file(file_name, pdf_bytes, use_vision, near_duplicate)
+    
+    async for result in _run_bounded(files, concurrency, work):
+        if not result["success"]:
+            fail_count += 1
+        elif "duplicate_of" in result:
+            duplicate_count += 1
+        else:
+            success_count += 1
+            pages += result["page_count"]
+        yield {"event": "file", **result}
+    
+    elapsed = time.perf_counter() - started
+    print(f"📦 批量上传完成: 解析 {success_count}/{len(files)} 个文件（重复 {duplicate_count}），{pages} 页，{elapsed:.1f}s")
+    yield {
+        "event": "summary",
+        "total": len(files),
+        "success_count": success_count,
+        "duplicate_count": duplicate_count,
+        "fail_count": fail_count,
+        "elapsed": round(elapsed, 3),
+        "files_per_minute": round(success_count / elapsed * 60, 2) if elapsed > 0 else None,
+        "pages_per_minute": round(pages / elapsed * 60, 2) if elapsed > 0 else None,
+    }
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 试运行估算
+# ============================================
+
+def unit_costs(use_vision: bool = True) -> Dict[str, dict]:
+    """估算用的单位耗时：优先使用本进程的实测均值，没有样本时用默认值"""
+    ocr = OCR_PAGE_LATENCY.mean()
+    if use_vision:
+        call = LLM_LATENCY.mean(model=VISION_MODEL, op="extract_vision")
+        default_call = DEFAULT_VISION_SECONDS
+    else:
+        call = LLM_LATENCY.mean(model=EXTRACT_MODEL, op="extract_text")
+        default_call = DEFAULT_TEXT_MODEL_SECONDS
+    return {
+        "ocr_page": {"seconds": round(ocr or DEFAULT_OCR_PAGE_SECONDS, 3), "source": "measured" if ocr else "default"},
+        "model_call": {"seconds": round(call or default_call, 3), "source": "measured" if call else "default"},
+    }
+
+
+def probe_file(file_name: str, pdf_bytes: bytes) -> dict:
+    """试运行：只读页数和文本层，统计需要 OCR 的页数（不渲染、不调用模型；只按内容哈希查重）"""
+    skipped = _precheck(file_name, pdf_bytes, content_hash(pdf_bytes))
+    if skipped:
+        return skipped
+    try:
+        text_layer = read_text_layer(pdf_bytes) if PDF_TEXT_LAYER_ENABLED else None
+        page_count = len(text_layer) if text_layer is not None else pdf_page_count(pdf_bytes)
+    except Exception as e:
+        return _failure(file_name, f"无法读取 PDF: {e}")
+    ocr_pages = page_count if text_layer is None else sum(1 for lines in text_layer if lines is None)
+    return {
+        "file_name": file_name,
+        "success": True,
+        "message": "可以解析",
+        "page_count": page_count,
+        "text_layer_pages": page_count - ocr_pages,
+        "ocr_pages": ocr_pages,
+    }
+
+
+async def estimate_batch(
+    files: List[Tuple[str, bytes]],
+    use_vision: bool = True,
+    concurrency: int = BATCH_FILE_CONCURRENCY,
+) -> AsyncIterator[dict]:
+    """
+    试运行：估算批量上传的耗时、吞吐和瓶颈（不调用模型、不入库）
+    
+    总耗时取以下几个下限中最大的一个（即瓶颈）:
+        - ocr: 全部扫描页的 OCR 耗时（推理在进程内串行）
+        - model_concurrency: 模型调用数 × 单次耗时 / INGEST_REMOTE_CONCURRENCY
+        - rate_limit: 超出突发容量的模型调用按当前限速发出所需的时间
+        - file_concurrency: 各文件流水线耗时之和 / 同时处理的文件数（不少于最慢的单个文件）
+    
+    参数:
+        files: [(文件名, PDF 字节)]
+        use_vision: 是否使用视觉模型
+        concurrency: 同时处理的文件数
+    返回:
+        异步迭代 {"event": "file", "dry_run": True, ...}，最后一条 {"event": "summary", ...}
+    """
+    costs = unit_costs(use_vision)
+    ocr_seconds = costs["ocr_page"]["seconds"]
+    call_seconds = costs["model_call"]["seconds"]
+    
+    probes = []
+    async for probe in _run_bounded(files, INGEST_CPU_CONCURRENCY, probe_file):
+        if probe["success"] and "duplicate_of" not in probe:
+            # 前几页识别完才调用模型，与其余页的 OCR 并行
+            head = min(probe["ocr_pages"], VISION_MAX_PAGES)
+            probe["estimated_seconds"] = round(
+                max(probe["ocr_pages"] * ocr_seconds, head * ocr_seconds + call_seconds), 1
+            )
+            probes.append(probe)
+        yield {"event": "file", "dry_run": True, **probe}
+    
+    calls = len(probes)
+    bucket = llm_throttle.bucket
+    bounds = {
+        "ocr": sum(probe["ocr_pages"] for probe in probes) * ocr_seconds,
+        "model_concurrency": calls * call_seconds / max(1, INGEST_REMOTE_CONCURRENCY),
+        "rate_limit": max(0, calls - bucket.capacity) / bucket.rate if bucket.enabled else 0.0,
+        "file_concurrency": max(
+            [sum(probe["estimated_seconds"] for probe in probes) / max(1, min(concurrency, calls))]
+            + [probe["estimated_seconds"] for probe in probes]
+        ),
+    }
+    bottleneck = max(bounds, key=bounds.get) if calls else None
+    estimated = bounds[bottleneck] if calls else 0.0
+    yield {
+        "event": "summary",
+        "dry_run": True,
+        "total": len(files),
+        "processable": calls,
+        "ocr_pages": sum(probe["ocr_pages"] for probe in probes),
+        "estimated_seconds": round(estimated, 1),
+        "files_per_minute": round(calls / estimated * 60, 2) if estimated > 0 else None,
+        "bottleneck": bottleneck,
+        "bounds": {name: round(value, 1) for name, value in bounds.items()},
+        "unit_costs": costs,
+        "concurrency": {
+            "files": concurrency,
+            "cpu": INGEST_CPU_CONCURRENCY,
+            "remote": INGEST_REMOTE_CONCURRENCY,
+        },
+        "throttle": llm_throttle.describe(),
+    }
+
+# endregion
+# ============================================
@@ -5,11 +5,39 @@ OCR 识别服务
 
 import os
 import io
+import re
+import shutil
+import subprocess
+import time
+from collections import Counter
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
 from PIL import Image
+from rapidfuzz import fuzz, process
 
-from app.config import BACKEND_DIR
+from app.config import (
+    BACKEND_DIR,
+    PDF_TEXT_LAYER_ENABLED,
+    PDF_TEXT_LAYER_MIN_CHARS,
+    PDF_TEXT_LAYER_MIN_QUALITY,
+    OCR_ADAPTIVE_DPI,
+    OCR_PREPASS_DPI,
+    OCR_MIN_DPI,
+    OCR_MAX_DPI,
+    OCR_TARGET_TEXT_PX,
+    OCR_BLANK_INK_RATIO,
+)
+from app.services.ocr_engine import ocr_engine
+from app.telemetry import tracer, traced
+from app.telemetry.metrics import (
+    OCR_PAGES,
+    OCR_PAGE_LATENCY,
+    OCR_THROUGHPUT,
+    OCR_SKIPPED_PAGES,
+    PDF_TEXT_LAYER_PAGES,
+)
 
 
 # ============================================
@@ -24,7 +52,28 @@ POPPLER_PATH = os.getenv("POPPLER_PATH", r"D:\.Software\poppler\Library\bin")
 
 # OCR 配置
 OCR_DPI = 200
-OCR_LANG = "ch"
+
+# 空间水印检测：位置容差（占页面宽高比例）、角度容差（度）、
+# 视为"倾斜"的最小角度、页眉页脚区域（占页高比例，区域内固定位置的重复文本不视为水印）
+WATERMARK_POSITION_TOLERANCE = 0.02
+WATERMARK_ANGLE_TOLERANCE = 5.0
+WATERMARK_MIN_ANGLE = 10.0
+WATERMARK_MARGIN = 0.08
+
+# 水印检测方式
+WATERMARK_METHODS = ("auto", "spatial", "text")
+
+# 文本层中的"有效字符"：汉字、全角符号、字母数字、常用标点
+TEXT_LAYER_GOOD_CHARS = re.compile(
+    r"[\u4e00-\u9fff\u3400-\u4dbf\u3000-\u303f\uff00-\uffef0-9A-Za-z!-/:-@\[-`{-~·—–‘’“”…]"
+)
+
+# pdftotext 超时（秒）
+TEXT_LAYER_TIMEOUT = 60
+
+# 预扫描：墨迹灰度上限（同时不超过"纸色 - 40"）、裁剪时四周保留的边距（占页面比例）
+INK_LEVEL = 200
+REGION_MARGIN = 0.02
 
 # 临时文件目录
 TEMP_DIR = BACKEND_DIR / "temp"
@@ -38,6 +87,7 @@ TEMP_DIR.mkdir(exist_ok=True)
 # region PDF 转图片
 # ============================================
 
+@traced("pdf.rasterize")
 def pdf_to_images(pdf_path: str, dpi: int = OCR_DPI) -> List[Image.Image]:
     """
     将 PDF 转换为图片列表
@@ -59,6 +109,7 @@ def pdf_to_images(pdf_path: str, dpi: int = OCR_DPI) -> List[Image.Image]:
     return images
 
 
+@traced("pdf.rasterize")
 def pdf_bytes_to_images(pdf_bytes: bytes, dpi: int = OCR_DPI) -> List[Image.Image]:
     """
     将 PDF 字节流转换为图片列表
@@ -79,54 +130,362 @@ def pdf_bytes_to_images(pdf_bytes: bytes, dpi: int = OCR_DPI) -> List[Image.Imag
     
     return images
 
+
+def pdf_page_count(pdf_bytes: bytes) -> int:
+    """读取 PDF 页数（poppler pdfinfo，不渲染页面）"""
+    from pdf2image import pdfinfo_from_bytes
+    
+    return int(pdfinfo_from_bytes(pdf_bytes, poppler_path=POPPLER_PATH)["Pages"])
+
+
+@traced("pdf.rasterize")
+def rasterize_pages(pdf_bytes: bytes, pages: List[int], dpi: int = OCR_DPI) -> Dict[int, Image.Image]:
+    """
+    只把指定页转换为图片（连续的页合并为一次调用）
+    
+    参数:
+        pdf_bytes: PDF 文件字节
+        pages: 页码列表（从 1 开始）
+        dpi: 分辨率
+    返回:
+        {页码: PIL Image}
+    """
+    from pdf2image import convert_from_bytes
+    
+    images: Dict[int, Image.Image] = {}
+    pages = sorted(set(pages))
+    start = 0
+    while start < len(pages):
+        end = start
+        while end + 1 < len(pages) and pages[end + 1] == pages[end] + 1:
+            end += 1
+        rendered = convert_from_bytes(
+            pdf_bytes,
+            poppler_path=POPPLER_PATH,
+            dpi=dpi,
+            first_page=pages[start],
+            last_page=pages[end],
+        )
+        images.update(zip(pages[start:end + 1], rendered))
+        start = end + 1
+    
+    return images
+
 # endregion
 # ============================================
 
 
 # ============================================
-# region OCR 识别
+# region PDF 文本层
 # ============================================
 
-_ocr_instance = None
+def _poppler_tool(name: str) -> Optional[str]:
+    """查找 poppler 命令行工具（优先 POPPLER_PATH，其次 PATH）"""
+    if POPPLER_PATH and os.path.isdir(POPPLER_PATH):
+        for candidate in (name, f"{name}.exe"):
+            path = os.path.join(POPPLER_PATH, candidate)
+            if os.path.isfile(path):
+                return path
+    return shutil.which(name)
 
-def get_ocr_instance():
-    """获取 PaddleOCR 实例（单例）"""
-    global _ocr_instance
-    
-    if _ocr_instance is None:
-        from paddleocr import PaddleOCR
-        _ocr_instance = PaddleOCR(
-            lang=OCR_LANG,
-            use_doc_orientation_classify=False,
-            use_doc_unwarping=False,
-            use_textline_orientation=False,
+
+def text_layer_usable(
+    text: str,
+    min_chars: int = PDF_TEXT_LAYER_MIN_CHARS,
+    min_quality: float = PDF_TEXT_LAYER_MIN_QUALITY,
+) -> bool:
+    """
+    判断单页文本层是否可以直接使用
+    
+    参数:
+        text: 页面文本层
+        min_chars: 最少有效字符数（扫描件往往只有页眉页码，或完全没有文本层）
+        min_quality: 有效字符占比下限（缺少编码映射的字体会提取出乱码）
+    返回:
+        是否可用
+    """
+    chars = "".join(text.split())
+    if not chars:
+        return False
+    good = len(TEXT_LAYER_GOOD_CHARS.findall(chars))
+    return good >= min_chars and good / len(chars) >= min_quality
+
+
+@traced("pdf.text_layer")
+def read_text_layer(pdf_bytes: bytes) -> Optional[List[Optional[List[str]]]]:
+    """
+    读取 PDF 每页的文本层（poppler pdftotext）
+    
+    参数:
+        pdf_bytes: PDF 文件字节
+    返回:
+        每页一个元素：文本层可用时为文本行列表，否则为 None（需要 OCR）；
+        无法读取文本层（未安装 pdftotext、加密文件等）时返回 None
+    """
+    tool = _poppler_tool("pdftotext")
+    if tool is None:
+        return None
+    try:
+        completed = subprocess.run(
+            [tool, "-enc", "UTF-8", "-", "-"],
+            input=pdf_bytes,
+            capture_output=True,
+            timeout=TEXT_LAYER_TIMEOUT,
         )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️ 读取 PDF 文本层失败: {e}")
+        return None
+    if completed.returncode != 0:
+        return None
+
+    # 每页以换页符结尾
+    page_texts = completed.stdout.decode("utf-8", errors="replace").split("\f")
+    if page_texts and not page_texts[-1].strip():
+        page_texts.pop()
+    return [
+        [line.strip() for line in text.splitlines() if line.strip()] if text_layer_usable(text) else None
+        for text in page_texts
+    ]
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 自适应分辨率
+# ============================================
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """布尔序列中连续 True 段的长度"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def analyze_page(image: Image.Image, dpi: int) -> dict:
+    """
+    预扫描单页：墨迹占比、有内容的区域、文字行高 -> OCR 分辨率
     
-    return _ocr_instance
+    参数:
+        image: 页面图片（任意分辨率，先缩到约 OCR_PREPASS_DPI 再分析）
+        dpi: image 的分辨率
+    返回:
+        {"dpi": 建议 OCR 分辨率（空白页为 None）, "ink": 墨迹占比,
+         "region": [x0, y0, x1, y1] 有内容区域（按页面归一化）, "text_height": 文字行高（磅）,
+         "skipped": "blank"（仅空白页）}
+    """
+    factor = max(1, round(dpi / OCR_PREPASS_DPI))
+    gray = image.convert("L")
+    if factor > 1:
+        gray = gray.reduce(factor)
+    pixels = np.asarray(gray)
+    analysis_dpi = dpi / factor
 
+    ink = pixels < min(INK_LEVEL, float(np.median(pixels)) - 40)
+    ink_ratio = float(ink.mean())
+    rows = ink.sum(axis=1)
+    cols = ink.sum(axis=0)
+    # 单个噪点不算内容
+    filled_rows = np.flatnonzero(rows >= 2)
+    filled_cols = np.flatnonzero(cols >= 2)
+    if ink_ratio < OCR_BLANK_INK_RATIO or not len(filled_rows) or not len(filled_cols):
+        return {"dpi": None, "ink": round(ink_ratio, 5), "skipped": "blank"}
 
-def ocr_image(image: Image.Image) -> List[dict]:
+    height, width = ink.shape
+    region = [
+        max(0.0, filled_cols[0] / width - REGION_MARGIN),
+        max(0.0, filled_rows[0] / height - REGION_MARGIN),
+        min(1.0, (filled_cols[-1] + 1) / width + REGION_MARGIN),
+        min(1.0, (filled_rows[-1] + 1) / height + REGION_MARGIN),
+    ]
+
+    # 文字行：行投影中连续有墨迹的行；取中位数行高换算成 OCR 分辨率
+    runs = _runs(rows >= max(2, width * 0.005))
+    runs = runs[runs >= 2]
+    text_height = None
+    target_dpi = OCR_DPI
+    if len(runs):
+        line_inches = float(np.median(runs)) / analysis_dpi
+        text_height = round(line_inches * 72, 1)
+        target_dpi = int(round(OCR_TARGET_TEXT_PX / line_inches / 25) * 25)
+        target_dpi = min(OCR_MAX_DPI, max(OCR_MIN_DPI, target_dpi))
+
+    return {
+        "dpi": target_dpi,
+        "ink": round(ink_ratio, 5),
+        "region": [round(float(v), 4) for v in region],
+        "text_height": text_height,
+    }
+
+
+def _crop(image: Image.Image, region: List[float]) -> Image.Image:
+    x0, y0, x1, y1 = region
+    return image.crop((
+        int(x0 * image.width),
+        int(y0 * image.height),
+        int(round(x1 * image.width)),
+        int(round(y1 * image.height)),
+    ))
+
+
+@traced("ocr.plan")
+def prepare_ocr_pages(
+    pdf_bytes: bytes,
+    pages: Optional[List[int]] = None,
+    images: Optional[List[Image.Image]] = None,
+    adaptive: bool = OCR_ADAPTIVE_DPI,
+) -> Tuple[Dict[int, Image.Image], Dict[int, dict]]:
     """
-    对单张图片进行 OCR 识别
+    准备需要 OCR 的页面图片
+    
+    adaptive 时先以 OCR_PREPASS_DPI 预扫描：空白页跳过，其余页按文字行高选择分辨率
+    重新渲染，并裁掉四周空白；已有整页图片（images）时不重新渲染，只跳过空白页和裁剪
+    
+    参数:
+        pdf_bytes: PDF 文件字节
+        pages: 需要 OCR 的页码（None 表示全部页面）
+        images: 已渲染的全部页面图片（OCR_DPI）
+        adaptive: 是否自适应
+    返回:
+        ({页码: 送入 OCR 的图片}, {页码: 渲染决策（见 analyze_page，另含 full_size 整页像素尺寸）})
+    """
+    if pages is not None and not pages:
+        return {}, {}
+
+    if images is not None:
+        rendered = {i: images[i - 1] for i in (pages or range(1, len(images) + 1))}
+        plans = {i: analyze_page(image, OCR_DPI) if adaptive else {"dpi": OCR_DPI} for i, image in rendered.items()}
+        for plan in plans.values():
+            if plan["dpi"]:
+                plan["dpi"] = OCR_DPI
+    elif not adaptive:
+        if pages is None:
+            rendered = dict(enumerate(pdf_bytes_to_images(pdf_bytes), 1))
+        else:
+            rendered = rasterize_pages(pdf_bytes, pages)
+        plans = {i: {"dpi": OCR_DPI} for i in rendered}
+    else:
+        if pages is None:
+            preview = dict(enumerate(pdf_bytes_to_images(pdf_bytes, dpi=OCR_PREPASS_DPI), 1))
+        else:
+            preview = rasterize_pages(pdf_bytes, pages, dpi=OCR_PREPASS_DPI)
+        plans = {i: analyze_page(image, OCR_PREPASS_DPI) for i, image in preview.items()}
+        by_dpi: Dict[int, List[int]] = {}
+        for i, plan in plans.items():
+            if plan["dpi"]:
+                by_dpi.setdefault(plan["dpi"], []).append(i)
+        rendered = {}
+        for dpi, numbers in by_dpi.items():
+            rendered.update(rasterize_pages(pdf_bytes, numbers, dpi=dpi))
+
+    inputs: Dict[int, Image.Image] = {}
+    for i in sorted(plans):
+        plan = plans[i]
+        if not plan["dpi"]:
+            continue
+        image = rendered[i]
+        plan["full_size"] = [image.width, image.height]
+        inputs[i] = _crop(image, plan["region"]) if "region" in plan else image
+
+    skipped = sum(1 for plan in plans.values() if not plan["dpi"])
+    if skipped:
+        OCR_SKIPPED_PAGES.inc(skipped)
+    if adaptive:
+        dpis = Counter(plan["dpi"] for plan in plans.values() if plan["dpi"])
+        summary = "，".join(f"{dpi} DPI × {count}" for dpi, count in sorted(dpis.items()))
+        print(f"🔎 OCR 预扫描: {len(plans)} 页，空白跳过 {skipped} 页" + (f"，{summary}" if summary else ""))
+    return inputs, plans
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region OCR 识别
+# ============================================
+
+def get_ocr_instance():
+    """获取 PaddleOCR 实例（由 ocr_engine 管理加载、预热和空闲卸载）"""
+    return ocr_engine.get()
+
+
+class PageLayout(NamedTuple):
+    """
+    单页文本行版面（与 content 按下标一一对应）
+
+    boxes: (N, 4) float32，外接矩形 x0, y0, x1, y1，按页面宽高归一化到 0~1
+    angles: (N,) float32，文本行倾斜角（度，逆时针为正，范围 -90~90）
+    """
+    boxes: np.ndarray
+    angles: np.ndarray
+    width: int
+    height: int
+
+    def take(self, keep: np.ndarray) -> "PageLayout":
+        """按布尔掩码或下标取子集"""
+        return PageLayout(self.boxes[keep], self.angles[keep], self.width, self.height)
+
+    def uncrop(self, region: Tuple[float, float, float, float], width: int, height: int) -> "PageLayout":
+        """裁剪图上的坐标换算回整页坐标（region 为裁剪区域，按整页归一化）"""
+        x0, y0, x1, y1 = region
+        scale = np.array([x1 - x0, y1 - y0, x1 - x0, y1 - y0], dtype=np.float32)
+        offset = np.array([x0, y0, x0, y0], dtype=np.float32)
+        return PageLayout(self.boxes * scale + offset, self.angles, width, height)
+
+
+def _layout_from_result(item: dict, count: int, width: int, height: int) -> Optional[PageLayout]:
+    """从 PaddleOCR 结果的 rec_polys（或 rec_boxes）构建版面数组，数量对不上时返回 None"""
+    polys = item.get("rec_polys")
+    if polys is not None and len(polys) == count:
+        polys = np.asarray(polys, dtype=np.float32).reshape(count, -1, 2)
+        boxes = np.concatenate([polys.min(axis=1), polys.max(axis=1)], axis=1)
+        # 上边（左上 -> 右上）的方向；图像 y 轴向下，取负得到逆时针为正
+        dx = polys[:, 1, 0] - polys[:, 0, 0]
+        dy = polys[:, 1, 1] - polys[:, 0, 1]
+        angles = (np.degrees(np.arctan2(-dy, dx)) + 90) % 180 - 90
+    else:
+        boxes = item.get("rec_boxes")
+        if boxes is None or len(boxes) != count:
+            return None
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(count, 4)
+        angles = np.zeros(count, dtype=np.float32)
+    boxes = boxes / np.array([width, height, width, height], dtype=np.float32)
+    return PageLayout(boxes.astype(np.float32), angles.astype(np.float32), width, height)
+
+
+def _merge_layouts(layouts: List[PageLayout], width: int, height: int) -> PageLayout:
+    if len(layouts) == 1:
+        return layouts[0]
+    return PageLayout(
+        np.concatenate([l.boxes for l in layouts]),
+        np.concatenate([l.angles for l in layouts]),
+        width,
+        height,
+    )
+
+
+def ocr_image_with_layout(image: Image.Image) -> Tuple[List[dict], Optional[PageLayout]]:
+    """
+    对单张图片进行 OCR 识别，同时保留文本行位置和倾斜角
     
     参数:
         image: PIL Image
     返回:
-        识别结果列表 [{"text": "...", "confidence": 0.9}, ...]
+        (识别结果列表 [{"text": "...", "confidence": 0.9}, ...], 版面数组；OCR 未返回位置时为 None)
     """
     import tempfile
     
-    ocr = get_ocr_instance()
-    
     # 保存为临时文件
     with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
         temp_path = f.name
         image.save(temp_path)
     
     try:
-        result = ocr.predict(temp_path)
+        with ocr_engine.use() as ocr:
+            result = ocr.predict(temp_path)
         
         texts = []
+        layouts = []
+        has_layout = True
         if result:
             for item in result:
                 if isinstance(item, dict):
@@ -139,30 +498,68 @@ def ocr_image(image: Image.Image) -> List[dict]:
                             "text": text,
                             "confidence": round(confidence, 3),
                         })
+
+                    layout = _layout_from_result(item, len(rec_texts), image.width, image.height)
+                    if layout is None:
+                        has_layout = False
+                    else:
+                        layouts.append(layout)
         
-        return texts
+        if not has_layout:
+            return texts, None
+        if not layouts:
+            layouts.append(PageLayout(
+                np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), image.width, image.height
+            ))
+        return texts, _merge_layouts(layouts, image.width, image.height)
     finally:
         # 清理临时文件
         Path(temp_path).unlink(missing_ok=True)
 
 
-def ocr_images(images: List[Image.Image]) -> List[dict]:
+def ocr_image(image: Image.Image) -> List[dict]:
+    """
+    对单张图片进行 OCR 识别
+    
+    参数:
+        image: PIL Image
+    返回:
+        识别结果列表 [{"text": "...", "confidence": 0.9}, ...]
+    """
+    return ocr_image_with_layout(image)[0]
+
+
+def ocr_images(images: List[Image.Image], page_numbers: Optional[List[int]] = None) -> List[dict]:
     """
     对多张图片进行 OCR 识别
     
     参数:
         images: PIL Image 列表
+        page_numbers: 每张图片对应的页码（默认从 1 顺序编号）
     返回:
-        按页组织的结果 [{"page": 1, "content": [...]}, ...]
+        按页组织的结果 [{"page": 1, "content": [...], "layout": PageLayout | None}, ...]
     """
     results = []
     
-    for i, image in enumerate(images, 1):
-        page_texts = ocr_image(image)
-        results.append({
-            "page": i,
-            "content": page_texts,
-        })
+    start = time.perf_counter()
+    with tracer.span("ocr.document", pages=len(images)):
+        for i, image in zip(page_numbers or range(1, len(images) + 1), images):
+            with tracer.span("ocr.page", page=i, width=image.width, height=image.height) as span, \
+                    OCR_PAGE_LATENCY.time():
+                page_texts, layout = ocr_image_with_layout(image)
+                if span:
+                    span.set(lines=len(page_texts))
+            OCR_PAGES.inc()
+            results.append({
+                "page": i,
+                "content": page_texts,
+                "layout": layout,
+                "source": "ocr",
+            })
+    
+    elapsed = time.perf_counter() - start
+    if images and elapsed > 0:
+        OCR_THROUGHPUT.set(len(images) / elapsed)
     
     return results
 
@@ -174,12 +571,262 @@ def ocr_images(images: List[Image.Image]) -> List[dict]:
 # region 水印过滤
 # ============================================
 
+def _drop_lines(page: dict, watermark: np.ndarray) -> dict:
+    """去掉标记为水印的行，版面数组同步取子集"""
+    filtered_content = [
+        {
+            "text": item.get("text", "").strip().replace("|", "｜"),
+            "confidence": item.get("confidence", 0),
+        }
+        for item, flagged in zip(page.get("content", []), watermark)
+        if not flagged
+    ]
+    filtered = {
+        "page": page["page"],
+        "content": filtered_content,
+    }
+    layout = page.get("layout")
+    if layout is not None:
+        filtered["layout"] = layout.take(~watermark)
+    for key in ("source", "render"):
+        if key in page:
+            filtered[key] = page[key]
+    return filtered
+
+
+def _pack_keys(keys: np.ndarray) -> np.ndarray:
+    """多列整数键压成一列 int64（一维 unique 比按行 unique 快得多）"""
+    keys = keys - keys.min(axis=0)
+    return np.ravel_multi_index(keys.T, tuple(keys.max(axis=0) + 1))
+
+
+def _page_support(keys: np.ndarray, page_ids: np.ndarray) -> np.ndarray:
+    """每行所在分组（keys 相同的行）出现在多少个不同页面上"""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, groups = np.unique(_pack_keys(keys), return_inverse=True)
+    pairs = np.unique(groups * (page_ids.max() + 1) + page_ids)
+    return np.bincount(pairs // (page_ids.max() + 1), minlength=groups.max() + 1)[groups]
+
+
+def detect_spatial_watermarks(
+    ocr_results: List[dict],
+    freq_threshold_ratio: float = 0.5,
+    min_threshold: int = 3,
+    similarity_threshold: float = 70.0,
+    max_watermark_len: int = 30,
+    position_tolerance: float = WATERMARK_POSITION_TOLERANCE,
+    angle_tolerance: float = WATERMARK_ANGLE_TOLERANCE,
+    min_angle: float = WATERMARK_MIN_ANGLE,
+    margin: float = WATERMARK_MARGIN,
+) -> List[np.ndarray]:
+    """
+    按版面检测水印（需要 ocr_images 返回的 layout）
+
+    两类重复视为水印，页数达到 max(总页数 × freq_threshold_ratio, min_threshold)：
+        - 倾斜文本：相同文字、相近倾斜角（平铺水印位置不固定，不看位置）
+        - 正文区域固定位置的水平文本：相同文字、相近中心点和角度
+    页眉页脚区域（上下 margin 内）固定位置的重复文本是正常页眉，保留
+
+    确定水印簇后，同一位置/角度上文字相近（fuzz.ratio）的识别噪声变体一并标记；
+    分组全部用 numpy 排序完成，模糊匹配只在水印簇所在位置的少量行上进行
+
+    参数:
+        ocr_results: OCR 结果（每页含 layout）
+        freq_threshold_ratio: 频率阈值比例
+        min_threshold: 最小频率阈值
+        similarity_threshold: 噪声变体的相似度阈值
+        max_watermark_len: 水印最大长度
+        position_tolerance: 位置容差（占页面宽高比例）
+        angle_tolerance: 角度容差（度）
+        min_angle: 视为倾斜文本的最小角度（度）
+        margin: 页眉页脚区域高度（占页高比例）
+    返回:
+        每页一个布尔数组，True 表示该行是水印
+    """
+    counts = [len(page.get("content", [])) for page in ocr_results]
+    total = sum(counts)
+    if not total:
+        return [np.zeros(n, dtype=bool) for n in counts]
+
+    texts = [item.get("text", "").strip() for page in ocr_results for item in page.get("content", [])]
+    text_index: Dict[str, int] = {}
+    text_ids = np.array([text_index.setdefault(t, len(text_index)) for t in texts], dtype=np.int64)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=total)
+    page_ids = np.repeat(np.arange(len(ocr_results)), counts)
+    layouts = [page["layout"] for page in ocr_results if page.get("content")]
+    boxes = np.concatenate([layout.boxes for layout in layouts])
+    angles = np.concatenate([layout.angles for layout in layouts])
+
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    angle_bins = np.round(angles / angle_tolerance).astype(np.int64)
+    candidate = (lengths > 0) & (lengths <= max_watermark_len)
+    rotated = candidate & (np.abs(angles) >= min_angle)
+    body = candidate & ~rotated & (centers[:, 1] > margin) & (centers[:, 1] < 1 - margin)
+    threshold = max(len(ocr_results) * freq_threshold_ratio, min_threshold)
+
+    watermark = np.zeros(total, dtype=bool)
+    # (掩码, 空间键) 列表：空间键相同的行位于同一位置/角度
+    spatial_rules = [(rotated, angle_bins[:, None])]
+    for offset in (0.0, 0.5):
+        # 两套错开半格的网格，避免相近位置恰好落在格子边界两侧
+        cells = np.floor(centers / position_tolerance + offset).astype(np.int64)
+        spatial_rules.append((body, np.column_stack([cells, angle_bins])))
+
+    for mask, spatial_keys in spatial_rules:
+        idx = np.flatnonzero(mask)
+        if not len(idx):
+            continue
+        keys = np.column_stack([text_ids[idx], spatial_keys[idx]])
+        hit = _page_support(keys, page_ids[idx]) >= threshold
+        watermark[idx[hit]] = True
+        if not hit.any():
+            continue
+
+        # 同一位置上的识别噪声变体
+        _, spatial_groups = np.unique(_pack_keys(spatial_keys[idx]), return_inverse=True)
+        references: Dict[int, Set[str]] = {}
+        for group, i in zip(spatial_groups[hit], idx[hit]):
+            references.setdefault(int(group), set()).add(texts[i])
+        pending = ~hit
+        for group, refs in references.items():
+            lines = idx[pending & (spatial_groups == group)]
+            if not len(lines):
+                continue
+            scores = process.cdist(
+                [texts[i] for i in lines],
+                list(refs),
+                scorer=fuzz.ratio,
+                score_cutoff=similarity_threshold,
+                workers=-1,
+            )
+            watermark[lines[scores.any(axis=1)]] = True
+
+    return np.split(watermark, np.cumsum(counts)[:-1])
+
+
+class WatermarkFilter:
+    """
+    增量水印过滤器
+
+    按页喂入 OCR 结果（add_page），随时可以用当前统计过滤某一页（filter_page），
+    全部喂完后 result() 得到与 filter_watermarks 相同的结果
+
+    相似度计算只对"新出现的短行 × 已有候选"和"全部短行 × 新候选"做一次
+    rapidfuzz.process.cdist，结果按字符串记住，之后的判断都是字典查询；
+    候选集随页数增加可能变化，所以记录的是"与哪些候选相似"而不是最终结论
+    """
+
+    def __init__(
+        self,
+        freq_threshold_ratio: float = 0.5,
+        min_threshold: int = 3,
+        similarity_threshold: float = 70.0,
+        max_watermark_len: int = 12,
+    ):
+        self.freq_threshold_ratio = freq_threshold_ratio
+        self.min_threshold = min_threshold
+        self.similarity_threshold = similarity_threshold
+        self.max_watermark_len = max_watermark_len
+        self.pages: List[dict] = []
+        self._counter: Counter = Counter()
+        self._lines: List[str] = []                  # 出现过的短行（去重，按出现顺序）
+        self._compared = 0                           # _lines 中已与 _scored 比较过的数量
+        self._scored: Set[str] = set()               # 已与全部短行比较过的候选
+        self._matches: Dict[str, Set[str]] = {}      # 短行 -> 相似的候选
+        self._candidates: Optional[Set[str]] = None  # 当前候选（页数变化后重新计算）
+
+    def _short(self, text: str) -> bool:
+        return bool(text) and len(text) <= self.max_watermark_len
+
+    def add_page(self, page: dict) -> None:
+        """喂入一页 OCR 结果 {"page": n, "content": [...]}"""
+        self.pages.append(page)
+        for item in page.get("content", []):
+            text = item.get("text", "").strip()
+            if self._short(text):
+                if text not in self._counter:
+                    self._lines.append(text)
+                self._counter[text] += 1
+        self._candidates = None
+
+    @property
+    def freq_threshold(self) -> float:
+        return max(len(self.pages) * self.freq_threshold_ratio, self.min_threshold)
+
+    def candidates(self) -> Set[str]:
+        """当前的候选水印（出现次数达到频率阈值的短行）"""
+        if self._candidates is None:
+            threshold = self.freq_threshold
+            self._candidates = {text for text, count in self._counter.items() if count >= threshold}
+            self._refresh(self._candidates)
+        return self._candidates
+
+    def _match(self, lines: List[str], candidates: List[str]) -> None:
+        """一次性计算 lines × candidates 的相似度，记录超过阈值的组合"""
+        scores = process.cdist(
+            lines,
+            candidates,
+            scorer=fuzz.ratio,
+            score_cutoff=self.similarity_threshold,
+            workers=-1,
+        )
+        for row, col in zip(*np.nonzero(scores)):
+            self._matches.setdefault(lines[row], set()).add(candidates[col])
+
+    def _refresh(self, candidates: Set[str]) -> None:
+        """补算相似度：新短行 × 已有候选，全部短行 × 新候选"""
+        new_lines = self._lines[self._compared:]
+        if new_lines and self._scored:
+            self._match(new_lines, list(self._scored))
+        self._compared = len(self._lines)
+
+        new_candidates = list(candidates - self._scored)
+        if new_candidates:
+            self._match(self._lines, new_candidates)
+            self._scored.update(new_candidates)
+
+    def is_watermark(self, text: str) -> bool:
+        """按当前候选判断是否为水印"""
+        if not self._short(text):
+            return False
+        candidates = self.candidates()
+        return text in candidates or not candidates.isdisjoint(self._matches.get(text, ()))
+
+    def filter_page(self, page: dict, memo: Optional[Dict[str, bool]] = None) -> dict:
+        """
+        用当前统计过滤一页
+
+        参数:
+            page: OCR 页结果
+            memo: 判断结果缓存（同一批候选下可复用）
+        返回:
+            过滤后的页 {"page": n, "content": [...]}
+        """
+        memo = {} if memo is None else memo
+        flags = []
+        for item in page.get("content", []):
+            text = item.get("text", "").strip()
+            watermark = memo.get(text)
+            if watermark is None:
+                watermark = memo[text] = self.is_watermark(text)
+            flags.append(watermark)
+        return _drop_lines(page, np.array(flags, dtype=bool))
+
+    def result(self) -> List[dict]:
+        """按全部已喂入页面的统计过滤所有页"""
+        memo: Dict[str, bool] = {}
+        return [self.filter_page(page, memo) for page in self.pages]
+
+
+@traced("ocr.watermark_filter")
 def filter_watermarks(
     ocr_results: List[dict],
     freq_threshold_ratio: float = 0.5,
     min_threshold: int = 3,
     similarity_threshold: float = 70.0,
     max_watermark_len: int = 12,
+    method: str = "auto",
 ) -> List[dict]:
     """
     过滤 OCR 结果中的水印文本
@@ -189,63 +836,37 @@ def filter_watermarks(
         freq_threshold_ratio: 频率阈值比例
         min_threshold: 最小频率阈值
         similarity_threshold: 模糊匹配相似度阈值
-        max_watermark_len: 水印最大长度
+        max_watermark_len: 水印最大长度（按文本频率判断时）
+        method: spatial（按版面，见 detect_spatial_watermarks）/ text（按文本频率）/
+                auto（有内容的页都有 layout 时用 spatial，否则 text）
     返回:
-        过滤后的结果
+        过滤后的结果（有 layout 的页同步过滤 layout）
     """
-    from collections import Counter
-    from rapidfuzz import fuzz
-    
-    # 统计文本频率
-    text_counter = Counter()
-    total_pages = len(ocr_results)
-    
-    for page in ocr_results:
-        for item in page.get("content", []):
-            text = item.get("text", "").strip()
-            if text and len(text) <= max_watermark_len:
-                text_counter[text] += 1
-    
-    # 计算频率阈值
-    freq_threshold = max(total_pages * freq_threshold_ratio, min_threshold)
-    
-    # 筛选候选水印
-    candidate_watermarks = {
-        text for text, count in text_counter.items()
-        if count >= freq_threshold
-    }
-    
-    # 水印判断函数
-    def is_watermark(text: str) -> bool:
-        if not text or len(text) > max_watermark_len:
-            return False
-        if text in candidate_watermarks:
-            return True
-        for wm in candidate_watermarks:
-            if fuzz.ratio(text, wm) >= similarity_threshold:
-                return True
-        return False
-    
-    # 过滤水印
-    filtered_results = []
-    
+    if method not in WATERMARK_METHODS:
+        raise ValueError(f"不支持的水印检测方式: {method}")
+    if method == "auto":
+        pages = [page for page in ocr_results if page.get("content")]
+        spatial = bool(pages) and all(page.get("layout") is not None for page in pages)
+        method = "spatial" if spatial else "text"
+
+    if method == "spatial":
+        masks = detect_spatial_watermarks(
+            ocr_results,
+            freq_threshold_ratio=freq_threshold_ratio,
+            min_threshold=min_threshold,
+            similarity_threshold=similarity_threshold,
+        )
+        return [_drop_lines(page, mask) for page, mask in zip(ocr_results, masks)]
+
+    watermark_filter = WatermarkFilter(
+        freq_threshold_ratio=freq_threshold_ratio,
+        min_threshold=min_threshold,
+        similarity_threshold=similarity_threshold,
+        max_watermark_len=max_watermark_len,
+    )
     for page in ocr_results:
-        filtered_content = []
-        
-        for item in page.get("content", []):
-            text = item.get("text", "").strip()
-            if not is_watermark(text):
-                filtered_content.append({
-                    "text": text.replace("|", "｜"),
-                    "confidence": item.get("confidence", 0),
-                })
-        
-        filtered_results.append({
-            "page": page["page"],
-            "content": filtered_content,
-        })
-    
-    return filtered_results
+        watermark_filter.add_page(page)
+    return watermark_filter.result()
 
 # endregion
 # ============================================
@@ -255,52 +876,167 @@ def filter_watermarks(
 # region 主函数
 # ============================================
 
+def text_layer_page(page: int, lines: List[str]) -> dict:
+    """文本层页面转为与 OCR 结果相同的结构"""
+    return {
+        "page": page,
+        "content": [{"text": line, "confidence": 1.0} for line in lines],
+        "layout": None,
+        "source": "text",
+    }
+
+
+def build_full_text(pages: List[dict]) -> str:
+    """按页合并全文（带 "--- 第N页 ---" 分页标记）"""
+    full_text = ""
+    for page in pages:
+        full_text += f"\n--- 第{page['page']}页 ---\n"
+        for item in page["content"]:
+            full_text += item["text"] + "\n"
+    return full_text.strip()
+
+
+def recognize_pages(ocr_inputs: Dict[int, Image.Image], renders: Dict[int, dict]) -> Dict[int, dict]:
+    """
+    识别 prepare_ocr_pages 准备好的页面（裁剪过的页面把版面还原到整页坐标）
+    
+    参数:
+        ocr_inputs: {页码: 送入 OCR 的图片}
+        renders: {页码: 渲染决策}
+    返回:
+        {页码: 页面结果}，空白页 source 为 "blank"，OCR 页带 render
+    """
+    recognized = {
+        page["page"]: page
+        for page in ocr_images(list(ocr_inputs.values()), page_numbers=list(ocr_inputs))
+    }
+    
+    results = {}
+    for i, render in renders.items():
+        page = recognized.get(i) or {"page": i, "content": [], "layout": None, "source": "blank"}
+        if page.get("layout") is not None and "region" in render:
+            page["layout"] = page["layout"].uncrop(render["region"], *render["full_size"])
+        page["render"] = render
+        results[i] = page
+    return results
+
+
+def ocr_pages(
+    pdf_bytes: bytes,
+    pages: Optional[List[int]] = None,
+    images: Optional[List[Image.Image]] = None,
+    adaptive: bool = OCR_ADAPTIVE_DPI,
+) -> Dict[int, dict]:
+    """
+    对指定页做 OCR（预扫描、空白页跳过、裁剪 + 识别）
+    
+    参数:
+        pdf_bytes: PDF 文件字节
+        pages: 需要 OCR 的页码（None 表示全部页面）
+        images: 已渲染的页面图片（OCR_DPI，从第 1 页起连续，覆盖 pages 即可）
+        adaptive: 是否自适应分辨率
+    返回:
+        {页码: 页面结果}（见 recognize_pages）
+    """
+    return recognize_pages(*prepare_ocr_pages(pdf_bytes, pages, images, adaptive=adaptive))
+
+
+def assemble_pages(
+    text_pages: List[Optional[List[str]]],
+    ocr_by_page: Dict[int, dict],
+    first_page: int = 1,
+) -> List[dict]:
+    """
+    按页序合并文本层页面和 OCR 页面
+    
+    参数:
+        text_pages: 从 first_page 起每页的文本层（None 表示该页走 OCR）
+        ocr_by_page: ocr_pages 的结果
+        first_page: text_pages 第一个元素对应的页码
+    返回:
+        页面结果列表
+    """
+    return [
+        text_layer_page(i, lines) if lines is not None
+        else ocr_by_page.get(i) or {"page": i, "content": [], "layout": None, "source": "blank"}
+        for i, lines in enumerate(text_pages, first_page)
+    ]
+
+
+def log_text_layer_usage(text_pages: List[Optional[List[str]]]) -> None:
+    """记录直接使用文本层的页数"""
+    page_count = len(text_pages)
+    scanned = sum(1 for lines in text_pages if lines is None)
+    if page_count > scanned:
+        PDF_TEXT_LAYER_PAGES.inc(page_count - scanned)
+        print(f"📄 文本层直接提取 {page_count - scanned}/{page_count} 页，OCR {scanned} 页")
+
+
+@traced("pdf.extract_text")
 def extract_text_from_pdf(
     pdf_path: Optional[str] = None,
     pdf_bytes: Optional[bytes] = None,
     filter_watermark: bool = True,
+    use_text_layer: bool = PDF_TEXT_LAYER_ENABLED,
+    keep_images: bool = False,
+    adaptive_dpi: bool = OCR_ADAPTIVE_DPI,
 ) -> dict:
     """
     从 PDF 提取文本
     
+    有可用文本层的页面（电子版合同）直接使用文本层，只有扫描页转图片做 OCR
+    
     参数:
         pdf_path: PDF 文件路径（二选一）
         pdf_bytes: PDF 字节流（二选一）
         filter_watermark: 是否过滤水印
+        use_text_layer: 是否优先使用 PDF 文本层
+        keep_images: 是否返回全部页面图片（视觉模型提取、图片存档需要）
+        adaptive_dpi: 是否自适应分辨率（跳过空白页、裁剪空白边、按文字大小选分辨率）
     返回:
         {
-            "pages": [...],
+            "pages": [...],          # 每页含 content、layout（PageLayout，行位置和倾斜角）、
+                                     # source（text/ocr/blank）、render（OCR 页的分辨率和裁剪决策）
             "full_text": "...",
             "page_count": 10,
+            "text_layer_pages": 8,   # 直接使用文本层的页数
+            "skipped_pages": 1,      # 预扫描判定为空白、跳过 OCR 的页数
+            "images": [...],         # keep_images=True 时
         }
     """
-    # 转换为图片
     if pdf_path:
-        images = pdf_to_images(pdf_path)
-    elif pdf_bytes:
-        images = pdf_bytes_to_images(pdf_bytes)
-    else:
+        pdf_bytes = Path(pdf_path).read_bytes()
+    elif not pdf_bytes:
         raise ValueError("必须提供 pdf_path 或 pdf_bytes")
     
-    # OCR 识别
-    ocr_results = ocr_images(images)
+    text_pages = read_text_layer(pdf_bytes) if use_text_layer else None
+    images = pdf_bytes_to_images(pdf_bytes) if keep_images else None
+    
+    # 需要 OCR 的页：读不到文本层时为全部页面
+    scanned = None if text_pages is None else [i for i, lines in enumerate(text_pages, 1) if lines is None]
+    ocr_by_page = ocr_pages(pdf_bytes, scanned, images, adaptive=adaptive_dpi)
+    
+    if text_pages is None:
+        text_pages = [None] * (len(images) if images is not None else len(ocr_by_page))
+    else:
+        log_text_layer_usage(text_pages)
+    page_count = len(text_pages)
+    ocr_results = assemble_pages(text_pages, ocr_by_page)
     
     # 过滤水印
     if filter_watermark:
         ocr_results = filter_watermarks(ocr_results)
     
-    # 合并全文
-    full_text = ""
-    for page in ocr_results:
-        full_text += f"\n--- 第{page['page']}页 ---\n"
-        for item in page["content"]:
-            full_text += item["text"] + "\n"
-    
-    return {
+    result = {
         "pages": ocr_results,
-        "full_text": full_text.strip(),
-        "page_count": len(images),
+        "full_text": build_full_text(ocr_results),
+        "page_count": page_count,
+        "text_layer_pages": sum(1 for page in ocr_results if page.get("source") == "text"),
+        "skipped_pages": sum(1 for page in ocr_results if page.get("source") == "blank"),
     }
+    if keep_images:
+        result["images"] = images
+    return result
 
 # endregion
 # ============================================
\ No newline at end of file
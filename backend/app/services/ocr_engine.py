@@ -0,0 +1,262 @@
+"""
+OCR 引擎管理
+统一管理 PaddleOCR 模型的加载、预热、常驻和空闲卸载
+
+- 启动时按 WORKER_ROLE 决定是否预加载（OCR_PRELOAD_ROLES），在后台线程加载，
+  加载 + 预热完成前 /health/ready 返回 503，负载均衡不会把流量转过来
+- 预热：加载后用一张合成图片跑一次识别，首个真实请求不再承担算子初始化
+- 空闲卸载：OCR_IDLE_UNLOAD 秒内没有识别请求就释放模型，下次使用时重新加载；
+  正在识别中的模型不会被卸载
+- 串行推理：Paddle 推理实例不是线程安全的，多个线程（上传流水线的各阶段、
+  并发的上传请求）同时识别时按顺序使用同一个实例
+
+类比：餐厅开门前预热烤箱
+开门前就把烤箱烧热（预加载 + 预热），第一位客人不用干等；
+打烊后长时间没单就关火省电（空闲卸载），来单了再点火
+"""
+
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.config import (
+    OCR_LANG,
+    WORKER_ROLE,
+    OCR_PRELOAD_ROLES,
+    OCR_WARMUP,
+    OCR_IDLE_UNLOAD,
+)
+from app.telemetry.metrics import OCR_MODEL_RESIDENT, OCR_MODEL_LOAD_SECONDS
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 状态
+STATE_UNLOADED = "unloaded"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+# 预热图片上的文字
+WARMUP_TEXT = "OCR WARMUP 2024-01-01"
+
+# 预加载失败（如模型下载临时出错）后的重试间隔：从 PRELOAD_RETRY_BASE 秒开始翻倍，最长 PRELOAD_RETRY_MAX 秒
+PRELOAD_RETRY_BASE = 5.0
+PRELOAD_RETRY_MAX = 300.0
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 引擎管理
+# ============================================
+
+def _warmup_image():
+    """合成预热图片：白底黑字（放大以便检测模型能检出文字）"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (200, 40), "white")
+    ImageDraw.Draw(image).text((10, 14), WARMUP_TEXT, fill="black")
+    return image.resize((800, 160))
+
+
+class OcrEngineManager:
+    """
+    PaddleOCR 模型管理（进程级单例）
+
+    用法:
+        with ocr_engine.use() as ocr:
+            result = ocr.predict(path)
+    """
+
+    def __init__(
+        self,
+        role: str = WORKER_ROLE,
+        preload_roles=tuple(OCR_PRELOAD_ROLES),
+        warmup: bool = OCR_WARMUP,
+        idle_unload: int = OCR_IDLE_UNLOAD,
+    ):
+        self.role = role
+        self.preload = role in preload_roles
+        self.warmup_enabled = warmup
+        self.idle_unload = idle_unload
+        self.state = STATE_UNLOADED
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.loads = 0
+        self.unloads = 0
+        self.preload_attempts = 0
+        self.last_used = 0.0
+        self._instance = None
+        self._active = 0
+        self._preloaded = threading.Event()
+        self._lock = threading.RLock()
+        self._infer_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- 加载 / 卸载 ---
+
+    def _create(self):
+        from paddleocr import PaddleOCR
+
+        return PaddleOCR(
+            lang=OCR_LANG,
+            use_doc_orientation_classify=False,
+            use_doc_unwarping=False,
+            use_textline_orientation=False,
+        )
+
+    def _run_warmup(self, instance) -> None:
+        import numpy as np
+
+        start = time.perf_counter()
+        try:
+            instance.predict(np.asarray(_warmup_image()))
+            self.warmup_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"⚠️ OCR 预热失败（不影响使用）: {e}")
+
+    def load(self, warmup: Optional[bool] = None):
+        """加载模型（已加载时直接返回），warmup 为 None 时按配置决定是否预热"""
+        with self._lock:
+            if self._instance is not None:
+                return self._instance
+            self.state = STATE_LOADING
+            start = time.perf_counter()
+            try:
+                instance = self._create()
+                if self.warmup_enabled if warmup is None else warmup:
+                    self._run_warmup(instance)
+            except Exception as e:
+                self.state = STATE_FAILED
+                self.error = str(e)
+                raise
+            self._instance = instance
+            self.load_seconds = time.perf_counter() - start
+            self.last_used = time.time()
+            self.loads += 1
+            self.state = STATE_READY
+            self.error = None
+            OCR_MODEL_RESIDENT.set(1)
+            OCR_MODEL_LOAD_SECONDS.set(self.load_seconds)
+            print(f"🔤 OCR 模型已加载（{self.load_seconds:.1f}s，第 {self.loads} 次）")
+            return instance
+
+    def unload(self) -> bool:
+        """卸载模型释放内存（正在识别时不卸载），返回是否卸载"""
+        with self._lock:
+            if self._instance is None or self._active:
+                return False
+            self._instance = None
+            self.unloads += 1
+            self.state = STATE_UNLOADED
+            OCR_MODEL_RESIDENT.set(0)
+        gc.collect()
+        print("🔤 OCR 模型空闲，已卸载")
+        return True
+
+    def get(self):
+        """获取模型实例（未加载时同步加载）"""
+        instance = self.load()
+        self.last_used = time.time()
+        return instance
+
+    @contextmanager
+    def use(self) -> Iterator:
+        """识别期间持有模型（防止被空闲卸载），同一时刻只有一个线程在识别"""
+        with self._lock:
+            instance = self.load()
+            self._active += 1
+        try:
+            with self._infer_lock:
+                yield instance
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.last_used = time.time()
+
+    # --- 后台任务 ---
+
+    def _preload(self) -> None:
+        """预加载，失败后按指数退避重试，直到成功（或期间按需加载成功）、服务停止"""
+        delay = PRELOAD_RETRY_BASE
+        while not self._stop.is_set():
+            self.preload_attempts += 1
+            try:
+                self.load()
+                return
+            except Exception as e:
+                print(f"❌ OCR 模型预加载失败（第 {self.preload_attempts} 次），{delay:.0f}s 后重试: {e}")
+            finally:
+                self._preloaded.set()
+            if self._stop.wait(delay) or self.loads > 0:
+                return
+            delay = min(PRELOAD_RETRY_MAX, delay * 2)
+
+    def _reap_loop(self) -> None:
+        interval = max(1.0, min(60.0, self.idle_unload / 4))
+        while not self._stop.wait(interval):
+            if self._instance is not None and not self._active \
+                    and time.time() - self.last_used > self.idle_unload:
+                self.unload()
+
+    def start(self) -> None:
+        """启动：按角色在后台预加载，按配置启动空闲卸载"""
+        self._stop.clear()
+        if self.preload:
+            threading.Thread(target=self._preload, daemon=True, name="ocr-preload").start()
+        else:
+            self._preloaded.set()
+        if self.idle_unload > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._reap_loop, daemon=True, name="ocr-reaper")
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # --- 状态 ---
+
+    @property
+    def ready(self) -> bool:
+        """
+        是否可以接收流量：需要预加载的角色在模型首次加载（含预热）成功前为 False，
+        预加载失败时后台会重试；之后即使因空闲被卸载也视为就绪（下次使用时重新加载）
+        """
+        if not self.preload:
+            return True
+        return self._preloaded.is_set() and self.loads > 0
+
+    def describe(self) -> dict:
+        return {
+            "role": self.role,
+            "preload": self.preload,
+            "ready": self.ready,
+            "state": self.state,
+            "resident": self._instance is not None,
+            "active": self._active,
+            "loads": self.loads,
+            "preload_attempts": self.preload_attempts,
+            "unloads": self.unloads,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 2) if self.warmup_seconds is not None else None,
+            "idle_seconds": round(time.time() - self.last_used, 1) if self.last_used else None,
+            "idle_unload": self.idle_unload,
+            "error": self.error,
+        }
+
+
+# 全局 OCR 引擎
+ocr_engine = OcrEngineManager()
+
+# endregion
+# ============================================
@@ -0,0 +1,363 @@
+"""
+搜索结果缓存
+语义搜索结果按 (规范化查询, 模式, top_k, 其他参数, 相关表版本) 缓存；
+业绩/律师表每次写入（包括后台生成向量）都会让对应的表版本号递增，
+版本号是缓存键的一部分，所以写入后旧结果自然失效，不需要逐条删除
+
+缓存键同时作为 ETag：前端带 If-None-Match 再次请求时，
+只要表版本没变就直接返回 304，连缓存都不用查
+
+表版本号存在数据库（search_cache_versions），所有 worker 进程和单独部署的
+向量维护进程共享：任一进程写入后，其他进程最迟 SEARCH_CACHE_VERSION_REFRESH 秒后看到新版本
+
+缓存结果的后端:
+    - memory：进程内 LRU（默认）
+    - sqlite：SQLite 文件，同一台机器上的多个 worker 进程共享
+
+类比：图书馆的"本周新书"告示
+告示上写着版本号，书架一有变动就换一张新告示；
+读者看到告示没换，就知道上次抄下来的书单还能用
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import (
+    SEARCH_CACHE_BACKEND,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_SQLITE_PATH,
+    SEARCH_CACHE_VERSION_REFRESH,
+)
+from app.db.database import engine
+from app.db.models import Performance, PerformanceChunk, Lawyer, SearchCacheVersion
+from app.telemetry.metrics import record_cache
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 模型 -> 表版本名（写入钩子使用）
+VERSIONED_MODELS = {
+    Performance: "performances",
+    PerformanceChunk: "performances",
+    Lawyer: "lawyers",
+}
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 表版本
+# ============================================
+
+class SharedTableVersions:
+    """
+    数据库中的表版本号（多进程共享）
+
+    读取结果在进程内缓存 refresh 秒，避免每次搜索都查一次库；
+    本进程的写入递增后立即重新读取
+    """
+
+    def __init__(self, refresh: float = SEARCH_CACHE_VERSION_REFRESH):
+        self.refresh = refresh
+        self._versions: Dict[str, int] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload(self) -> None:
+        with engine.connect() as conn:
+            rows = conn.execute(select(SearchCacheVersion.name, SearchCacheVersion.version)).all()
+        self._versions = {name: version for name, version in rows}
+        self._fetched_at = time.monotonic()
+
+    def versions(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        if time.monotonic() - self._fetched_at >= self.refresh:
+            with self._lock:
+                if time.monotonic() - self._fetched_at >= self.refresh:
+                    try:
+                        self._reload()
+                    except Exception as e:
+                        # 读不到时沿用上次的版本号（TTL 兜底），稍后再试
+                        self._fetched_at = time.monotonic()
+                        print(f"⚠️ 搜索缓存版本读取失败: {e}")
+        return tuple(self._versions.get(t, 0) for t in tables)
+
+    def bump(self, *tables: str) -> None:
+        stmt = pg_insert(SearchCacheVersion).values([{"name": t, "version": 1} for t in sorted(set(tables))])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SearchCacheVersion.name],
+            set_={"version": SearchCacheVersion.version + 1},
+        )
+        with engine.begin() as conn:
+            conn.execute(stmt)
+        self._fetched_at = 0.0
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 缓存后端
+# ============================================
+
+class MemorySearchCache:
+    """进程内 LRU"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, payload = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key: str, payload: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteSearchCache:
+    """SQLite 文件（WAL 模式，同一台机器上的多进程共享缓存）"""
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str = SEARCH_CACHE_SQLITE_PATH,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        ttl: float = SEARCH_CACHE_TTL,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_used_at ON entries (used_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[dict]:
+        conn = self._conn()
+        row = conn.execute("SELECT payload, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.ttl:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE entries SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, payload: dict) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, payload, stored_at, used_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(payload, ensure_ascii=False), now, now),
+        )
+        # 超出上限时淘汰最久未使用的
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM entries ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM entries")
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 缓存入口
+# ============================================
+
+def normalize_query(query: str) -> str:
+    """规范化查询文本：全角转半角、去首尾空白、合并空白、英文小写"""
+    return " ".join(unicodedata.normalize("NFKC", query).split()).lower()
+
+
+class SearchCache:
+    """
+    搜索结果缓存（进程级单例）
+
+    用法:
+        key = search_cache.make_key("performances", {"query": q, "mode": "hybrid", "top_k": 10}, ["performances"])
+        payload = search_cache.get(key)
+    """
+
+    def __init__(self, backend_name: str = SEARCH_CACHE_BACKEND):
+        self.enabled = backend_name != "off"
+        self.table_versions = SharedTableVersions()
+        self._backend = None
+        self._backend_name = backend_name
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    if self._backend_name == "sqlite":
+                        self._backend = SQLiteSearchCache()
+                    else:
+                        self._backend = MemorySearchCache()
+        return self._backend
+
+    def make_key(self, kind: str, params: dict, tables: Iterable[str]) -> str:
+        """
+        生成缓存键（包含相关表的当前版本号）
+
+        参数:
+            kind: 搜索类型
+            params: 请求参数（query 会被规范化）
+            tables: 结果依赖的表版本名
+        返回:
+            sha256 十六进制
+        """
+        params = dict(params)
+        if "query" in params:
+            params["query"] = normalize_query(params["query"])
+        tables = sorted(tables)
+        raw = json.dumps(
+            {"kind": kind, "params": params, "versions": dict(zip(tables, self.table_versions.versions(tables)))},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        try:
+            payload = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️ 搜索缓存读取失败: {e}")
+            payload = None
+        record_cache("search", hit=payload is not None)
+        return payload
+
+    def put(self, key: str, payload: dict) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.backend.put(key, payload)
+        except Exception as e:
+            print(f"⚠️ 搜索缓存写入失败: {e}")
+
+    def bump(self, *tables: str) -> None:
+        """表有写入：版本号递增（所有进程中相关的缓存结果随之失效）"""
+        if not self.enabled or not tables:
+            return
+        try:
+            self.table_versions.bump(*tables)
+        except Exception as e:
+            print(f"⚠️ 搜索缓存版本更新失败: {e}")
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+# 全局搜索缓存
+search_cache = SearchCache()
+
+
+def etag_for(key: str) -> str:
+    """缓存键 -> 弱 ETag"""
+    return f'W/"{key[:32]}"'
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 写入钩子
+# ============================================
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_tables(session: Session, flush_context) -> None:
+    """记录本次事务写入涉及的表"""
+    tables = session.info.setdefault("search_tables", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = VERSIONED_MODELS.get(type(obj))
+        if table:
+            tables.add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_table_versions(session: Session) -> None:
+    """事务提交后递增表版本"""
+    tables = session.info.pop("search_tables", None)
+    if tables:
+        search_cache.bump(*tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session: Session) -> None:
+    session.info.pop("search_tables", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_table_writes(orm_execute_state) -> None:
+    """批量写入不经过 flush，在此记录"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    table = VERSIONED_MODELS.get(mapper.class_) if mapper else None
+    if table:
+        orm_execute_state.session.info.setdefault("search_tables", set()).add(table)
+
+# endregion
+# ============================================
@@ -0,0 +1,318 @@
+"""
+统计汇总服务
+业绩/企业/律师的统计结果预先计算并保存在 stats_summary 表和进程内存中，
+统计接口和 Agent 直接读取快照，耗时与数据量无关
+
+更新方式:
+    - 写入钩子：ORM 会话提交时若涉及某张表，标记对应统计为"脏"
+    - 后台刷新：脏统计在 STATS_MAX_STALENESS 秒内重算；其他进程写入的结果
+      通过定期重读 stats_summary 表同步；每 STATS_FULL_REFRESH 秒全量重算兜底
+
+类比：超市门口的"今日客流"看板
+不是每个人问的时候都去数一遍人头，而是有人进出时记一笔，看板隔几秒刷新
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.config import STATS_MAX_STALENESS, STATS_FULL_REFRESH
+from app.db.database import SessionLocal
+from app.db.models import Performance, Enterprise, Lawyer, StatsSummary
+from app.telemetry.metrics import record_cache
+
+
+# ============================================
+# region 统计计算
+# ============================================
+
+def compute_performance_stats(db: Session) -> dict:
+    """业绩统计：总数、总金额、按合同类型分组"""
+    total_count, total_amount = db.query(
+        func.count(Performance.id),
+        func.sum(Performance.amount),
+    ).one()
+
+    type_stats = db.query(
+        Performance.contract_type,
+        func.count(Performance.id).label("count"),
+        func.sum(Performance.amount).label("amount"),
+    ).group_by(Performance.contract_type).all()
+
+    return {
+        "total_count": total_count or 0,
+        "total_amount": float(total_amount or 0),
+        "by_type": [
+            {
+                "type": item[0] or "未分类",
+                "count": item[1],
+                "amount": float(item[2] or 0),
+            }
+            for item in type_stats
+        ],
+    }
+
+
+def compute_enterprise_stats(db: Session) -> dict:
+    """企业统计：总数、国企数、自动填充数、按行业分组"""
+    total_count, state_owned_count, auto_filled_count = db.query(
+        func.count(Enterprise.credit_code),
+        func.count(Enterprise.credit_code).filter(Enterprise.is_state_owned == True),
+        func.count(Enterprise.credit_code).filter(Enterprise.auto_filled == True),
+    ).one()
+
+    industry_stats = db.query(
+        Enterprise.industry,
+        func.count(Enterprise.credit_code).label("count"),
+    ).group_by(Enterprise.industry).all()
+
+    return {
+        "total_count": total_count or 0,
+        "state_owned_count": state_owned_count or 0,
+        "auto_filled_count": auto_filled_count or 0,
+        "by_industry": [
+            {
+                "industry": item[0] or "未分类",
+                "count": item[1],
+            }
+            for item in industry_stats
+        ],
+    }
+
+
+def compute_lawyer_stats(db: Session) -> dict:
+    """律师统计：总数、有执业证号数、有简历数"""
+    total_count, with_license_count, with_resume_count = db.query(
+        func.count(Lawyer.id),
+        func.count(Lawyer.id).filter(Lawyer.license_no.isnot(None), Lawyer.license_no != ""),
+        func.count(Lawyer.id).filter(Lawyer.resume.isnot(None), Lawyer.resume != ""),
+    ).one()
+
+    return {
+        "total_count": total_count or 0,
+        "with_license_count": with_license_count or 0,
+        "with_resume_count": with_resume_count or 0,
+    }
+
+
+# 统计范围 -> (对应模型, 计算函数)
+STATS_SCOPES: Dict[str, tuple] = {
+    "performances": (Performance, compute_performance_stats),
+    "enterprises": (Enterprise, compute_enterprise_stats),
+    "lawyers": (Lawyer, compute_lawyer_stats),
+}
+
+# 模型 -> 统计范围（写入钩子使用）
+_MODEL_SCOPES = {model: scope for scope, (model, _) in STATS_SCOPES.items()}
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 统计快照
+# ============================================
+
+class StatsService:
+    """
+    统计快照管理（进程级单例）
+
+    用法:
+        stats_service.get("performances")   # 常数时间读取
+        stats_service.mark_dirty("lawyers") # 写入后标记，后台重算
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_staleness: float = STATS_MAX_STALENESS,
+        full_refresh: float = STATS_FULL_REFRESH,
+    ):
+        self.session_factory = session_factory
+        self.max_staleness = max_staleness
+        self.full_refresh = full_refresh
+        self._snapshots: Dict[str, dict] = {}
+        self._refreshed_at: Dict[str, datetime] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_full = 0.0
+        self.refreshes = 0
+
+    # ---------- 读取 ----------
+
+    def get(self, scope: str) -> dict:
+        """
+        获取统计快照
+
+        参数:
+            scope: performances / enterprises / lawyers
+        返回:
+            统计结果（附带 refreshed_at）
+        """
+        if scope not in STATS_SCOPES:
+            raise KeyError(f"未知统计范围: {scope}")
+
+        snapshot = self._snapshots.get(scope)
+        record_cache("stats", hit=snapshot is not None)
+        if snapshot is None:
+            # 冷启动且后台尚未加载：同步计算一次
+            self.refresh(scope)
+            snapshot = self._snapshots.get(scope, {})
+
+        refreshed_at = self._refreshed_at.get(scope)
+        return {
+            **snapshot,
+            "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+        }
+
+    # ---------- 更新 ----------
+
+    def mark_dirty(self, *scopes: str) -> None:
+        """标记统计需要重算（由写入钩子调用）"""
+        with self._lock:
+            self._dirty.update(s for s in scopes if s in STATS_SCOPES)
+        self._wakeup.set()
+
+    def refresh(self, scope: str) -> None:
+        """重算单个统计并写入 stats_summary 表"""
+        _, compute = STATS_SCOPES[scope]
+        db = self.session_factory()
+        try:
+            data = compute(db)
+            now = datetime.now()
+            record = db.get(StatsSummary, scope)
+            if record:
+                record.data = data
+                record.refreshed_at = now
+            else:
+                db.add(StatsSummary(scope=scope, data=data, refreshed_at=now))
+            db.commit()
+            self._snapshots[scope] = data
+            self._refreshed_at[scope] = now
+            self.refreshes += 1
+        except Exception as e:
+            db.rollback()
+            print(f"[统计] 重算 {scope} 失败: {e}")
+        finally:
+            db.close()
+
+    def load_persisted(self) -> None:
+        """从 stats_summary 表读取快照（同步其他进程的重算结果）"""
+        db = self.session_factory()
+        try:
+            for record in db.query(StatsSummary).all():
+                if record.scope not in STATS_SCOPES:
+                    continue
+                current = self._refreshed_at.get(record.scope)
+                if current is None or (record.refreshed_at and record.refreshed_at > current):
+                    self._snapshots[record.scope] = record.data
+                    self._refreshed_at[record.scope] = record.refreshed_at
+        except Exception as e:
+            print(f"[统计] 读取汇总表失败: {e}")
+        finally:
+            db.close()
+
+    def refresh_all(self) -> None:
+        """全量重算"""
+        for scope in STATS_SCOPES:
+            self.refresh(scope)
+        self._last_full = time.time()
+
+    # ---------- 后台刷新 ----------
+
+    def start(self) -> None:
+        """启动后台刷新线程（应用启动时调用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.load_persisted()
+        missing = [s for s in STATS_SCOPES if s not in self._snapshots]
+        if missing:
+            self.mark_dirty(*missing)
+        self._last_full = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="stats-refresher", daemon=True)
+        self._thread.start()
+        print(f"📊 统计刷新已启动（最大延迟 {self.max_staleness:g}s）")
+
+    def stop(self) -> None:
+        """停止后台刷新线程"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(timeout=self.max_staleness)
+            if self._stop.is_set():
+                return
+            # 聚合窗口：同一窗口内的多次写入只重算一次
+            time.sleep(min(1.0, self.max_staleness / 2))
+            self._wakeup.clear()
+
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+
+            if time.time() - self._last_full >= self.full_refresh:
+                self.refresh_all()
+                continue
+
+            for scope in dirty:
+                self.refresh(scope)
+            if not dirty:
+                self.load_persisted()
+
+
+# 全局统计服务
+stats_service = StatsService()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 写入钩子
+# ============================================
+
+@event.listens_for(Session, "after_flush")
+def _collect_stats_scopes(session: Session, flush_context) -> None:
+    """记录本次事务写入涉及的统计范围"""
+    scopes = session.info.setdefault("stats_scopes", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        scope = _MODEL_SCOPES.get(type(obj))
+        if scope:
+            scopes.add(scope)
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_stats_dirty(session: Session) -> None:
+    """事务提交后标记统计为脏"""
+    scopes = session.info.pop("stats_scopes", None)
+    if scopes:
+        stats_service.mark_dirty(*scopes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stats_scopes(session: Session) -> None:
+    session.info.pop("stats_scopes", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_writes(orm_execute_state) -> None:
+    """query.update() / query.delete() 等批量写入不经过 flush，在此记录"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    scope = _MODEL_SCOPES.get(mapper.class_) if mapper else None
+    if scope:
+        orm_execute_state.session.info.setdefault("stats_scopes", set()).add(scope)
+
+# endregion
+# ============================================
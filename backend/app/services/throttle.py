@@ -0,0 +1,209 @@
+"""
+远程模型调用限流
+令牌桶控制调用速率，遇到 429（上游限流）时退避重试并自动降速，之后逐步恢复：
+
+    - 令牌桶：平均速率 LLM_RATE_PER_MINUTE，允许 LLM_RATE_BURST 次突发
+    - 自适应：429 时速率减半（不低于上限的 1/16）并按 Retry-After 暂停发放令牌，
+      每次成功后按上限的 1/20 回升（加性增、乘性减）
+    - 重试：429、5xx、连接错误/超时按指数退避 + 随机抖动重试，优先使用 Retry-After
+
+批量上传时几十个文件同时调用视觉模型，不限流会集体撞上上游配额，全部失败后又同时重试
+
+类比：高速收费站
+闸口按固定节奏放车（令牌桶），前方拥堵（429）就放慢节奏并让车先等一会儿，
+路通了再一点点恢复
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from app.config import LLM_RATE_PER_MINUTE, LLM_RATE_BURST, LLM_MAX_RETRIES, LLM_BACKOFF_BASE
+from app.telemetry.metrics import REMOTE_THROTTLE_WAIT, REMOTE_RATE_LIMITED, REMOTE_RATE_LIMIT
+
+T = TypeVar("T")
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 降速下限（占速率上限的比例）、每次成功的回升幅度（占速率上限的比例）
+MIN_RATE_FRACTION = 1 / 16
+RECOVERY_FRACTION = 1 / 20
+
+# 单次退避的最长等待（秒）
+MAX_BACKOFF = 60.0
+
+# 可重试的连接类错误（openai 的异常类名，避免在这里导入 openai）
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 令牌桶
+# ============================================
+
+class TokenBucket:
+    """
+    自适应令牌桶（线程安全）
+
+    参数:
+        rate_per_minute: 速率上限（次/分钟），<= 0 表示不限速
+        burst: 桶容量（允许的突发次数）
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.max_rate = rate_per_minute / 60
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """取一个令牌（不足时阻塞等待），返回等待秒数"""
+        if not self.enabled:
+            return 0.0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+                delay = max(self._paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+
+    def penalize(self, pause: Optional[float] = None) -> None:
+        """上游限流：速率减半、清空令牌，pause 秒内不发放令牌"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            self.tokens = 0.0
+            if pause:
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def reward(self) -> None:
+        """调用成功：速率回升一档"""
+        if not self.enabled or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+    @property
+    def rate_per_minute(self) -> float:
+        return self.rate * 60
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 限流调用
+# ============================================
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """读取响应头 Retry-After（秒数形式）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return min(MAX_BACKOFF, max(0.0, float(value))) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429、5xx、连接错误/超时可以重试"""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class RemoteThrottle:
+    """
+    远程调用限流器：令牌桶 + 429 退避重试
+
+    用法:
+        response = llm_throttle.call(lambda: client.chat.completions.create(...))
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate_per_minute: float = LLM_RATE_PER_MINUTE,
+        burst: int = LLM_RATE_BURST,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.rate_limited = 0
+        REMOTE_RATE_LIMIT.set(self.bucket.rate_per_minute, name=name)
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """限流执行 fn，可重试的错误按退避重试，重试用尽后抛出最后一次的异常"""
+        for attempt in range(self.max_retries + 1):
+            REMOTE_THROTTLE_WAIT.observe(self.bucket.acquire(), name=self.name)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                retry_after = _retry_after(e)
+                if _status_code(e) == 429:
+                    self.rate_limited += 1
+                    REMOTE_RATE_LIMITED.inc(name=self.name)
+                    self.bucket.penalize(retry_after)
+                    REMOTE_RATE_LIMIT.set(self.bucket.rate_per_minute, name=self.name)
+                delay = retry_after if retry_after is not None else \
+                    min(MAX_BACKOFF, self.backoff_base * 2 ** attempt) * (0.5 + random.random())
+                print(f"⏳ {self.name} 调用失败（{_status_code(e) or type(e).__name__}），"
+                      f"{delay:.1f}s 后重试（{attempt + 1}/{self.max_retries}）")
+                time.sleep(delay)
+                continue
+            self.bucket.reward()
+            REMOTE_RATE_LIMIT.set(self.bucket.rate_per_minute, name=self.name)
+            return result
+        raise AssertionError("unreachable")
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "enabled": self.bucket.enabled,
+            "rate_per_minute": round(self.bucket.rate_per_minute, 1),
+            "max_rate_per_minute": round(self.bucket.max_rate * 60, 1),
+            "burst": self.bucket.capacity,
+            "rate_limited": self.rate_limited,
+        }
+
+
+# 视觉 / 文本提取模型调用（同一个上游账号，共享配额）
+llm_throttle = RemoteThrottle("llm")
+
+# endregion
+# ============================================
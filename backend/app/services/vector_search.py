@@ -3,18 +3,32 @@
 功能：使用 pgvector 实现语义相似度搜索
 """
 
-from typing import List, Optional, Tuple
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-import httpx
+from sqlalchemy import text, func, update, delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.config import (
-    SILICONFLOW_API_KEY,
-    SILICONFLOW_BASE_URL,
     EMBEDDING_MODEL,
     EMBEDDING_DIM,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_TOUCH_FLUSH_SECONDS,
+    EMBEDDING_COALESCE_WINDOW_MS,
+    EMBEDDING_COALESCE_MAX_BATCH,
+    EMBEDDING_COALESCE_MAX_IN_FLIGHT,
 )
-from app.db.models import Performance, Lawyer
+from app.db.database import SessionLocal
+from app.db.models import Performance, Lawyer, EmbeddingCache
+from app.services.coalescing import MicroBatcher, SingleFlight
+from app.services.embedding_backend import get_embedding_backend
+from app.telemetry import traced
+from app.telemetry.metrics import record_cache
 
 
 # ============================================
@@ -36,9 +50,10 @@ VECTOR_DISTANCE_THRESHOLD = 0.8
 # region 生成向量嵌入
 # ============================================
 
+@traced("embedding.single", model=EMBEDDING_MODEL)
 def get_embedding(text: str) -> Optional[List[float]]:
     """
-    调用硅基流动 API 生成文本向量
+    生成文本向量（先查向量缓存，未命中再调用嵌入后端：硅基流动 API 或本地模型）
     
     参数:
         text: 待向量化的文本
@@ -49,38 +64,37 @@ def get_embedding(text: str) -> Optional[List[float]]:
     原理:
         BGE-M3 模型将文本映射到 1024 维空间，
         语义相近的文本在向量空间中距离更近
+    
+    并发合并:
+        相同文本的并发请求只计算一次；不同文本在 EMBEDDING_COALESCE_WINDOW_MS
+        窗口内合并为一次 get_embeddings_batch 调用，最多 EMBEDDING_COALESCE_MAX_IN_FLIGHT 批同时进行
     """
     if not text or not text.strip():
         return None
     
-    try:
-        response = httpx.post(
-            f"{SILICONFLOW_BASE_URL}/embeddings",
-            headers={
-                "Authorization": f"Bearer {SILICONFLOW_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": EMBEDDING_MODEL,
-                "input": text,
-                "encoding_format": "float"
-            },
-            timeout=30.0
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            embedding = result["data"][0]["embedding"]
-            return embedding
-        else:
-            print(f"❌ Embedding API 错误: {response.status_code}")
-            return None
-            
-    except Exception as e:
-        print(f"❌ 获取向量失败: {e}")
-        return None
+    return _embedding_flight.do(text, lambda: _embed_coalesced(text))
+
+
+def _embed_coalesced(text: str) -> Optional[List[float]]:
+    if EMBEDDING_COALESCE_WINDOW_MS > 0:
+        return _embedding_batcher.submit([text])[0]
+    return _embed_single(text)
 
 
+def _embed_single(text: str) -> Optional[List[float]]:
+    """单条生成（查缓存 -> 嵌入后端）"""
+    content_hash = embedding_content_hash(text)
+    cached = cache_lookup([content_hash])
+    if content_hash in cached:
+        return cached[content_hash]
+    
+    embedding = get_embedding_backend().embed_one(text)
+    if embedding:
+        cache_store({content_hash: embedding})
+    return embedding
+
+
+@traced("embedding.batch", model=EMBEDDING_MODEL)
 def get_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
     """
     批量获取向量嵌入（提高效率）
@@ -90,37 +104,43 @@ def get_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
     
     返回:
         对应的向量列表
+    
+    原理:
+        先按内容哈希查向量缓存，只把未命中的文本（去重后）发给嵌入后端
     """
     if not texts:
         return []
     
-    try:
-        response = httpx.post(
-            f"{SILICONFLOW_BASE_URL}/embeddings",
-            headers={
-                "Authorization": f"Bearer {SILICONFLOW_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": EMBEDDING_MODEL,
-                "input": texts,
-                "encoding_format": "float"
-            },
-            timeout=60.0
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            # 按 index 排序确保顺序正确
-            data = sorted(result["data"], key=lambda x: x["index"])
-            return [item["embedding"] for item in data]
-        else:
-            print(f"❌ Batch Embedding 错误: {response.status_code}")
-            return [None] * len(texts)
-            
-    except Exception as e:
-        print(f"❌ 批量获取向量失败: {e}")
-        return [None] * len(texts)
+    hashes = [embedding_content_hash(t) for t in texts]
+    cached = cache_lookup(hashes)
+    missing: Dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in cached and h not in missing:
+            missing[h] = t
+    if missing:
+        fetched = _request_embeddings_batch(list(missing.values()))
+        new_entries = {h: e for h, e in zip(missing, fetched) if e}
+        cache_store(new_entries)
+        cached.update(new_entries)
+    return [cached.get(h) for h in hashes]
+
+
+def _request_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """调用嵌入后端批量生成向量（不查缓存）"""
+    return get_embedding_backend().embed(texts)
+
+
+# 相同文本的并发请求合并
+_embedding_flight = SingleFlight("embedding")
+
+# 不同文本的并发单条请求合并为一次批量调用
+_embedding_batcher = MicroBatcher(
+    get_embeddings_batch,
+    max_batch=EMBEDDING_COALESCE_MAX_BATCH,
+    max_wait=EMBEDDING_COALESCE_WINDOW_MS / 1000,
+    name="embedding",
+    max_in_flight=EMBEDDING_COALESCE_MAX_IN_FLIGHT,
+)
 
 # endregion
 # ============================================
@@ -130,6 +150,7 @@ def get_embeddings_batch(texts: List[str]) -> List[Optional[List[float]]]:
 # region 业绩向量搜索
 # ============================================
 
+@traced("search.performances_vector")
 def search_performances_by_vector(
     db: Session,
     query: str,
@@ -201,6 +222,7 @@ def search_performances_by_vector(
     return performances_with_distance
 
 
+@traced("search.performances_hybrid")
 def hybrid_search_performances(
     db: Session,
     query: str,
@@ -267,6 +289,7 @@ def hybrid_search_performances(
 # region 律师向量搜索
 # ============================================
 
+@traced("search.lawyers_resume")
 def search_lawyers_by_resume(
     db: Session,
     query: str,
@@ -322,6 +345,221 @@ def search_lawyers_by_resume(
 # ============================================
 
 
+# ============================================
+# region 向量缓存
+# ============================================
+
+def _to_list(embedding) -> List[float]:
+    """pgvector 读出的 numpy 数组 -> 普通列表"""
+    return [float(x) for x in embedding]
+
+
+class _CacheTouches:
+    """
+    向量缓存命中计数缓冲（线程安全）
+
+    命中时只在内存里累加，到期后由下一次查询（或清理、关闭时）批量写回：
+    相同命中次数的哈希合并成一条 UPDATE，热门查询不会在同一行上反复加锁
+    """
+
+    def __init__(self, flush_interval: float = EMBEDDING_CACHE_TOUCH_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, hashes) -> bool:
+        """记录命中，返回是否到了写回时间（只有一个调用方会拿到 True）"""
+        with self._lock:
+            for h in hashes:
+                self._counts[h] += 1
+            now = time.monotonic()
+            if now - self._last_flush < self.flush_interval:
+                return False
+            self._last_flush = now
+            return True
+
+    def flush(self) -> int:
+        """批量写回命中次数和最近使用时间，返回写回的条数（失败时丢弃，只影响淘汰顺序）"""
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(int)
+            self._last_flush = time.monotonic()
+        if not counts:
+            return 0
+
+        by_count: Dict[int, List[str]] = defaultdict(list)
+        for h, n in counts.items():
+            by_count[n].append(h)
+
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            for n, hashes in by_count.items():
+                db.execute(
+                    update(EmbeddingCache)
+                    .where(EmbeddingCache.content_hash.in_(hashes))
+                    .values(hits=EmbeddingCache.hits + n, last_used_at=now)
+                )
+            db.commit()
+            return len(counts)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ 向量缓存命中计数写回失败: {e}")
+            return 0
+        finally:
+            db.close()
+
+
+_cache_touches = _CacheTouches()
+
+
+def flush_embedding_cache_touches() -> int:
+    """把内存里的缓存命中计数写回数据库（清理前、应用关闭时调用）"""
+    return _cache_touches.flush()
+
+
+def cache_lookup(hashes: List[str]) -> Dict[str, List[float]]:
+    """
+    按内容哈希批量查向量缓存（只读；命中计数记在内存里，定期批量写回）
+    
+    参数:
+        hashes: embedding_content_hash 结果列表
+    返回:
+        {哈希: 向量}（只包含命中的）
+    """
+    if not EMBEDDING_CACHE_ENABLED or not hashes:
+        return {}
+    
+    unique = list(dict.fromkeys(hashes))
+    found: Dict[str, List[float]] = {}
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(EmbeddingCache.content_hash, EmbeddingCache.embedding)
+            .where(EmbeddingCache.content_hash.in_(unique))
+        ).all()
+        found = {h: _to_list(e) for h, e in rows}
+    except Exception as e:
+        print(f"⚠️ 向量缓存读取失败: {e}")
+    finally:
+        db.close()
+    
+    if found and _cache_touches.record(found):
+        _cache_touches.flush()
+    
+    for h in unique:
+        record_cache("embedding", hit=h in found)
+    return found
+
+
+def cache_store(entries: Dict[str, List[float]]) -> None:
+    """
+    写入向量缓存（已存在的哈希忽略）
+    
+    参数:
+        entries: {哈希: 向量}
+    """
+    if not EMBEDDING_CACHE_ENABLED or not entries:
+        return
+    
+    now = datetime.now()
+    rows = [
+        {"content_hash": h, "model": EMBEDDING_MODEL, "embedding": e,
+         "hits": 0, "created_at": now, "last_used_at": now}
+        for h, e in entries.items()
+    ]
+    db = SessionLocal()
+    try:
+        db.execute(pg_insert(EmbeddingCache).values(rows).on_conflict_do_nothing())
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ 向量缓存写入失败: {e}")
+    finally:
+        db.close()
+
+
+def prune_embedding_cache(max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES) -> int:
+    """
+    清理向量缓存：删除其他模型生成的向量（换模型后全部失效），
+    再按最近使用时间淘汰超出上限的部分
+    
+    返回:
+        删除的条数
+    """
+    # 先写回本进程缓冲的命中时间，避免刚用过的向量被当成久未使用淘汰
+    flush_embedding_cache_touches()
+    
+    db = SessionLocal()
+    try:
+        removed = db.execute(
+            delete(EmbeddingCache).where(EmbeddingCache.model != EMBEDDING_MODEL)
+        ).rowcount or 0
+        
+        total = db.execute(select(func.count()).select_from(EmbeddingCache)).scalar() or 0
+        if total > max_entries:
+            # 第 max_entries 新的最近使用时间之前的全部淘汰
+            cutoff = db.execute(
+                select(EmbeddingCache.last_used_at)
+                .order_by(EmbeddingCache.last_used_at.desc())
+                .offset(max_entries)
+                .limit(1)
+            ).scalar()
+            if cutoff is not None:
+                removed += db.execute(
+                    delete(EmbeddingCache).where(EmbeddingCache.last_used_at <= cutoff)
+                ).rowcount or 0
+        db.commit()
+        if removed:
+            print(f"[向量缓存] 清理 {removed} 条")
+        return removed
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ 向量缓存清理失败: {e}")
+        return 0
+    finally:
+        db.close()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 向量文本
+# ============================================
+
+# 参与业绩向量的字段（任一变化都需要重新生成向量）
+PERFORMANCE_EMBED_FIELDS = ("party_a", "contract_type", "project_detail", "summary")
+
+# 参与律师简历向量的字段
+LAWYER_EMBED_FIELDS = ("resume",)
+
+
+def performance_embedding_text(perf) -> str:
+    """拼接业绩用于向量化的文本（甲方 + 合同类型 + 项目详情 + 摘要）"""
+    return " ".join(filter(None, (getattr(perf, f) or "" for f in PERFORMANCE_EMBED_FIELDS)))
+
+
+def lawyer_embedding_text(lawyer) -> str:
+    """律师简历向量化的文本"""
+    return (lawyer.resume or "").strip()
+
+
+def embedding_content_hash(text_to_embed: str) -> str:
+    """
+    向量内容哈希（包含模型名，换模型后哈希不同，会自动重新生成）
+    
+    参数:
+        text_to_embed: 待向量化的文本
+    返回:
+        sha256 十六进制
+    """
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\n{text_to_embed}".encode("utf-8")).hexdigest()
+
+# endregion
+# ============================================
+
+
 # ============================================
 # region 向量更新工具
 # ============================================
@@ -338,20 +576,19 @@ def update_performance_embedding(db: Session, performance_id: int) -> bool:
         return False
     
     # 拼接用于向量化的文本
-    text_parts = [
-        perf.party_a or "",
-        perf.contract_type or "",
-        perf.project_detail or "",
-        perf.summary or "",
-    ]
-    text_to_embed = " ".join(filter(None, text_parts))
+    text_to_embed = performance_embedding_text(perf)
     
     if not text_to_embed.strip():
         return False
     
+    content_hash = embedding_content_hash(text_to_embed)
+    if perf.embedding is not None and perf.embedding_hash == content_hash:
+        return True  # 文本未变化
+    
     embedding = get_embedding(text_to_embed)
     if embedding:
         perf.embedding = embedding
+        perf.embedding_hash = content_hash
         db.commit()
         return True
     
@@ -375,24 +612,17 @@ def batch_update_embeddings(db: Session, batch_size: int = 10) -> int:
         return 0
     
     # 准备文本
-    texts = []
-    for perf in performances:
-        text_parts = [
-            perf.party_a or "",
-            perf.contract_type or "",
-            perf.project_detail or "",
-            perf.summary or "",
-        ]
-        texts.append(" ".join(filter(None, text_parts)))
+    texts = [performance_embedding_text(perf) for perf in performances]
     
     # 批量获取向量
     embeddings = get_embeddings_batch(texts)
     
     # 更新数据库
     count = 0
-    for perf, embedding in zip(performances, embeddings):
+    for perf, text_to_embed, embedding in zip(performances, texts, embeddings):
         if embedding:
             perf.embedding = embedding
+            perf.embedding_hash = embedding_content_hash(text_to_embed)
             count += 1
     
     db.commit()
@@ -0,0 +1,32 @@
+"""
+可观测性模块
+提供链路追踪（Span 记录、环形缓冲区、OTLP 导出）和运行指标（Prometheus 格式）
+"""
+
+from app.telemetry.tracing import Span, Tracer, tracer, traced, annotate_llm_usage
+from app.telemetry.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    metrics,
+    record_cache,
+    track_call,
+)
+
+__all__ = [
+    # 追踪
+    "Span",
+    "Tracer",
+    "tracer",
+    "traced",
+    "annotate_llm_usage",
+    # 指标
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "metrics",
+    "record_cache",
+    "track_call",
+]
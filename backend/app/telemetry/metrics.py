@@ -0,0 +1,388 @@
+"""
+运行指标
+进程内计数器 / 仪表 / 直方图，以 Prometheus 文本格式在 /metrics 暴露，
+用于设定 SLO 和在压测中发现性能回退
+
+类比：仪表盘
+- Counter：里程表，只增不减（请求数、错误数）
+- Gauge：油量表，随时变化（连接池占用）
+- Histogram：测速记录，按区间统计耗时分布（P50/P99 由 Prometheus 计算）
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 默认耗时分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 慢调用分桶（LLM / OCR 页面）
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# 连接池等待分桶（大部分应接近 0）
+POOL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# 每次回答的 Agent 步数分桶
+STEP_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10)
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 指标类型
+# ============================================
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：按标签值组合保存样本"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    仪表：可设置任意值
+    传入 collect 回调时，在每次抓取时计算（如连接池状态）
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelKey, float]]] = None,
+    ):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelKey, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> Dict[LabelKey, float]:
+        if self._collect:
+            try:
+                return self._collect()
+            except Exception as e:
+                print(f"[指标] 采集 {self.name} 失败: {e}")
+                return {}
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各桶计数..., sum, count]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def mean(self, **labels) -> Optional[float]:
+        """平均值（没有样本时为 None）"""
+        with self._lock:
+            data = self._values.get(self._key(labels))
+            return data[-2] / data[-1] if data and data[-1] else None
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """计时上下文（异常也会记录耗时）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, data in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.label_names, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {_format_value(data[-1])}")
+            plain = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(data[-1])}")
+        return lines
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 注册中心
+# ============================================
+
+class MetricsRegistry:
+    """指标注册中心（进程级单例）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 '{metric.name}' 已注册")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = (), collect: Optional[Callable] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册中心
+metrics = MetricsRegistry()
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 指标定义
+# ============================================
+
+# --- 启动 ---
+APP_STARTUP_SECONDS = metrics.gauge(
+    "app_startup_seconds", "进程启动各阶段耗时（import / db_setup / lifespan）", ("phase",))
+
+# --- HTTP ---
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "HTTP 请求数", ("route", "method", "status"))
+HTTP_LATENCY = metrics.histogram(
+    "http_request_duration_seconds", "HTTP 请求耗时（按路由模板）", ("route", "method"))
+
+# --- 数据库 ---
+DB_POOL_WAIT = metrics.histogram(
+    "db_pool_checkout_wait_seconds", "从连接池获取连接的等待时间", (), POOL_BUCKETS)
+DB_QUERY_LATENCY = metrics.histogram(
+    "db_query_duration_seconds", "SQL 语句执行耗时")
+
+# --- 外部模型调用 ---
+EMBEDDING_LATENCY = metrics.histogram(
+    "embedding_request_duration_seconds", "Embedding 调用耗时", ("model", "op"))
+EMBEDDING_ERRORS = metrics.counter(
+    "embedding_errors_total", "Embedding 调用失败数", ("model", "op"))
+LLM_LATENCY = metrics.histogram(
+    "llm_request_duration_seconds", "LLM 调用耗时", ("model", "op"), SLOW_BUCKETS)
+LLM_ERRORS = metrics.counter(
+    "llm_errors_total", "LLM 调用失败数", ("model", "op"))
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "LLM token 用量", ("model", "type"))
+
+# --- OCR ---
+OCR_PAGES = metrics.counter(
+    "ocr_pages_total", "OCR 识别页数（rate() 即每秒页数）")
+OCR_PAGE_LATENCY = metrics.histogram(
+    "ocr_page_duration_seconds", "单页 OCR 耗时", (), SLOW_BUCKETS)
+OCR_THROUGHPUT = metrics.gauge(
+    "ocr_pages_per_second", "最近一份文档的 OCR 吞吐（页/秒）")
+PDF_TEXT_LAYER_PAGES = metrics.counter(
+    "pdf_text_layer_pages_total", "直接使用 PDF 文本层、跳过 OCR 的页数")
+OCR_SKIPPED_PAGES = metrics.counter(
+    "ocr_skipped_pages_total", "预扫描判定为空白、跳过 OCR 的页数")
+OCR_MODEL_RESIDENT = metrics.gauge(
+    "ocr_model_resident", "OCR 模型是否已加载在内存中（1/0）")
+OCR_MODEL_LOAD_SECONDS = metrics.gauge(
+    "ocr_model_load_seconds", "最近一次 OCR 模型加载（含预热）耗时")
+
+# --- 上传流水线 ---
+INGEST_STAGE_LATENCY = metrics.histogram(
+    "ingest_stage_duration_seconds", "上传流水线各阶段耗时", ("stage",), SLOW_BUCKETS)
+INGEST_LATENCY = metrics.histogram(
+    "ingest_duration_seconds", "上传流水线端到端耗时", (), SLOW_BUCKETS)
+INGEST_SLOT_WAIT = metrics.histogram(
+    "ingest_slot_wait_seconds", "流水线阶段等待并发名额的时间", ("kind",), SLOW_BUCKETS)
+UPLOAD_DUPLICATES = metrics.counter(
+    "upload_duplicates_total", "按内容识别出的重复上传（exact 内容相同 / near 近似重复 / legacy_name 与无内容哈希的旧记录同名 / concurrent 相同内容被并发上传，入库时发现）", ("kind",))
+REMOTE_THROTTLE_WAIT = metrics.histogram(
+    "remote_throttle_wait_seconds", "远程调用等待令牌的时间", ("name",), SLOW_BUCKETS)
+REMOTE_RATE_LIMITED = metrics.counter(
+    "remote_rate_limited_total", "远程调用收到 429 的次数", ("name",))
+REMOTE_RATE_LIMIT = metrics.gauge(
+    "remote_rate_limit_per_minute", "远程调用当前速率上限（自适应）", ("name",))
+
+# --- 缓存 ---
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total", "缓存查询次数", ("cache", "result"))
+
+# --- 工具 ---
+TOOL_CALLS = metrics.counter(
+    "tool_calls_total", "工具调用次数", ("tool", "status"))
+TOOL_LATENCY = metrics.histogram(
+    "tool_duration_seconds", "工具执行耗时", ("tool",))
+
+# --- Agent ---
+AGENT_ANSWERS = metrics.counter(
+    "agent_answers_total", "Agent 回答数（path: followup/quick/loop）", ("path",))
+AGENT_STEPS = metrics.histogram(
+    "agent_steps_per_answer", "每次回答的 Agent 循环步数", ("path",), STEP_BUCKETS)
+
+
+def _cache_hit_ratio() -> Dict[LabelKey, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_REQUESTS.samples().items():
+        entry = totals.setdefault(cache, [0.0, 0.0])
+        entry[0 if result == "hit" else 1] += value
+    return {(cache,): hit / (hit + miss) for cache, (hit, miss) in totals.items() if hit + miss}
+
+
+def _quick_path_ratio() -> Dict[LabelKey, float]:
+    samples = AGENT_ANSWERS.samples()
+    total = sum(samples.values())
+    return {(): samples.get(("quick",), 0.0) / total} if total else {}
+
+
+CACHE_HIT_RATIO = metrics.gauge(
+    "cache_hit_ratio", "缓存命中率（进程启动以来）", ("cache",), _cache_hit_ratio)
+QUICK_PATH_RATIO = metrics.gauge(
+    "agent_quick_path_hit_ratio", "快速路径命中率（进程启动以来）", (), _quick_path_ratio)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """记录一次缓存查询"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_usage(model: str, response) -> None:
+    """累计 OpenAI 兼容响应中的 token 用量"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, type="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, type="completion")
+
+
+@contextmanager
+def track_call(latency: Histogram, errors: Counter, **labels) -> Iterator[None]:
+    """
+    记录一次外部调用的耗时，抛出异常时计入错误数
+
+    用法:
+        with track_call(LLM_LATENCY, LLM_ERRORS, model=CHAT_MODEL, op="chat"):
+            client.chat.completions.create(...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc(**labels)
+        raise
+    finally:
+        latency.observe(time.perf_counter() - start, **labels)
+
+# endregion
+# ============================================
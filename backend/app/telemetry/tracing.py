@@ -0,0 +1,384 @@
+"""
+链路追踪
+记录 Agent 循环和文件解析流水线各阶段的耗时（Span），
+保存在进程内环形缓冲区，并可导出为 OpenTelemetry（OTLP/JSON）格式
+
+类比：快递的物流轨迹
+- Trace：一个包裹（一次请求）的完整轨迹
+- Span：其中一站（LLM 调用、OCR 某一页、一次 SQL）的到达和离开时间
+"""
+
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import (
+    TRACE_ENABLED,
+    TRACE_BUFFER_SIZE,
+    TRACE_EXPORT_PATH,
+    TRACE_OTLP_ENDPOINT,
+)
+
+
+# ============================================
+# region 配置常量
+# ============================================
+
+# 服务名（OTLP resource）
+SERVICE_NAME = "bidding-assistant-api"
+
+# 导出批量大小和间隔（秒）
+EXPORT_BATCH_SIZE = 256
+EXPORT_INTERVAL = 2.0
+
+# 属性字符串最大长度
+MAX_ATTR_LEN = 500
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region Span
+# ============================================
+
+class Span:
+    """单个阶段的耗时记录"""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name",
+        "start_ns", "end_ns", "attributes", "status", "error",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set(self, **attributes) -> None:
+        """补充属性（如 LLM 返回后的 token 数）"""
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException) -> None:
+        """标记失败"""
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"[:MAX_ATTR_LEN]
+
+    def to_dict(self) -> dict:
+        """供 /debug/traces 返回"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> dict:
+        """转换为 OTLP/JSON span"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attr(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.status == "error" else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attr(key: str, value: Any) -> dict:
+    """Python 值 -> OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)[:MAX_ATTR_LEN]}}
+
+
+def annotate_llm_usage(span: Optional[Span], response: Any) -> None:
+    """把 OpenAI 兼容响应中的 token 用量写入 span"""
+    usage = getattr(response, "usage", None)
+    if span is None or usage is None:
+        return
+    span.set(
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached is not None:
+        span.set(cached_tokens=cached)
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 导出器
+# ============================================
+
+class FileSpanExporter:
+    """写入本地文件（每行一个 OTLP/JSON ExportTraceServiceRequest），可被 collector 的 file receiver 读取"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, payload: dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+
+class OTLPHttpExporter:
+    """发送到 OTLP/HTTP collector（如 http://localhost:4318/v1/traces）"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def export(self, payload: dict) -> None:
+        import httpx
+        httpx.post(self.endpoint, json=payload, timeout=5.0)
+
+
+class ExportWorker:
+    """后台批量导出线程，避免在请求线程中做 IO"""
+
+    def __init__(self, exporters: list):
+        self.exporters = exporters
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._loop, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # 导出跟不上时丢弃，不影响业务
+
+    def _loop(self) -> None:
+        batch: List[Span] = []
+        deadline = time.time() + EXPORT_INTERVAL
+        while True:
+            try:
+                span = self._queue.get(timeout=max(0.05, deadline - time.time()))
+                if span is None:
+                    self._flush(batch)
+                    return
+                batch.append(span)
+            except queue.Empty:
+                pass
+            if len(batch) >= EXPORT_BATCH_SIZE or time.time() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.time() + EXPORT_INTERVAL
+
+    def _flush(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.telemetry"},
+                    "spans": [s.to_otlp() for s in batch],
+                }],
+            }]
+        }
+        for exporter in self.exporters:
+            try:
+                exporter.export(payload)
+            except Exception as e:
+                print(f"[追踪] 导出失败 {type(exporter).__name__}: {e}")
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """刷新剩余 span 并停止线程"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region Tracer
+# ============================================
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    追踪器（进程级单例）
+    结束的 span 写入环形缓冲区，配置了导出目标时同时交给后台线程导出
+    """
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER_SIZE, enabled: bool = TRACE_ENABLED):
+        self.enabled = enabled
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._worker: Optional[ExportWorker] = None
+
+        exporters = []
+        if TRACE_EXPORT_PATH:
+            exporters.append(FileSpanExporter(TRACE_EXPORT_PATH))
+        if TRACE_OTLP_ENDPOINT:
+            exporters.append(OTLPHttpExporter(TRACE_OTLP_ENDPOINT))
+        if enabled and exporters:
+            self._worker = ExportWorker(exporters)
+
+    def current_span(self) -> Optional[Span]:
+        """当前上下文中的 span"""
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """
+        记录一个阶段
+
+        用法:
+            with tracer.span("ocr.page", page=3) as span:
+                ...
+                span.set(lines=42)
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def finish(self, span: Span) -> None:
+        """结束 span 并入缓冲区"""
+        if span.end_ns is None:
+            span.end_ns = time.time_ns()
+        with self._lock:
+            self._buffer.append(span)
+        if self._worker:
+            self._worker.submit(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes) -> Optional[Span]:
+        """
+        记录一个已完成的阶段（用于事件回调，如 SQL 执行）
+        只在存在父 span 时记录，避免无请求上下文的噪声
+        """
+        parent = _current_span.get()
+        if not self.enabled or parent is None:
+            return None
+        span = Span(name, parent.trace_id, parent.span_id, attributes)
+        span.start_ns = start_ns
+        span.end_ns = end_ns
+        self.finish(span)
+        return span
+
+    def recent_spans(self) -> List[Span]:
+        """缓冲区中的全部 span（按结束时间）"""
+        with self._lock:
+            return list(self._buffer)
+
+    def get_traces(self, limit: int = 20, name: Optional[str] = None) -> List[dict]:
+        """
+        按 trace 分组返回最近的链路
+
+        参数:
+            limit: 返回的 trace 数
+            name: 只返回根 span 名称包含该字符串的 trace
+        """
+        traces: Dict[str, List[Span]] = {}
+        for span in self.recent_spans():
+            traces.setdefault(span.trace_id, []).append(span)
+
+        result = []
+        for trace_id, spans in reversed(list(traces.items())):
+            spans.sort(key=lambda s: s.start_ns)
+            root = next((s for s in spans if s.parent_id is None), spans[0])
+            if name and name not in root.name:
+                continue
+            result.append({
+                "trace_id": trace_id,
+                "root": root.name,
+                "duration_ms": round(root.duration_ms, 3),
+                "span_count": len(spans),
+                "spans": [s.to_dict() for s in spans],
+            })
+            if len(result) >= limit:
+                break
+        return result
+
+    def get_trace(self, trace_id: str) -> List[dict]:
+        """获取单条链路的所有 span"""
+        spans = [s for s in self.recent_spans() if s.trace_id == trace_id]
+        spans.sort(key=lambda s: s.start_ns)
+        return [s.to_dict() for s in spans]
+
+    def shutdown(self) -> None:
+        """应用关闭时刷新导出"""
+        if self._worker:
+            self._worker.shutdown()
+
+
+# 全局追踪器
+tracer = Tracer()
+
+
+def traced(name: Optional[str] = None, **attributes) -> Callable:
+    """
+    装饰器：为函数调用记录 span
+
+    用法:
+        @traced("extract.vision")
+        def extract_with_vision(...): ...
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+# endregion
+# ============================================
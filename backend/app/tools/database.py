@@ -4,23 +4,11 @@
 """
 
 from typing import Optional, List
-from sqlalchemy.orm import Session
 
 from app.tools.decorators import tool
-from app.db.database import SessionLocal
+from app.db.database import db_session
 from app.db import crud
-
-
-# ============================================
-# region 辅助函数
-# ============================================
-
-def get_db_session() -> Session:
-    """获取数据库会话（工具内部使用）"""
-    return SessionLocal()
-
-# endregion
-# ============================================
+from app.services.stats import stats_service
 
 
 # ============================================
@@ -50,8 +38,7 @@ def search_performances(
     years: 近N年的业绩
     keyword: 关键词搜索（匹配项目详情、摘要、甲方）
     """
-    db = get_db_session()
-    try:
+    with db_session() as db:
         results = crud.search_performances(
             db=db,
             party_a=party_a,
@@ -66,8 +53,6 @@ def search_performances(
             "count": len(results),
             "performances": [p.to_dict() for p in results]
         }
-    finally:
-        db.close()
 
 
 @tool(
@@ -81,15 +66,22 @@ def get_performance_detail(performance_id: int) -> dict:
     
     performance_id: 业绩ID
     """
-    db = get_db_session()
-    try:
+    with db_session() as db:
         result = crud.get_performance_by_id(db, performance_id)
         if result:
             return {"found": True, "performance": result.to_dict()}
         else:
             return {"found": False, "message": f"未找到ID为 {performance_id} 的业绩"}
-    finally:
-        db.close()
+
+
+@tool(
+    name="get_performance_stats",
+    description="获取业绩统计：总数、总金额、按合同类型分组的数量和金额",
+    category="database"
+)
+def get_performance_stats() -> dict:
+    """获取业绩统计（读取预计算快照）"""
+    return stats_service.get("performances")
 
 # endregion
 # ============================================
@@ -116,8 +108,7 @@ def search_enterprises(
     industry: 行业分类
     is_state_owned: 是否国企
     """
-    db = get_db_session()
-    try:
+    with db_session() as db:
         results = crud.search_enterprises(
             db=db,
             name_keyword=name_keyword,
@@ -129,8 +120,6 @@ def search_enterprises(
             "count": len(results),
             "enterprises": [e.to_dict() for e in results]
         }
-    finally:
-        db.close()
 
 
 @tool(
@@ -144,15 +133,12 @@ def get_enterprise_by_name(company_name: str) -> dict:
     
     company_name: 企业名称（精确匹配）
     """
-    db = get_db_session()
-    try:
+    with db_session() as db:
         result = crud.get_enterprise_by_name(db, company_name)
         if result:
             return {"found": True, "enterprise": result.to_dict()}
         else:
             return {"found": False, "message": f"未找到企业: {company_name}"}
-    finally:
-        db.close()
 
 # endregion
 # ============================================
@@ -177,8 +163,7 @@ def search_lawyers(
     name: 律师姓名（模糊匹配）
     license_no: 执业证号
     """
-    db = get_db_session()
-    try:
+    with db_session() as db:
         results = crud.search_lawyers(
             db=db,
             name=name,
@@ -189,8 +174,6 @@ def search_lawyers(
             "count": len(results),
             "lawyers": [l.to_dict() for l in results]
         }
-    finally:
-        db.close()
 
 
 @tool(
@@ -200,15 +183,12 @@ def search_lawyers(
 )
 def get_all_lawyers() -> dict:
     """获取所有律师"""
-    db = get_db_session()
-    try:
+    with db_session() as db:
         results = crud.get_all_lawyers(db)
         return {
             "count": len(results),
             "lawyers": [l.to_dict() for l in results]
         }
-    finally:
-        db.close()
 
 # endregion
 # ============================================
\ No newline at end of file
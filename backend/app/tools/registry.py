@@ -12,6 +12,8 @@ from typing import Dict, List, Optional, Any
 import json
 
 from app.tools.base import Tool, ToolResult
+from app.telemetry import tracer
+from app.telemetry.metrics import TOOL_CALLS, TOOL_LATENCY, record_cache
 
 
 # ============================================
@@ -30,14 +32,30 @@ class ToolRegistry:
     
     _instance: Optional["ToolRegistry"] = None
     _tools: Dict[str, Tool] = {}
+    _version: int = 0
+    _prompt_cache: Dict[Optional[str], tuple] = {}
     
     def __new__(cls) -> "ToolRegistry":
         """单例模式：确保全局只有一个注册中心"""
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._tools = {}
+            cls._version = 0
+            cls._prompt_cache = {}
         return cls._instance
     
+    @property
+    def version(self) -> int:
+        """
+        注册表版本号
+        每次注册/注销/清空工具时递增，供提示词缓存判断是否失效
+        """
+        return self._version
+    
+    def _bump_version(self) -> None:
+        """工具集合变化，递增版本号"""
+        type(self)._version += 1
+    
     def register(self, tool: Tool) -> None:
         """
         注册工具
@@ -49,6 +67,7 @@ class ToolRegistry:
             print(f"⚠️ 工具 '{tool.name}' 已存在，将被覆盖")
         
         self._tools[tool.name] = tool
+        self._bump_version()
         print(f"✅ 工具已注册: {tool.name}")
     
     def unregister(self, name: str) -> bool:
@@ -62,6 +81,7 @@ class ToolRegistry:
         """
         if name in self._tools:
             del self._tools[name]
+            self._bump_version()
             print(f"🗑️ 工具已注销: {name}")
             return True
         return False
@@ -115,11 +135,33 @@ class ToolRegistry:
                 error=f"工具 '{name}' 不存在"
             )
         
-        try:
-            result = tool(**kwargs)
-            return ToolResult.ok(tool_name=name, result=result)
-        except Exception as e:
-            return ToolResult.fail(tool_name=name, error=str(e))
+        with tracer.span("tool.execute", tool=name) as span, TOOL_LATENCY.time(tool=name):
+            try:
+                result = tool(**kwargs)
+                TOOL_CALLS.inc(tool=name, status="ok")
+                return ToolResult.ok(tool_name=name, result=result)
+            except Exception as e:
+                if span:
+                    span.fail(e)
+                TOOL_CALLS.inc(tool=name, status="error")
+                return ToolResult.fail(tool_name=name, error=str(e))
+    
+    def execute(self, name: str, params: Optional[dict] = None) -> dict:
+        """
+        执行工具（供 Agent 使用）
+        
+        参数:
+            name: 工具名称
+            params: 参数字典
+        返回:
+            {"success": bool, "data": 工具返回, "error": 错误信息}
+        """
+        result = self.call(name, **(params or {}))
+        return {
+            "success": result.success,
+            "data": result.result,
+            "error": result.error,
+        }
     
     def get_tools_prompt(self, category: Optional[str] = None) -> str:
         """
@@ -131,6 +173,19 @@ class ToolRegistry:
         返回:
             格式化的工具说明文本
         """
+        # 工具集合未变化时直接复用，保证输出字节级稳定
+        cached = self._prompt_cache.get(category)
+        if cached and cached[0] == self._version:
+            record_cache("tool_catalog", hit=True)
+            return cached[1]
+        record_cache("tool_catalog", hit=False)
+        
+        prompt = self._render_tools_prompt(category)
+        self._prompt_cache[category] = (self._version, prompt)
+        return prompt
+    
+    def _render_tools_prompt(self, category: Optional[str] = None) -> str:
+        """渲染工具列表提示词（无缓存）"""
         tools = self.list_tools(category)
         
         if not tools:
@@ -173,6 +228,7 @@ class ToolRegistry:
     def clear(self) -> None:
         """清空所有工具（测试用）"""
         self._tools.clear()
+        self._bump_version()
         print("🗑️ 所有工具已清空")
 
 # endregion
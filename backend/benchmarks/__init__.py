@@ -0,0 +1,4 @@
+"""
+离线基准测试
+在 backend 目录下运行，如: python -m benchmarks.intent_router
+"""
@@ -0,0 +1,188 @@
+"""
+连接池压测
+模拟"对话 + 上传"并发：多个线程反复获取连接、执行查询、归还连接，
+比较不同连接池配置下的取连接等待、查询延迟、吞吐和超时数
+
+需要可连接的本地 PostgreSQL（使用 DATABASE_URL）
+
+用法（在 backend 目录下）:
+    python -m benchmarks.db_pool
+    python -m benchmarks.db_pool --workers 64 --duration 20 --query-ms 20 --think-ms 50
+    python -m benchmarks.db_pool --pool-size 20 --max-overflow 40 --pre-ping idle
+"""
+
+import argparse
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.config import DATABASE_URL
+from app.db.database import create_db_engine
+
+
+# ============================================
+# region 压测配置
+# ============================================
+
+# 对照组：SQLAlchemy 默认连接池 + 每次取连接都 ping（原先的配置）
+BASELINE = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pre_ping": "always",
+}
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 压测
+# ============================================
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def run_load(
+    label: str,
+    workers: int,
+    duration: float,
+    query_ms: float,
+    think_ms: float,
+    pool_timeout: float,
+    **engine_options,
+) -> Dict:
+    """
+    在给定连接池配置下压测
+
+    参数:
+        label: 配置名称
+        workers: 并发线程数
+        duration: 压测时长（秒）
+        query_ms: 每次查询在数据库中的耗时（pg_sleep 模拟）
+        think_ms: 两次查询之间不占用连接的间隔（模拟等待 LLM / OCR）
+        pool_timeout: 获取连接超时（秒）
+        engine_options: 传给 create_db_engine 的连接池参数
+    返回:
+        统计结果
+    """
+    engine = create_db_engine(DATABASE_URL, pool_timeout=pool_timeout, slow_query_ms=0, **engine_options)
+    # 预热，避免把建连耗时算进结果
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    waits: List[float] = []
+    queries: List[float] = []
+    timeouts = 0
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    statement = text("SELECT pg_sleep(:seconds)")
+
+    def worker():
+        nonlocal timeouts, errors
+        local_waits, local_queries = [], []
+        local_timeouts = local_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    acquired = time.perf_counter()
+                    conn.execute(statement, {"seconds": query_ms / 1000})
+                    done = time.perf_counter()
+                local_waits.append(acquired - start)
+                local_queries.append(done - acquired)
+            except PoolTimeoutError:
+                local_timeouts += 1
+            except Exception:
+                local_errors += 1
+            if think_ms:
+                time.sleep(think_ms / 1000)
+        with lock:
+            waits.extend(local_waits)
+            queries.extend(local_queries)
+            timeouts += local_timeouts
+            errors += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    return {
+        "label": label,
+        "requests": len(queries),
+        "throughput": len(queries) / elapsed if elapsed else 0.0,
+        "wait_p50": percentile(waits, 0.50) * 1000,
+        "wait_p99": percentile(waits, 0.99) * 1000,
+        "query_p50": percentile(queries, 0.50) * 1000,
+        "query_p99": percentile(queries, 0.99) * 1000,
+        "timeouts": timeouts,
+        "errors": errors,
+    }
+
+
+def print_result(result: Dict) -> None:
+    print(
+        f"{result['label']:<10} 请求 {result['requests']:>6}  吞吐 {result['throughput']:>8.1f}/s  "
+        f"取连接 p50={result['wait_p50']:.2f}ms p99={result['wait_p99']:.2f}ms  "
+        f"查询 p50={result['query_p50']:.2f}ms p99={result['query_p99']:.2f}ms  "
+        f"超时 {result['timeouts']}  错误 {result['errors']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="连接池压测")
+    parser.add_argument("--workers", type=int, default=32, help="并发线程数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每组压测时长（秒）")
+    parser.add_argument("--query-ms", type=float, default=10.0, help="单次查询耗时（毫秒）")
+    parser.add_argument("--think-ms", type=float, default=20.0, help="两次查询间不占连接的间隔（毫秒）")
+    parser.add_argument("--pool-timeout", type=float, default=5.0, help="获取连接超时（秒）")
+    parser.add_argument("--pool-size", type=int, default=None, help="调优组常驻连接数（默认取配置）")
+    parser.add_argument("--max-overflow", type=int, default=None, help="调优组溢出连接数（默认取配置）")
+    parser.add_argument("--pre-ping", choices=["always", "idle", "off"], default=None, help="调优组检测策略")
+    parser.add_argument("--skip-baseline", action="store_true", help="只压测调优组")
+    args = parser.parse_args()
+
+    tuned = {
+        key: value
+        for key, value in {
+            "pool_size": args.pool_size,
+            "max_overflow": args.max_overflow,
+            "pre_ping": args.pre_ping,
+        }.items()
+        if value is not None
+    }
+
+    common = dict(
+        workers=args.workers,
+        duration=args.duration,
+        query_ms=args.query_ms,
+        think_ms=args.think_ms,
+        pool_timeout=args.pool_timeout,
+    )
+    print(
+        f"并发 {args.workers}，每组 {args.duration:.0f}s，查询 {args.query_ms:.0f}ms，"
+        f"间隔 {args.think_ms:.0f}ms，取连接超时 {args.pool_timeout:.0f}s"
+    )
+
+    if not args.skip_baseline:
+        print_result(run_load("baseline", **common, **BASELINE))
+    print_result(run_load("tuned", **common, **tuned))
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion
+# ============================================
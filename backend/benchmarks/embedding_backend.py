@@ -0,0 +1,162 @@
+"""
+嵌入后端压测
+模拟多人同时搜索：多个线程并发提交单条查询文本（绕过向量缓存，直接调用后端），
+比较远程 API 与本地 CPU 推理的吞吐和延迟
+
+远程后端需要 SILICONFLOW_API_KEY；本地后端需要安装 sentence-transformers
+
+用法（在 backend 目录下）:
+    python -m benchmarks.embedding_backend
+    python -m benchmarks.embedding_backend --backends local --workers 16 --requests 50
+    python -m benchmarks.embedding_backend --backends local --threads 4 --max-batch 64 --max-wait-ms 5
+"""
+
+import argparse
+import random
+import threading
+import time
+from typing import Dict, List
+
+from app.services.embedding_backend import (
+    EmbeddingBackend,
+    RemoteEmbeddingBackend,
+    LocalEmbeddingBackend,
+    local_backend_available,
+)
+
+
+# ============================================
+# region 压测数据
+# ============================================
+
+# 组合出不同的查询文本，避免任何一层缓存命中
+SUBJECTS = ["能源", "金融", "医疗", "基建", "国企改制", "知识产权", "并购重组", "劳动用工", "数据合规", "债券发行"]
+ACTIONS = ["常年法律顾问", "专项法律服务", "诉讼代理", "尽职调查", "合规审查", "合同审查"]
+SUFFIXES = ["业绩", "案例", "项目经验", "服务记录", "合同"]
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 压测
+# ============================================
+
+def make_queries(count: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(SUBJECTS)}行业{rng.choice(ACTIONS)}{rng.choice(SUFFIXES)} #{i}"
+        for i in range(count)
+    ]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def run_load(label: str, backend: EmbeddingBackend, workers: int, requests_per_worker: int) -> Dict:
+    """
+    并发压测单个后端
+
+    参数:
+        label: 名称
+        backend: 嵌入后端
+        workers: 并发线程数
+        requests_per_worker: 每个线程的请求数
+    返回:
+        统计结果
+    """
+    backend.warmup()
+    queries = make_queries(workers * requests_per_worker)
+    latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    def worker(index: int):
+        nonlocal failures
+        local_latencies, local_failures = [], 0
+        for query in queries[index::workers]:
+            start = time.perf_counter()
+            vector = backend.embed_one(query)
+            local_latencies.append(time.perf_counter() - start)
+            if not vector:
+                local_failures += 1
+        with lock:
+            latencies.extend(local_latencies)
+            failures += local_failures
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "label": label,
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "failures": failures,
+    }
+    if isinstance(backend, LocalEmbeddingBackend):
+        result["avg_batch"] = len(latencies) / backend.batcher.batches if backend.batcher.batches else 0.0
+    return result
+
+
+def print_result(result: Dict) -> None:
+    line = (
+        f"{result['label']:<8} 请求 {result['requests']:>5}  吞吐 {result['throughput']:>7.1f}/s  "
+        f"p50={result['p50']:.1f}ms  p99={result['p99']:.1f}ms  失败 {result['failures']}"
+    )
+    if "avg_batch" in result:
+        line += f"  平均批大小 {result['avg_batch']:.1f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入后端压测")
+    parser.add_argument("--backends", default="remote,local", help="逗号分隔：remote,local")
+    parser.add_argument("--workers", type=int, default=8, help="并发线程数")
+    parser.add_argument("--requests", type=int, default=20, help="每个线程的请求数")
+    parser.add_argument("--threads", type=int, default=None, help="本地推理线程数")
+    parser.add_argument("--max-batch", type=int, default=None, help="本地动态批处理最大批大小")
+    parser.add_argument("--max-wait-ms", type=float, default=None, help="本地动态批处理最长等待（毫秒）")
+    parser.add_argument("--runtime", choices=["torch", "onnx"], default=None, help="本地推理运行时")
+    args = parser.parse_args()
+
+    print(f"并发 {args.workers}，每线程 {args.requests} 次单条请求")
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        if name == "remote":
+            backend = RemoteEmbeddingBackend()
+        elif name == "local":
+            if not local_backend_available():
+                print("local    跳过：未安装 sentence-transformers")
+                continue
+            options = {
+                key: value
+                for key, value in {
+                    "threads": args.threads,
+                    "max_batch": args.max_batch,
+                    "max_wait_ms": args.max_wait_ms,
+                    "runtime": args.runtime,
+                }.items()
+                if value is not None
+            }
+            backend = LocalEmbeddingBackend(**options)
+        else:
+            print(f"{name:<8} 跳过：未知后端")
+            continue
+        print_result(run_load(name, backend, args.workers, args.requests))
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion
+# ============================================
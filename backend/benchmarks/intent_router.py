@@ -0,0 +1,175 @@
+"""
+意图路由离线基准
+统计标注样本上的路由准确率、误路由率、覆盖率和单次路由延迟
+
+用法（在 backend 目录下）:
+    python -m benchmarks.intent_router
+    python -m benchmarks.intent_router --threshold 0.8 --rounds 2000
+"""
+
+import argparse
+import time
+from typing import List, Optional, Tuple
+
+from app.agent.intent import IntentRouter, QUICK_PATH_THRESHOLD
+
+
+# ============================================
+# region 标注样本
+# ============================================
+
+# (用户消息, 期望意图, 期望参数子集)；期望意图为 None 表示应交给 Agent
+LABELLED_CASES: List[Tuple[str, Optional[str], dict]] = [
+    # 业绩列举
+    ("所有业绩", "performances", {}),
+    ("查询业绩", "performances", {}),
+    ("业绩列表", "performances", {}),
+    ("有哪些业绩", "performances", {}),
+    ("看看我们的案例", "performances", {}),
+    ("常年顾问合同有哪些", "performances", {"contract_type": "常年法律顾问合同"}),
+    ("给我看看诉讼案例", "performances", {"contract_type": "委托代理合同"}),
+    ("近三年的业绩", "performances", {"years": 3}),
+    ("最近5年500万以上的业绩", "performances", {"years": 5, "min_amount": 500.0}),
+    ("近两年100万以下的专项业绩", "performances", {"years": 2, "max_amount": 100.0, "contract_type": "专项法律服务"}),
+    ("能源行业的业绩", "performances", {"keyword": "能源"}),
+    ("金融类案例有哪些", "performances", {"keyword": "金融"}),
+    # 律师
+    ("所有律师", "lawyers", {}),
+    ("律师有哪些", "lawyers", {}),
+    ("参与的律师", "lawyers", {}),
+    ("查看律师列表", "lawyers", {}),
+    # 企业
+    ("所有企业", "enterprises", {}),
+    ("有哪些客户", "enterprises", {}),
+    ("企业列表", "enterprises", {}),
+    ("国企有哪些", "enterprises", {"is_state_owned": True}),
+    ("国有企业列表", "enterprises", {"is_state_owned": True}),
+    # 统计
+    ("业绩统计", "stats", {}),
+    ("汇总一下", "stats", {}),
+    ("业绩总金额", "stats", {}),
+    ("业绩总金额是多少", "stats", {}),
+    # 应交给 Agent 的问题
+    ("帮我匹配能源类业绩", None, {}),
+    ("根据招标要求推荐三个业绩", None, {}),
+    ("国企招标对律师有什么要求", None, {}),
+    ("国企业绩有哪些", None, {}),
+    ("张三律师是否满足投标资格", None, {}),
+    ("分析一下我们近三年的业绩趋势", None, {}),
+    ("比较两个客户的合同金额", None, {}),
+    ("帮我起草一份业绩说明", None, {}),
+    ("律师和企业", None, {}),
+    ("这个项目怎么投标", None, {}),
+    ("你好", None, {}),
+    ("今天天气怎么样", None, {}),
+    ("律师统计", None, {}),
+    # 含工具表达不了的条件，直接执行会忽略条件
+    ("2023年的业绩", None, {}),
+    ("今年的业绩", None, {}),
+    ("2022年以来的案例", None, {}),
+    ("三月份签的合同", None, {}),
+    ("这个合同的金额是多少", None, {}),
+    ("那家企业是国企吗", None, {}),
+    ("能源行业的业绩有几个", None, {}),
+    ("哪家客户的合同", None, {}),
+    # 含人名、甲方、地区、排序等抽不成参数的条件，直接执行会返回整张表
+    ("张三律师", None, {}),
+    ("北京的律师", None, {}),
+    ("华为的业绩", None, {}),
+    ("甲方是华为的业绩", None, {}),
+    ("刑事案件业绩", None, {}),
+    ("金额最大的业绩", None, {}),
+    ("500万的合同", None, {}),
+    ("广州地铁的合同", None, {}),
+]
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 基准
+# ============================================
+
+def evaluate(router: IntentRouter) -> dict:
+    """在标注样本上评估路由效果"""
+    correct = 0
+    false_route = 0
+    missed = 0
+    errors = []
+
+    for message, expected, expected_params in LABELLED_CASES:
+        match = router.route(message)
+        got = match.intent if match else None
+
+        if got == expected and (
+            match is None
+            or all(match.params.get(k) == v for k, v in expected_params.items())
+        ):
+            correct += 1
+            continue
+
+        if expected is None:
+            false_route += 1
+        elif got is None:
+            missed += 1
+        errors.append((message, expected, got, match.params if match else None))
+
+    total = len(LABELLED_CASES)
+    should_route = sum(1 for _, e, _ in LABELLED_CASES if e is not None)
+    should_not = total - should_route
+
+    return {
+        "accuracy": correct / total,
+        "coverage": (should_route - missed) / should_route if should_route else 0.0,
+        "false_route_rate": false_route / should_not if should_not else 0.0,
+        "errors": errors,
+    }
+
+
+def measure_latency(router: IntentRouter, rounds: int) -> dict:
+    """测量单次路由延迟（毫秒）"""
+    samples = []
+    messages = [case[0] for case in LABELLED_CASES]
+    for _ in range(rounds):
+        for message in messages:
+            start = time.perf_counter()
+            router.route(message)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": samples[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图路由离线基准")
+    parser.add_argument("--threshold", type=float, default=QUICK_PATH_THRESHOLD, help="置信度阈值")
+    parser.add_argument("--rounds", type=int, default=500, help="延迟测量轮数")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    router = IntentRouter(threshold=args.threshold)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    quality = evaluate(router)
+    latency = measure_latency(router, args.rounds)
+
+    print(f"样本数: {len(LABELLED_CASES)}，阈值: {args.threshold}，自动机构建: {build_ms:.2f}ms")
+    print(f"准确率: {quality['accuracy']:.1%}")
+    print(f"覆盖率（应路由且已路由）: {quality['coverage']:.1%}")
+    print(f"误路由率（应交给 Agent 却被路由）: {quality['false_route_rate']:.1%}")
+    print(
+        f"延迟(ms): p50={latency['p50']:.3f} p95={latency['p95']:.3f} "
+        f"p99={latency['p99']:.3f} max={latency['max']:.3f}"
+    )
+
+    for message, expected, got, params in quality["errors"]:
+        print(f"  ✗ {message!r}: 期望 {expected}，实际 {got} {params or ''}")
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion
+# ============================================
@@ -0,0 +1,209 @@
+"""
+水印过滤压测
+生成合成的长扫描件 OCR 结果（每页若干正文行 + 带识别噪声的倾斜平铺水印 + 固定页眉，含版面数组），
+比较逐对 fuzz.ratio 循环（旧实现）与 cdist 向量化实现的耗时并校验两者输出一致，
+再比较按版面检测（spatial）的耗时和效果（页眉是否保留）
+
+用法（在 backend 目录下）:
+    python -m benchmarks.watermark_filter
+    python -m benchmarks.watermark_filter --pages 500 --lines 60 --repeat 5
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+from typing import Callable, List
+
+import numpy as np
+from rapidfuzz import fuzz
+
+from app.services.ocr import PageLayout, WatermarkFilter, filter_watermarks
+
+
+# ============================================
+# region 压测数据
+# ============================================
+
+WATERMARKS = ["内部资料严禁外传", "仅供投标使用", "复印无效", "CONFIDENTIAL"]
+HEADER = "某某律师事务所"
+BODY_WORDS = [
+    "委托人", "受托人", "法律顾问", "服务期限", "合同金额", "争议解决", "违约责任",
+    "尽职调查", "项目名称", "签订日期", "甲方", "乙方", "条款", "约定", "履行", "仲裁",
+]
+NOISE_CHARS = "口日曰目自白丨一二十"
+
+# endregion
+# ============================================
+
+
+# ============================================
+# region 压测
+# ============================================
+
+def _noisy(text: str, rng: random.Random) -> str:
+    """模拟 OCR 识别噪声：随机替换/删除一个字符"""
+    chars = list(text)
+    i = rng.randrange(len(chars))
+    if rng.random() < 0.5:
+        chars[i] = rng.choice(NOISE_CHARS)
+    else:
+        del chars[i]
+    return "".join(chars)
+
+
+def make_document(pages: int, lines: int, seed: int = 42) -> List[dict]:
+    """生成合成 OCR 结果 [{"page": n, "content": [...]}]"""
+    rng = random.Random(seed)
+    document = []
+    for page in range(1, pages + 1):
+        # (文本, 置信度, 外接矩形, 角度)
+        rows = [(HEADER, 0.99, (0.1, 0.02, 0.4, 0.04), 0.0)]
+        for i in range(lines):
+            length = rng.choice([3, 5, 8, 12, 20, 40])
+            text = "".join(rng.choice(BODY_WORDS) for _ in range(length))[:length]
+            y = 0.1 + 0.8 * i / lines
+            rows.append((text, round(rng.uniform(0.8, 1.0), 3), (0.1, y, 0.1 + length * 0.02, y + 0.015), 0.0))
+        # 每种水印每页倾斜平铺 1~3 处，约三分之一带识别噪声
+        for watermark in WATERMARKS:
+            for _ in range(rng.randint(1, 3)):
+                text = _noisy(watermark, rng) if rng.random() < 0.35 else watermark
+                x, y = rng.uniform(0.1, 0.7), rng.uniform(0.1, 0.8)
+                rows.insert(
+                    rng.randrange(len(rows) + 1),
+                    (text, 0.6, (x, y, x + 0.2, y + 0.1), 35.0 + rng.uniform(-1.5, 1.5)),
+                )
+        rows.append((f"第 {page} 页", 0.99, (0.45, 0.96, 0.55, 0.98), 0.0))
+        document.append({
+            "page": page,
+            "content": [{"text": text, "confidence": confidence} for text, confidence, _, _ in rows],
+            "layout": PageLayout(
+                np.array([row[2] for row in rows], dtype=np.float32),
+                np.array([row[3] for row in rows], dtype=np.float32),
+                1654,
+                2339,
+            ),
+        })
+    return document
+
+
+def legacy_filter_watermarks(
+    ocr_results: List[dict],
+    freq_threshold_ratio: float = 0.5,
+    min_threshold: int = 3,
+    similarity_threshold: float = 70.0,
+    max_watermark_len: int = 12,
+) -> List[dict]:
+    """旧实现：每行与每个候选逐对 fuzz.ratio（对照组）"""
+    text_counter = Counter()
+    for page in ocr_results:
+        for item in page.get("content", []):
+            text = item.get("text", "").strip()
+            if text and len(text) <= max_watermark_len:
+                text_counter[text] += 1
+
+    freq_threshold = max(len(ocr_results) * freq_threshold_ratio, min_threshold)
+    candidates = {text for text, count in text_counter.items() if count >= freq_threshold}
+
+    def is_watermark(text: str) -> bool:
+        if not text or len(text) > max_watermark_len:
+            return False
+        if text in candidates:
+            return True
+        return any(fuzz.ratio(text, wm) >= similarity_threshold for wm in candidates)
+
+    return [
+        {
+            "page": page["page"],
+            "content": [
+                {"text": item.get("text", "").strip().replace("|", "｜"), "confidence": item.get("confidence", 0)}
+                for item in page.get("content", [])
+                if not is_watermark(item.get("text", "").strip())
+            ],
+        }
+        for page in ocr_results
+    ]
+
+
+def text_filter(ocr_results: List[dict]) -> List[dict]:
+    """cdist 实现（按文本频率）"""
+    return filter_watermarks(ocr_results, method="text")
+
+
+def spatial_filter(ocr_results: List[dict]) -> List[dict]:
+    """按版面检测"""
+    return filter_watermarks(ocr_results, method="spatial")
+
+
+def contents(results: List[dict]) -> List[list]:
+    return [page["content"] for page in results]
+
+
+def remaining(results: List[dict], predicate: Callable[[str], bool]) -> int:
+    return sum(1 for page in results for item in page["content"] if predicate(item["text"]))
+
+
+def incremental_filter(ocr_results: List[dict]) -> List[dict]:
+    """增量模式：逐页喂入，喂完后统一过滤"""
+    watermark_filter = WatermarkFilter()
+    for page in ocr_results:
+        watermark_filter.add_page(page)
+    return watermark_filter.result()
+
+
+def incremental_preview_filter(ocr_results: List[dict]) -> List[dict]:
+    """增量模式 + 每页用当时的统计预览过滤一次（页数少时候选多，开销更大）"""
+    watermark_filter = WatermarkFilter()
+    for page in ocr_results:
+        watermark_filter.add_page(page)
+        watermark_filter.filter_page(page)
+    return watermark_filter.result()
+
+
+def timed(fn: Callable, document: List[dict], repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(document)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="水印过滤压测")
+    parser.add_argument("--pages", type=int, default=200, help="页数")
+    parser.add_argument("--lines", type=int, default=40, help="每页正文行数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+
+    document = make_document(args.pages, args.lines)
+    total_lines = sum(len(p["content"]) for p in document)
+    print(f"合成文档: {args.pages} 页，{total_lines} 行")
+
+    baseline, expected = timed(legacy_filter_watermarks, document, args.repeat)
+    print(f"{'逐对循环':<10} {baseline * 1000:>8.1f}ms")
+    for label, fn in [
+        ("cdist", text_filter),
+        ("增量模式", incremental_filter),
+        ("增量+预览", incremental_preview_filter),
+    ]:
+        elapsed, result = timed(fn, document, args.repeat)
+        status = "一致" if contents(result) == contents(expected) else "不一致！"
+        print(f"{label:<10} {elapsed * 1000:>8.1f}ms  加速 {baseline / elapsed:>5.1f}x  输出{status}")
+    spatial_elapsed, spatial = timed(spatial_filter, document, args.repeat)
+    print(f"{'版面检测':<10} {spatial_elapsed * 1000:>8.1f}ms  加速 {baseline / spatial_elapsed:>5.1f}x")
+
+    is_watermark = lambda text: fuzz.partial_ratio(text, "|".join(WATERMARKS)) >= 70 and len(text) <= 12
+    for label, result in [("按文本频率", expected), ("按版面", spatial)]:
+        print(
+            f"{label}: 保留 {sum(len(p['content']) for p in result)}/{total_lines} 行，"
+            f"残留水印 {remaining(result, is_watermark)} 行，"
+            f"页眉保留 {remaining(result, lambda text: text == HEADER)}/{args.pages} 页"
+        )
+
+
+if __name__ == "__main__":
+    main()
+
+# endregion
+# ============================================